@@ -0,0 +1,94 @@
+"""
+Recall and latency of IVF search versus the exact scan in NumpyVectorStore.
+
+For each corpus size a clustered synthetic matrix is generated, an IVF
+index is trained on it (build time reported) and every ``--nprobe`` value
+is compared with the exact scan: recall@k against the exact top-k and
+p50/p99 query latency.
+
+    python benchmarks/ann_bench.py
+    python benchmarks/ann_bench.py --sizes 10000,100000 --dim 768 --nprobe 4,16,64
+
+1M vectors x 768 dims is 3 GB of float32; use a smaller ``--dim`` where
+memory is tight.
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+
+def _synthetic(vectors: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Clustered unit vectors, built in blocks to keep peak memory near the result."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(vectors // 1000, 1), dim)).astype(np.float32)
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+    matrix = np.empty((vectors, dim), dtype=np.float32)
+    for start in range(0, vectors, 65_536):
+        stop = min(start + 65_536, vectors)
+        block = centers[rng.integers(0, len(centers), stop - start)]
+        block += 1.5 * rng.standard_normal(block.shape).astype(np.float32) / np.sqrt(dim)
+        matrix[start:stop] = block / np.linalg.norm(block, axis=1, keepdims=True)
+    return matrix
+
+
+def _run(store, queries: np.ndarray, top_k: int) -> tuple[list[list[str]], list[float]]:
+    from llama_index.core.vector_stores.types import VectorStoreQuery
+
+    results, latencies = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        result = store.query(VectorStoreQuery(query_embedding=q.tolist(), similarity_top_k=top_k))
+        latencies.append(time.perf_counter() - t0)
+        results.append(result.ids)
+    return results, latencies
+
+
+def _ms(latencies: list[float], q: float) -> float:
+    return float(np.percentile(latencies, q) * 1000)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--nprobe", default="4,16,64")
+    parser.add_argument("--nlist", type=int, default=None, help="inverted lists (default sqrt(n))")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    from rag.ann import IVFSettings
+    from rag.vector_store import NumpyVectorStore
+
+    print(f"{'vectors':>10}{'search':>12}{'recall@k':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        matrix = _synthetic(size, args.dim)
+        rng = np.random.default_rng(1)
+        noise = rng.standard_normal((args.queries, args.dim)).astype(np.float32) / np.sqrt(args.dim)
+        queries = matrix[rng.integers(0, size, args.queries)] + 0.5 * noise
+        store = NumpyVectorStore(matrix, [f"n{i}" for i in range(size)])
+        truth, latencies = _run(store, queries, args.top_k)
+        print(f"{size:>10,}{'exact':>12}{1.0:>10.4f}{_ms(latencies, 50):>10.2f}{_ms(latencies, 99):>10.2f}")
+
+        t0 = time.perf_counter()
+        ivf = store.build_ivf(IVFSettings(min_vectors=0, nlist=args.nlist))
+        print(f"{'':>10}{'build':>12}  nlist={ivf.nlist} in {time.perf_counter() - t0:.1f}s")
+        for nprobe in (int(n) for n in args.nprobe.split(",")):
+            store.nprobe = nprobe
+            found, latencies = _run(store, queries, args.top_k)
+            hits = sum(len(set(a) & set(b)) for a, b in zip(truth, found))
+            print(f"{'':>10}{f'nprobe={nprobe}':>12}{hits / (len(queries) * args.top_k):>10.4f}"
+                  f"{_ms(latencies, 50):>10.2f}{_ms(latencies, 99):>10.2f}")
+        del store, matrix
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Concurrent upserts from several processes against one persist dir.
+
+``--writers`` processes each upsert ``--docs`` single-document batches
+(triggering background compactions along the way) while ``--readers``
+processes keep reloading the newest snapshot from disk and querying it.
+Checks that no update is lost, that no reader ever failed or saw a torn
+snapshot, and reports reader load latency and how many versions it saw.
+
+    python benchmarks/concurrent_writers_bench.py
+    python benchmarks/concurrent_writers_bench.py --writers 4 --docs 100 --readers 2
+"""
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+
+def _configure(workdir: str) -> None:
+    os.environ.update(
+        RAG_BACKEND="local",
+        RAG_DATA_DIR=workdir,
+        RAG_LOCAL_EMBED_DIM="128",
+        RAG_COMPACT_SEGMENTS="6",
+        RAG_SNAPSHOT_GRACE_SECONDS="2",
+    )
+
+
+def _writer(workdir: str, writer: int, docs: int) -> None:
+    _configure(workdir)
+    from llama_index.core import Document
+    from rag import service
+
+    for i in range(docs):
+        service.upsert_documents([
+            Document(text=f"Writer {writer} note {i} about pricing and retention.", metadata={"filename": f"w{writer}-{i}.txt"})
+        ])
+    # Let a compaction started by the last upsert publish before exiting.
+    while service._SHARDS.get(service.GLOBAL_SHARD).compaction_running.is_set():
+        time.sleep(0.05)
+
+
+def _reader(workdir: str, stop, results) -> None:
+    _configure(workdir)
+    from rag import service
+
+    shard = service._SHARDS.get(service.GLOBAL_SHARD)
+    loads, errors, versions, latencies, last_count = 0, [], set(), [], 0
+    while not stop.is_set():
+        if not shard.index_exists():
+            time.sleep(0.01)
+            continue
+        try:
+            shard.cache.unload()
+            t0 = time.perf_counter()
+            snapshot = service._SHARDS.snapshot(service.GLOBAL_SHARD)
+            latencies.append(time.perf_counter() - t0)
+            count = len(snapshot.index.docstore.docs)
+            if count < last_count:
+                errors.append(f"document count went back from {last_count} to {count}")
+            if count != snapshot.index.vector_store.num_vectors:
+                errors.append(f"torn snapshot v{snapshot.version}: {count} nodes, "
+                              f"{snapshot.index.vector_store.num_vectors} vectors")
+            last_count = count
+            service.retrieve_documents("pricing retention", mode="hybrid")
+            versions.add(snapshot.version)
+            loads += 1
+        except Exception as e:
+            errors.append(repr(e))
+    latencies.sort()
+    results.put({
+        "loads": loads,
+        "versions": len(versions),
+        "errors": errors[:5],
+        "p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+    })
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=3)
+    parser.add_argument("--docs", type=int, default=40, help="single-document upserts per writer")
+    parser.add_argument("--readers", type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="rag-writers-bench-")
+    ctx = mp.get_context("spawn")
+    try:
+        stop, results = ctx.Event(), ctx.Queue()
+        readers = [ctx.Process(target=_reader, args=(workdir, stop, results)) for _ in range(args.readers)]
+        writers = [ctx.Process(target=_writer, args=(workdir, w, args.docs)) for w in range(args.writers)]
+        for p in readers:
+            p.start()
+        t0 = time.perf_counter()
+        for p in writers:
+            p.start()
+        for p in writers:
+            p.join()
+        elapsed = time.perf_counter() - t0
+        stop.set()
+        reports = [results.get() for _ in readers]
+        for p in readers:
+            p.join()
+
+        _configure(workdir)
+        from rag import service
+
+        expected = args.writers * args.docs
+        indexed = len(service._load_index().docstore.get_all_ref_doc_info() or {})
+        store = service._SHARDS.get(service.GLOBAL_SHARD).segments()
+        print(f"writers: {args.writers} x {args.docs} upserts in {elapsed:.1f}s "
+              f"({expected / elapsed:.0f} upserts/s across processes)")
+        print(f"indexed: {indexed}/{expected} documents, live version {store.version()}, "
+              f"{len(store.versions())} manifests and {len(list(store.segments_dir.iterdir()))} segment dirs on disk")
+        for i, report in enumerate(reports):
+            print(f"reader {i}: {report['loads']} cold loads over {report['versions']} versions, "
+                  f"p50 {report['p50_ms']:.1f} ms, max {report['max_ms']:.1f} ms, errors {report['errors'] or 'none'}")
+        if indexed != expected or any(report["errors"] for report in reports):
+            sys.exit(1)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
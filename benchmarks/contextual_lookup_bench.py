@@ -0,0 +1,133 @@
+"""
+rag_lookup workload: business summary prefixed onto the query versus bare
+question retrieval re-ranked by a per-summary context embedding and memoized.
+
+``--users`` founders (each with their own business summary, edited once
+halfway through) ask questions drawn with Zipf-like repetition from a pool
+of ``--questions`` through ``--agents`` agents. The "prefixed" run
+retrieves on "Given this business context: <summary> Question: <q>" like
+the old tool; the "contextual" run calls ``contextual_lookup``. Reports
+latency, embedding requests and tokens sent, and memo hit rates per agent.
+
+    python benchmarks/contextual_lookup_bench.py
+    python benchmarks/contextual_lookup_bench.py --users 50 --lookups 2000 --embed-ms 30
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+_TOPICS = ["pricing", "seed funding", "retention", "onboarding", "referral loops", "SEO", "churn", "activation"]
+_SUMMARY = (
+    "We are {name}, a {stage} startup building {product} for {segment}. We sell a subscription with a free "
+    "tier, have {customers} paying customers, and are preparing to raise our next round while expanding "
+    "into new markets. Our main challenges are acquisition costs, onboarding drop-off and pricing."
+)
+
+
+def _summary(user: int, revision: int) -> str:
+    rng = random.Random(user * 100 + revision)
+    return _SUMMARY.format(
+        name=f"Startup{user}",
+        stage=rng.choice(["pre-seed", "seed", "Series A"]),
+        product=rng.choice(["a scheduling tool", "an analytics API", "a marketplace", "a fintech app"]),
+        segment=rng.choice(["dentists", "SMBs", "developers", "students"]),
+        customers=rng.randint(5, 5000),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=400)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--agents", type=int, default=4)
+    parser.add_argument("--questions", type=int, default=40, help="distinct questions in the pool")
+    parser.add_argument("--lookups", type=int, default=600)
+    parser.add_argument("--embed-ms", type=float, default=10.0, help="blocking latency added per embedding request")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="rag-contextual-bench-"))
+    os.environ.update(RAG_BACKEND="local", RAG_DATA_DIR=str(workdir), RAG_LOCAL_EMBED_DIM="256")
+    try:
+        from llama_index.core import Document
+        from rag import service
+
+        service.rebuild_index([
+            Document(
+                text=f"Playbook {i}: {_TOPICS[i % len(_TOPICS)]} tactics for {['SMBs', 'developers', 'dentists', 'students'][i % 4]} "
+                     f"- run experiments on {_TOPICS[(i * 3) % len(_TOPICS)]}, measure cohorts and iterate weekly.",
+                metadata={"filename": f"playbook-{i}.txt"},
+            )
+            for i in range(args.docs)
+        ])
+        service._load_index()
+        inner = service.EMBEDDING_CLIENT.inner
+        embed_batch = type(inner)._get_text_embeddings
+        embed_query = type(inner)._get_query_embedding
+
+        def slow_batch(self, texts):
+            time.sleep(args.embed_ms / 1000)
+            return embed_batch(self, texts)
+
+        def slow_query(self, query):
+            time.sleep(args.embed_ms / 1000)
+            return embed_query(self, query)
+
+        type(inner)._get_text_embeddings = slow_batch
+        type(inner)._get_query_embedding = slow_query
+
+        rng = random.Random(7)
+        pool = [f"How should we approach {_TOPICS[i % len(_TOPICS)]} at stage {i // len(_TOPICS)}?"
+                for i in range(args.questions)]
+        weights = [1 / (rank + 1) for rank in range(len(pool))]
+        workload = []
+        for n in range(args.lookups):
+            user = rng.randrange(args.users)
+            revision = int(n >= args.lookups // 2)
+            workload.append((
+                f"agent_{rng.randrange(args.agents)}",
+                _summary(user, revision),
+                rng.choices(pool, weights)[0],
+            ))
+
+        print(f"{'run':<12}{'total s':>9}{'p50 ms':>9}{'embed reqs':>12}{'embed tokens':>14}{'memo hit':>10}{'cand hit':>10}")
+        for label in ("prefixed", "contextual"):
+            before = service.embedding_client_stats()
+            latencies = []
+            t0 = time.perf_counter()
+            for agent, summary, question in workload:
+                t1 = time.perf_counter()
+                if label == "prefixed":
+                    service.retrieve_documents(
+                        f"Given this business context: {summary}\n\nQuestion: {question}", top_k=3
+                    )
+                else:
+                    service.contextual_lookup(question, context=summary, top_k=3, caller=agent)
+                latencies.append(time.perf_counter() - t1)
+            total = time.perf_counter() - t0
+            after = service.embedding_client_stats()
+            latencies.sort()
+            memo = service.lookup_memo_stats()
+            hits = [f"{memo[name]['hit_rate']:.0%}" if label == "contextual" else "-" for name in ("results", "candidates")]
+            print(f"{label:<12}{total:>9.2f}{latencies[len(latencies) // 2] * 1000:>9.2f}"
+                  f"{after['requests'] - before['requests']:>12}{after['tokens'] - before['tokens']:>14}"
+                  f"{hits[0]:>10}{hits[1]:>10}")
+        candidates = memo["candidates"]["by_caller"]
+        for agent, counts in memo["results"]["by_caller"].items():
+            print(f"  {agent}: results {counts['hits']} hits / {counts['misses']} misses ({counts['hit_rate']:.0%}), "
+                  f"candidates {candidates[agent]['hit_rate']:.0%} of result misses")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Webpage ingestion against a local HTTP stand-in: naive fetching versus the
+pooled async crawler, and full versus conditional refreshes.
+
+A threaded local server publishes ``--pages`` article pages (with nav,
+footer and cookie-banner chrome) under two host names, adds ``--latency-ms``
+to every response and honours If-None-Match / If-Modified-Since. The run:
+
+1. naive: one ``httpx.get`` per page, sequentially, no pooling or timeouts
+2. crawl: first ingestion through ``rag.crawler`` into a throwaway index
+3. refresh: nothing changed, so every page should answer 304
+4. refresh after editing ``--changed`` pages: only those are re-embedded
+
+and checks the per-host concurrency limit was never exceeded.
+
+    python benchmarks/crawler_bench.py
+    python benchmarks/crawler_bench.py --pages 500 --latency-ms 100 --per-host 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import email.utils
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+_PAGE = """<html><head><title>{title}</title><script>track()</script></head><body>
+<header><nav><a href="/">Home</a> <a href="/blog">Blog</a> <a href="/pricing">Pricing</a></nav></header>
+<div class="cookie-banner">We use cookies to improve your experience. <button>Accept</button></div>
+<main><article><h1>{title}</h1>
+<p>Revision {revision}. Startups in segment {i} test pricing anchors, freemium tiers and annual discounts.</p>
+<p>Retention cohorts for product {i} improved after onboarding emails and an activation checklist.</p>
+<ul><li>Seed rounds for this segment averaged {i}00k.</li><li><a href="/tag/{i}">tag-{i}</a></li></ul>
+</article></main>
+<aside class="sidebar"><a href="/related/{i}">Related reading</a></aside>
+<footer><p>Copyright Example Media</p></footer></body></html>"""
+
+
+class _Site:
+    def __init__(self, pages: int, latency: float) -> None:
+        self.latency = latency
+        self.revisions = [0] * pages
+        self.modified = [time.time() - 3600] * pages
+        self.lock = threading.Lock()
+        self.in_flight: dict[str, int] = {}
+        self.max_in_flight: dict[str, int] = {}
+        self.responses: dict[int, int] = {}
+
+    def edit(self, page: int) -> None:
+        self.revisions[page] += 1
+        self.modified[page] = time.time()
+
+
+def _handler(site: _Site):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            host = self.headers.get("Host", "")
+            with site.lock:
+                site.in_flight[host] = site.in_flight.get(host, 0) + 1
+                site.max_in_flight[host] = max(site.max_in_flight.get(host, 0), site.in_flight[host])
+            try:
+                time.sleep(site.latency)
+                page = int(self.path.rsplit("/", 1)[-1])
+                body = _PAGE.format(title=f"Playbook {page}", revision=site.revisions[page], i=page).encode()
+                etag = '"' + hashlib.sha1(body).hexdigest()[:16] + '"'
+                modified = email.utils.formatdate(site.modified[page], usegmt=True)
+                if self.headers.get("If-None-Match") == etag:
+                    status, body = 304, b""
+                else:
+                    status = 200
+                self.send_response(status)
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", modified)
+                if status == 200:
+                    self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with site.lock:
+                    site.responses[status] = site.responses.get(status, 0) + 1
+            finally:
+                with site.lock:
+                    site.in_flight[host] -= 1
+
+    return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--per-host", type=int, default=8)
+    parser.add_argument("--changed", type=int, default=10, help="pages edited before the second refresh")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="rag-crawler-bench-"))
+    os.environ.update(RAG_BACKEND="local", RAG_DATA_DIR=str(workdir), RAG_LOCAL_EMBED_DIM="256")
+    site = _Site(args.pages, args.latency_ms / 1000)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(site))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    hosts = [f"127.0.0.1:{port}", f"localhost:{port}"]
+    urls = [f"http://{hosts[i % 2]}/page/{i}" for i in range(args.pages)]
+    try:
+        import httpx
+        from rag import crawler, service
+
+        t0 = time.perf_counter()
+        for url in urls:
+            httpx.get(url)
+        naive = time.perf_counter() - t0
+        print(f"naive:    {args.pages} sequential GETs in {naive:.2f}s ({args.pages / naive:.0f} pages/s)")
+
+        runs = [("crawl", None), ("refresh", None), (f"edit {args.changed}", args.changed)]
+        for label, edits in runs:
+            for page in range(edits or 0):
+                site.edit(page * max(args.pages // max(args.changed, 1), 1))
+            site.responses.clear()
+            t0 = time.perf_counter()
+            stats = crawler.ingest_urls(urls, per_host=args.per_host)
+            elapsed = time.perf_counter() - t0
+            print(f"{label + ':':<10}{elapsed:.2f}s total, fetch {stats.seconds['fetch']:.2f}s "
+                  f"({stats.urls / stats.seconds['fetch']:.0f} pages/s), {stats.changed} changed, "
+                  f"{stats.not_modified} not modified, {stats.indexed} re-embedded, HTTP {dict(site.responses)}")
+        print(f"max in flight per host: {site.max_in_flight} (limit {args.per_host})")
+        sample = service.retrieve_documents("pricing anchors freemium", top_k=1)[0]["text"]
+        print(f"sample passage: {sample[:120]!r}")
+        if max(site.max_in_flight.values()) > args.per_host:
+            sys.exit(1)
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
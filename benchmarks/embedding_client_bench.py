@@ -0,0 +1,156 @@
+"""
+Bulk embedding against a quota-limited stand-in API: library defaults versus
+the batched, rate-limited, retrying client in ``rag.embedding_client``.
+
+The fake API allows ``--rpm`` requests per quota window (``--window``
+seconds stand in for a minute), answers 429 beyond that, fails
+``--error-rate`` of requests with 503 and takes ``--latency-ms`` per
+request. The runs embed ``--texts`` chunks:
+
+1. default: 10 texts per request, no retries (how ``GoogleGenAIEmbedding`` is used)
+2. retry only: maximal batches and backoff, but no client-side limiter
+3. client: maximal batches, token bucket at the quota and backoff
+
+and report requests, 429s, retries and achieved embeddings/s against the
+quota ceiling (``--rpm`` x ``--batch`` per window).
+
+    python benchmarks/embedding_client_bench.py
+    python benchmarks/embedding_client_bench.py --texts 20000 --rpm 30 --error-rate 0.05
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+
+class APIError(Exception):
+    def __init__(self, code: int, message: str) -> None:
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class QuotaLimitedEmbedding(BaseEmbedding):
+    """Fake hosted model: fixed-window request quota, random 503s and per-request latency."""
+
+    _rpm: int = PrivateAttr()
+    _window: float = PrivateAttr()
+    _latency: float = PrivateAttr()
+    _error_rate: float = PrivateAttr()
+    _lock: threading.Lock = PrivateAttr()
+    _window_start: float = PrivateAttr()
+    _used: int = PrivateAttr()
+    _calls: int = PrivateAttr()
+    counts: dict[str, int] = {}
+
+    def __init__(self, rpm: int, window: float, latency: float, error_rate: float, **kwargs: Any) -> None:
+        super().__init__(model_name="fake-quota-embedding", **kwargs)
+        self._rpm, self._window, self._latency, self._error_rate = rpm, window, latency, error_rate
+        self._lock = threading.Lock()
+        self._window_start, self._used, self._calls = time.monotonic(), 0, 0
+        self.counts = {"requests": 0, "429": 0, "503": 0}
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "QuotaLimitedEmbedding"
+
+    def _call(self, texts: list[str]) -> list[list[float]]:
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= self._window:
+                self._window_start, self._used = now, 0
+            self.counts["requests"] += 1
+            self._calls += 1
+            if self._used >= self._rpm:
+                self.counts["429"] += 1
+                raise APIError(429, "RESOURCE_EXHAUSTED: quota exceeded")
+            self._used += 1
+            failing = self._error_rate and self._calls % round(1 / self._error_rate) == 0
+        time.sleep(self._latency)
+        if failing:
+            self.counts["503"] += 1
+            raise APIError(503, "UNAVAILABLE")
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def _get_query_embedding(self, query: str) -> list[float]:
+        return self._call([query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> list[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> list[float]:
+        return self._call([text])[0]
+
+    def _get_text_embeddings(self, texts: list[str]) -> list[list[float]]:
+        return self._call(texts)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=6000)
+    parser.add_argument("--rpm", type=int, default=20, help="requests allowed per quota window")
+    parser.add_argument("--window", type=float, default=1.0, help="seconds standing in for a quota minute")
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.02, help="share of requests failing with 503")
+    args = parser.parse_args()
+
+    from rag.embedding_client import RateLimitedEmbedding
+
+    texts = [f"chunk {i}: pricing, retention and funding notes" for i in range(args.texts)]
+    ceiling = args.rpm * args.batch / args.window
+    print(f"quota ceiling: {ceiling:.0f} embeddings/s ({args.rpm} requests of {args.batch} per {args.window:g}s)")
+
+    def api() -> QuotaLimitedEmbedding:
+        return QuotaLimitedEmbedding(args.rpm, args.window, args.latency_ms / 1000, args.error_rate)
+
+    # Start each run in a fresh quota window.
+    time.sleep(args.window)
+    fake = api()
+    t0 = time.perf_counter()
+    try:
+        fake.get_text_embedding_batch(texts)
+        outcome = "completed"
+    except APIError as e:
+        outcome = f"failed after {fake.counts['requests'] - 1} requests: {e}"
+    print(f"default:    {time.perf_counter() - t0:.2f}s, {outcome}, API {fake.counts}")
+
+    failed = False
+    for label, rpm in (("retry only", None), ("client", args.rpm)):
+        time.sleep(args.window)
+        fake = api()
+        client = RateLimitedEmbedding(
+            fake,
+            max_batch=args.batch,
+            requests_per_minute=rpm,
+            quota_period=args.window,
+            max_retries=10,
+            backoff_base=args.window / 4,
+            backoff_max=args.window * 4,
+        )
+        t0 = time.perf_counter()
+        try:
+            vectors = client.get_text_embedding_batch(texts)
+            outcome = f"{len(vectors)} embeddings"
+        except APIError as e:
+            outcome, failed = f"failed: {e}", True
+        elapsed = time.perf_counter() - t0
+        stats = client.stats()
+        print(f"{label + ':':<12}{elapsed:.2f}s, {outcome}, {stats['embeddings_per_second']:.0f} embeddings/s "
+              f"({stats['embeddings_per_second'] / ceiling:.0%} of ceiling), {stats['retries']} retries, "
+              f"throttled {stats['throttled_seconds']:.1f}s, API {fake.counts}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
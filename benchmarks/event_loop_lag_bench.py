@@ -0,0 +1,108 @@
+"""
+Event-loop lag while RAG lookups run, inline versus on the lookup pool.
+
+Simulates a server: ``--sessions`` concurrent "other sessions" each do a
+tiny await every 10 ms while ``--lookups`` RAG lookups run, each with
+``--embed-ms`` of artificial blocking latency in the embedding call (the
+shape of a slow Gemini request). Calling ``retrieve_documents`` directly
+from a coroutine stalls every session for the full lookup; awaiting
+``aretrieve_documents`` keeps the loop responsive.
+
+    python benchmarks/event_loop_lag_bench.py
+    python benchmarks/event_loop_lag_bench.py --embed-ms 800 --lookups 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+
+async def _session(stop: asyncio.Event, waits: list[float]) -> None:
+    """A chat session that needs the loop every 10 ms; records how late it got it."""
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(0.01)
+        waits.append(time.perf_counter() - t0 - 0.01)
+
+
+async def _scenario(service, questions: list[str], sessions: int, use_async: bool) -> dict:
+    from loop_monitor import EventLoopLagMonitor
+
+    monitor = EventLoopLagMonitor(interval=0.01)
+    monitor.start()
+    stop = asyncio.Event()
+    waits: list[float] = []
+    others = [asyncio.create_task(_session(stop, waits)) for _ in range(sessions)]
+    await asyncio.sleep(0.05)
+
+    async def lookup(question: str) -> None:
+        if use_async:
+            await service.aretrieve_documents(question)
+        else:
+            service.retrieve_documents(question)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(lookup(q) for q in questions))
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await asyncio.gather(*others)
+    await monitor.stop()
+    waits.sort()
+    return {
+        "elapsed_s": elapsed,
+        "session_p99_ms": waits[int(0.99 * (len(waits) - 1))] * 1000 if waits else 0.0,
+        "session_ticks": len(waits),
+        **monitor.stats(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--lookups", type=int, default=4)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--embed-ms", type=float, default=400.0, help="blocking latency added per query embedding")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="rag-loop-lag-bench-"))
+    os.environ.update(RAG_BACKEND="local", RAG_DATA_DIR=str(workdir), RAG_LOOKUP_WORKERS=str(args.lookups))
+    try:
+        from llama_index.core import Document
+        from rag import backends, service
+
+        service.rebuild_index([
+            Document(text=f"Note {i}: pricing, funding and growth plans for product {i}.", metadata={"filename": f"n{i}.txt"})
+            for i in range(args.docs)
+        ])
+        service._load_index()
+        embed = backends.hashing_embedding
+
+        def slow_embedding(text: str, dim: int) -> list[float]:
+            time.sleep(args.embed_ms / 1000)
+            return embed(text, dim)
+
+        backends.hashing_embedding = slow_embedding
+        print(f"{'lookup':<8}{'wall s':>8}{'loop p50':>10}{'loop p99':>10}{'loop max':>10}{'stalls':>8}"
+              f"{'session p99':>13}{'ticks':>7}")
+        for run, use_async in enumerate((False, True)):
+            # Distinct questions per run so neither hits the query embedding cache.
+            questions = [f"what is the plan for product {run * 1000 + i}?" for i in range(args.lookups)]
+            r = asyncio.run(_scenario(service, questions, args.sessions, use_async))
+            print(f"{'async' if use_async else 'inline':<8}{r['elapsed_s']:>8.2f}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}"
+                  f"{r['max_ms']:>10.1f}{r['stalls']:>8}{r['session_p99_ms']:>13.1f}{r['session_ticks']:>7}")
+        print(f"lookup pool: {service.lookup_executor_stats()}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Chat-side latency while uploads are ingested, inline versus on the job queue.
+
+Simulates the server: ``--sessions`` concurrent sessions each do a tiny
+await every 10 ms and a RAG lookup runs every ``--lookup-every`` ms while
+``--uploads`` text files of ``--kb`` KB are ingested, with ``--embed-ms``
+of artificial blocking latency per embedded text. Ingesting from the
+request coroutine stalls every session for whole embedding batches;
+handing the files to ``rag.jobs`` keeps the loop and lookups responsive
+while job progress is polled the way ``GET /api/documents/{id}`` does.
+The queue's wall time includes spawning its extraction processes.
+
+    python benchmarks/ingestion_jobs_bench.py
+    python benchmarks/ingestion_jobs_bench.py --uploads 8 --kb 400 --embed-ms 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+
+def _upload(i: int, kb: int) -> bytes:
+    paragraph = f"Upload {i}: cohort retention, pricing experiments and seed funding notes for segment {{}}.\n\n"
+    text, n = "", 0
+    while len(text) < kb * 1024:
+        text += paragraph.format(n)
+        n += 1
+    return text.encode()
+
+
+async def _session(stop: asyncio.Event, waits: list[float]) -> None:
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(0.01)
+        waits.append(time.perf_counter() - t0 - 0.01)
+
+
+async def _lookups(service, stop: asyncio.Event, every: float, latencies: list[float]) -> None:
+    n = 0
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await service.aretrieve_documents(f"pricing plan question {n}", shards=[service.GLOBAL_SHARD])
+        latencies.append(time.perf_counter() - t0)
+        n += 1
+        await asyncio.sleep(every)
+
+
+async def _scenario(service, jobs, uploads: list[bytes], args, use_queue: bool, tag: str) -> dict:
+    from loop_monitor import EventLoopLagMonitor
+
+    monitor = EventLoopLagMonitor(interval=0.01)
+    monitor.start()
+    stop = asyncio.Event()
+    waits: list[float] = []
+    latencies: list[float] = []
+    background = [asyncio.create_task(_session(stop, waits)) for _ in range(args.sessions)]
+    background.append(asyncio.create_task(_lookups(service, stop, args.lookup_every / 1000, latencies)))
+    await asyncio.sleep(0.1)
+
+    t0 = time.perf_counter()
+    queue = jobs.ingestion_queue()
+    shard = service.user_shard(f"bench-{tag}")
+    if use_queue:
+        submitted = []
+        for i, body in enumerate(uploads):
+            job_id, path, _ = await asyncio.to_thread(queue.store_upload, io.BytesIO(body), f"{tag}-{i}.txt")
+            submitted.append(queue.submit(job_id, path, filename=f"{tag}-{i}.txt", shard=shard))
+        while not all(job.finished for job in submitted):
+            await asyncio.sleep(0.05)
+        failed = [job.error for job in submitted if job.error]
+        chunks = sum(job.chunks for job in submitted)
+    else:
+        from llama_index.core import Document
+
+        failed, chunks = [], 0
+        for i, body in enumerate(uploads):
+            nodes = service.chunk_documents([Document(text=body.decode(), metadata={"filename": f"{tag}-{i}.txt"})])
+            service.embed_nodes(nodes)
+            service.upsert_nodes(nodes, {}, shard=shard)
+            chunks += len(nodes)
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await asyncio.gather(*background)
+    await monitor.stop()
+    waits.sort()
+    latencies.sort()
+    return {
+        "elapsed_s": elapsed,
+        "chunks": chunks,
+        "failed": failed,
+        "session_p99_ms": waits[int(0.99 * (len(waits) - 1))] * 1000 if waits else 0.0,
+        "lookup_p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+        "lookup_max_ms": latencies[-1] * 1000 if latencies else 0.0,
+        "lookups": len(latencies),
+        **monitor.stats(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=int, default=4)
+    parser.add_argument("--kb", type=int, default=200, help="size of each uploaded text file")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--lookup-every", type=float, default=100.0, help="ms between chat lookups")
+    parser.add_argument("--embed-ms", type=float, default=2.0, help="blocking latency added per embedded text")
+    parser.add_argument("--workers", type=int, default=2, help="concurrent ingestion jobs")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="rag-jobs-bench-"))
+    os.environ.update(
+        RAG_BACKEND="local",
+        RAG_DATA_DIR=str(workdir),
+        RAG_LOCAL_EMBED_DIM="256",
+        RAG_JOB_WORKERS=str(args.workers),
+    )
+    try:
+        from llama_index.core import Document
+        from rag import backends, jobs, service
+
+        service.rebuild_index([
+            Document(text=f"Note {i}: pricing, funding and growth plans for product {i}.", metadata={"filename": f"n{i}.txt"})
+            for i in range(200)
+        ])
+        embed = backends.hashing_embedding
+
+        def slow_embedding(text: str, dim: int) -> list[float]:
+            time.sleep(args.embed_ms / 1000)
+            return embed(text, dim)
+
+        backends.hashing_embedding = slow_embedding
+        uploads = [_upload(i, args.kb) for i in range(args.uploads)]
+        print(f"{'ingest':<8}{'wall s':>8}{'chunks':>8}{'loop p99':>10}{'loop max':>10}{'stalls':>8}"
+              f"{'session p99':>13}{'lookup p50':>12}{'lookup max':>12}{'lookups':>9}")
+        for use_queue in (False, True):
+            tag = "queue" if use_queue else "inline"
+            r = asyncio.run(_scenario(service, jobs, uploads, args, use_queue, tag))
+            print(f"{tag:<8}{r['elapsed_s']:>8.2f}{r['chunks']:>8}{r['p99_ms']:>10.1f}{r['max_ms']:>10.1f}"
+                  f"{r['stalls']:>8}{r['session_p99_ms']:>13.1f}{r['lookup_p50_ms']:>12.1f}"
+                  f"{r['lookup_max_ms']:>12.1f}{r['lookups']:>9}")
+            if r["failed"]:
+                print(f"failed jobs: {r['failed']}")
+                sys.exit(1)
+        print(f"ingestion queue: {jobs.ingestion_queue().stats()}")
+        jobs.shutdown_queue(wait=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
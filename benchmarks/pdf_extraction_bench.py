@@ -0,0 +1,141 @@
+"""
+Compare whole-file serial PDF extraction with the streaming page pipeline.
+
+"serial" mirrors the original ``extract_text_from_pdf``: read the file into
+memory, extract each page in turn and concatenate the text. "stream" runs
+``rag.pdf_stream.iter_pdf_pages`` with a process pool and consumes the
+page documents one at a time. Each mode runs in a fresh subprocess so the
+peak RSS reported (growth over the post-import baseline) is that mode's own.
+
+    python benchmarks/pdf_extraction_bench.py --pages 600
+    python benchmarks/pdf_extraction_bench.py --pdf path/to/book.pdf --workers 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+_WORDS = (
+    "market customer revenue growth channel retention pricing funding runway "
+    "product launch segment acquisition churn cohort margin investor pitch"
+).split()
+
+
+def _write_synthetic(path: Path, pages: int, lines_per_page: int = 45) -> None:
+    """Write a plain-text PDF of ``pages`` pages without extra dependencies."""
+    objects: list[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"",  # page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for p in range(pages):
+        lines = []
+        for line in range(lines_per_page):
+            words = " ".join(_WORDS[(p + line + i) % len(_WORDS)] for i in range(12))
+            lines.append(f"({p + 1}.{line + 1} {words}) Tj T*")
+        stream = ("BT /F1 10 Tf 12 TL 40 800 Td " + " ".join(lines) + " ET").encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842]"
+            b" /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(bytes(out))
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def _measure(mode: str, pdf: str, workers: int | None) -> dict:
+    import io
+
+    import pypdf
+
+    from rag.pdf_stream import iter_pdf_pages
+
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    first_page_s = None
+    chars = 0
+    if mode == "serial":
+        with open(pdf, "rb") as f:
+            reader = pypdf.PdfReader(io.BytesIO(f.read()))
+        text = ""
+        for i, page in enumerate(reader.pages):
+            text += f"\n[Page {i+1}]\n"
+            text += page.extract_text() or ""
+        chars = len(text)
+        first_page_s = time.perf_counter() - start
+    else:
+        for doc in iter_pdf_pages(pdf, workers=workers):
+            if first_page_s is None:
+                first_page_s = time.perf_counter() - start
+            chars += len(doc.text)
+    total_s = time.perf_counter() - start
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {
+        "mode": mode,
+        "total_s": total_s,
+        "first_page_s": first_page_s or total_s,
+        "chars": chars,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 - rss_before,
+        "worker_peak_rss_mb": children / 1024,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--pdf", help="existing PDF to benchmark instead of a synthetic one")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--_worker", nargs=2, metavar=("MODE", "PDF"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args._worker:
+        mode, pdf = args._worker
+        print(json.dumps(_measure(mode, pdf, args.workers)))
+        return
+
+    with tempfile.TemporaryDirectory(prefix="pdf-bench-") as workdir:
+        pdf = args.pdf
+        if not pdf:
+            pdf = str(Path(workdir) / "synthetic.pdf")
+            _write_synthetic(Path(pdf), args.pages)
+        print(f"{'mode':<8}{'total s':>10}{'first page s':>14}{'chars':>12}{'+RSS MB':>10}{'worker MB':>11}")
+        for mode in ("serial", "stream"):
+            cmd = [sys.executable, __file__, "--_worker", mode, pdf]
+            if args.workers:
+                cmd += ["--workers", str(args.workers)]
+            out = subprocess.run(cmd, check=True, capture_output=True, text=True)
+            row = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{row['mode']:<8}{row['total_s']:>10.2f}{row['first_page_s']:>14.3f}{row['chars']:>12,}"
+                  f"{row['peak_rss_mb']:>10.1f}{row['worker_peak_rss_mb']:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Recall vs memory of quantized candidate search in NumpyVectorStore.
+
+For each mode the store scans its compact matrix (float16 or int8) for
+candidates and re-scores them at full precision; "none" is the exact
+float32 scan and serves as ground truth. Reports recall@k against it, the
+bytes of the matrix each mode scans and query latency.
+
+    python benchmarks/quantization_bench.py --vectors 100000
+    python benchmarks/quantization_bench.py --persist-dir src/data/persist
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+
+def _synthetic(vectors: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Clustered unit vectors; uniform noise would make every neighbour a near tie."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(vectors // 200, 1), dim)).astype(np.float32)
+    matrix = centers[rng.integers(0, len(centers), vectors)]
+    matrix += 0.6 * rng.standard_normal((vectors, dim)).astype(np.float32) / np.sqrt(dim) * np.linalg.norm(
+        centers, axis=1
+    ).mean()
+    return matrix
+
+
+def _load_persist_dir(persist_dir: str) -> np.ndarray:
+    from rag.segments import SegmentStore
+    from rag.vector_store import NumpyVectorStore
+
+    store = SegmentStore(persist_dir)
+    manifest = store.read_manifest()
+    if manifest is None:
+        raise SystemExit(f"No segment manifest under {persist_dir}")
+    vectors = NumpyVectorStore.concat([store.load_segment(name).vectors for name in manifest.segments])
+    return np.asarray(vectors._full_matrix())
+
+
+def _percentile_ms(latencies: list[float], q: float) -> float:
+    return float(np.percentile(latencies, q) * 1000)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=50_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--persist-dir", help="segment persist dir to benchmark instead of synthetic data")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+
+    from llama_index.core.vector_stores.types import VectorStoreQuery
+
+    from rag.vector_store import QUANTIZATION_MODES, NumpyVectorStore, _normalize
+
+    matrix = _load_persist_dir(args.persist_dir) if args.persist_dir else _synthetic(args.vectors, args.dim)
+    matrix = _normalize(matrix)
+    ids = [f"n{i}" for i in range(len(matrix))]
+    # Queries are perturbed copies of stored vectors, like paraphrased questions.
+    rng = np.random.default_rng(1)
+    picks = rng.integers(0, len(matrix), args.queries)
+    noise = rng.standard_normal((args.queries, matrix.shape[1])).astype(np.float32) / np.sqrt(matrix.shape[1])
+    queries = _normalize(matrix[picks] + 0.5 * noise)
+
+    print(f"{len(matrix):,} vectors x {matrix.shape[1]} dims, top_k={args.top_k}")
+    print(f"{'mode':<9}{'scan MB':>10}{'recall@k':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    truth: list[set[str]] = []
+    for mode in QUANTIZATION_MODES:
+        store = NumpyVectorStore(matrix, ids, quantization=mode)
+        latencies, hits = [], 0
+        for i, q in enumerate(queries):
+            t0 = time.perf_counter()
+            result = store.query(VectorStoreQuery(query_embedding=q.tolist(), similarity_top_k=args.top_k))
+            latencies.append(time.perf_counter() - t0)
+            if mode == "none":
+                truth.append(set(result.ids))
+            hits += len(truth[i] & set(result.ids))
+        memory = store.memory_bytes()
+        scanned = memory["compact"] if mode != "none" else memory["full"]
+        print(f"{mode:<9}{scanned / 2**20:>10.1f}{hits / (len(queries) * args.top_k):>10.4f}"
+              f"{_percentile_ms(latencies, 50):>10.2f}{_percentile_ms(latencies, 99):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
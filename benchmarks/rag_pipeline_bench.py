@@ -0,0 +1,123 @@
+"""
+End-to-end RAG pipeline benchmark that runs fully offline.
+
+Uses the "local" backend (hashing embedding, extractive answers) against a
+throwaway data dir, so results are reproducible on an air-gapped machine
+and never touch ``src/data``. Measures ingestion throughput, incremental
+upserts, cold index load, retrieval latency per mode and the effect of the
+embedding and answer caches.
+
+    python benchmarks/rag_pipeline_bench.py --docs 2000
+    python benchmarks/rag_pipeline_bench.py --docs 500 --queries 100 --dim 384
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+_TOPICS = {
+    "growth": "acquisition activation retention referral funnel experiment cohort viral loop",
+    "funding": "seed series investor valuation dilution runway term sheet equity",
+    "pricing": "tier freemium subscription discount anchor willingness value metric",
+    "market": "tam sam som segment competitor positioning demand survey",
+    "engineering": "architecture database latency deploy api scaling cache queue",
+}
+
+
+def _documents(count: int, seed: int = 0):
+    from llama_index.core import Document
+
+    rng = random.Random(seed)
+    names = list(_TOPICS)
+    docs = []
+    for i in range(count):
+        topic = names[i % len(names)]
+        words = _TOPICS[topic].split()
+        sentences = [
+            " ".join(rng.choice(words) for _ in range(rng.randint(8, 16))).capitalize() + "."
+            for _ in range(rng.randint(6, 12))
+        ]
+        docs.append(Document(text=" ".join(sentences), metadata={"filename": f"{topic}-{i}.txt"}))
+    return docs
+
+
+def _ms(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))] * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=1000)
+    parser.add_argument("--upserts", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=768)
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="rag-pipeline-bench-"))
+    os.environ.update(RAG_BACKEND="local", RAG_DATA_DIR=str(workdir), RAG_LOCAL_EMBED_DIM=str(args.dim))
+    try:
+        from rag import service
+
+        docs = _documents(args.docs)
+        t0 = time.perf_counter()
+        service.rebuild_index(docs)
+        ingest_s = time.perf_counter() - t0
+        chunks = service._load_index().vector_store.num_vectors
+        print(f"rebuild:   {args.docs} docs / {chunks} chunks in {ingest_s:.2f}s ({args.docs / ingest_s:.0f} docs/s)")
+
+        extra = _documents(args.upserts, seed=1)
+        for doc in extra:
+            doc.metadata["filename"] = "upsert-" + doc.metadata["filename"]
+        t0 = time.perf_counter()
+        for doc in extra:
+            service.upsert_documents([doc])
+        upsert_s = time.perf_counter() - t0
+        print(f"upsert:    {args.upserts} single-doc upserts, {upsert_s / args.upserts * 1000:.1f} ms each")
+
+        # A rebuild re-chunks everything; the embedding cache serves the vectors.
+        t0 = time.perf_counter()
+        service.rebuild_index(docs)
+        print(f"re-ingest: {time.perf_counter() - t0:.2f}s with embedding cache {service.embedding_cache_stats()}")
+
+        service._SHARDS.get(service.GLOBAL_SHARD).cache.unload()
+        t0 = time.perf_counter()
+        service._load_index()
+        print(f"cold load: {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+        rng = random.Random(2)
+        questions = [
+            f"how does {' '.join(rng.sample(_TOPICS[topic].split(), 3))} affect {topic}?"
+            for topic in rng.choices(list(_TOPICS), k=args.queries)
+        ]
+        print(f"{'mode':<10}{'p50 ms':>10}{'p99 ms':>10}")
+        for mode in ("vector", "lexical", "hybrid"):
+            latencies = []
+            for question in questions:
+                t0 = time.perf_counter()
+                service.retrieve_documents(question, mode=mode)
+                latencies.append(time.perf_counter() - t0)
+            print(f"{mode:<10}{_ms(latencies, 50):>10.2f}{_ms(latencies, 99):>10.2f}")
+
+        for attempt in ("cold", "warm"):
+            t0 = time.perf_counter()
+            for question in questions:
+                service.query_documents(question)
+            elapsed = time.perf_counter() - t0
+            print(f"answers ({attempt}): {elapsed / len(questions) * 1000:.2f} ms/query, "
+                  f"cache {service.query_cache_stats()}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Compare the JSON SimpleVectorStore with the memory-mapped NumpyVectorStore.
+
+Reports cold-load time, resident memory added by the load and top-k query
+latency for each format. Each measurement runs in a fresh subprocess so the
+page cache and allocator state of one format do not skew the other.
+
+    python benchmarks/vector_store_bench.py --vectors 20000
+    python benchmarks/vector_store_bench.py --persist-dir src/data/persist
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+
+def _rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _measure(fmt: str, persist_dir: str, queries: int, top_k: int) -> dict:
+    import numpy as np
+    from llama_index.core.vector_stores.simple import SimpleVectorStore
+    from llama_index.core.vector_stores.types import VectorStoreQuery
+
+    from rag.vector_store import NumpyVectorStore
+
+    rss_before = _rss_bytes()
+    start = time.perf_counter()
+    if fmt == "json":
+        store = SimpleVectorStore.from_persist_path(str(Path(persist_dir) / "default__vector_store.json"))
+        dim = len(next(iter(store.data.embedding_dict.values())))
+    else:
+        store = NumpyVectorStore.from_persist_dir(persist_dir)
+        dim = store._matrix.shape[1]
+    load_s = time.perf_counter() - start
+    rss_after = _rss_bytes()
+
+    rng = np.random.default_rng(1)
+    latencies = []
+    for _ in range(queries):
+        q = rng.standard_normal(dim).astype(np.float32).tolist()
+        t0 = time.perf_counter()
+        store.query(VectorStoreQuery(query_embedding=q, similarity_top_k=top_k))
+        latencies.append(time.perf_counter() - t0)
+    latencies.sort()
+    return {
+        "format": fmt,
+        "load_ms": load_s * 1000,
+        "rss_mb": (rss_after - rss_before) / 2**20,
+        "p50_query_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_query_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+
+def _write_synthetic(persist_dir: Path, vectors: int, dim: int) -> None:
+    import numpy as np
+
+    rng = np.random.default_rng(0)
+    ids = [str(uuid.uuid4()) for _ in range(vectors)]
+    matrix = rng.standard_normal((vectors, dim)).astype(np.float32)
+    payload = {
+        "embedding_dict": {i: row.tolist() for i, row in zip(ids, matrix)},
+        "text_id_to_ref_doc_id": {i: "doc" for i in ids},
+        "metadata_dict": {i: {"filename": "synthetic.txt"} for i in ids},
+    }
+    with open(persist_dir / "default__vector_store.json", "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--persist-dir", help="existing JSON persist dir to benchmark instead of synthetic data")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--_worker", nargs=2, metavar=("FORMAT", "DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args._worker:
+        fmt, persist_dir = args._worker
+        print(json.dumps(_measure(fmt, persist_dir, args.queries, args.top_k)))
+        return
+
+    from rag.vector_store import convert_json_persist_dir
+
+    workdir = Path(tempfile.mkdtemp(prefix="vector-store-bench-"))
+    try:
+        json_dir, npy_dir = workdir / "json", workdir / "numpy"
+        json_dir.mkdir()
+        if args.persist_dir:
+            shutil.copy(Path(args.persist_dir) / "default__vector_store.json", json_dir)
+        else:
+            _write_synthetic(json_dir, args.vectors, args.dim)
+        shutil.copytree(json_dir, npy_dir)
+        convert_json_persist_dir(npy_dir)
+
+        print(f"{'format':<8}{'load ms':>12}{'RSS MB':>10}{'p50 ms':>10}{'p99 ms':>10}")
+        for fmt, persist_dir in (("json", json_dir), ("numpy", npy_dir)):
+            out = subprocess.run(
+                [sys.executable, __file__, "--queries", str(args.queries), "--top-k", str(args.top_k),
+                 "--_worker", fmt, str(persist_dir)],
+                check=True, capture_output=True, text=True,
+            )
+            row = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{row['format']:<8}{row['load_ms']:>12.1f}{row['rss_mb']:>10.1f}"
+                  f"{row['p50_query_ms']:>10.2f}{row['p99_query_ms']:>10.2f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -27,6 +27,7 @@ from agents.funding_research_agent import funding_research_agent
 from agents.market_analysis_agent import market_analysis_agent
 from agents.engineering_agent import engineering_agent
 from tools.context_memory_tools import BUSINESS_SUMMARY_KEY
+from rag_api import create_rag_router, open_chat_session
 
 app = FastAPI(title="HardLaunch")
 
@@ -40,6 +41,7 @@ app.add_middleware(
 
 session_service = InMemorySessionService()
 APP_NAME = "Hardlaunch"
+app.include_router(create_rag_router(session_service, APP_NAME))
 
 async def run_agent_query(
     runner: Runner,
@@ -77,16 +79,7 @@ async def run_agent_query(
     return final_response
 
 async def get_or_create_session(session_id: str | None) -> Session:
-    if session_id:
-        try:
-            existing = await session_service.get_session(
-                app_name=APP_NAME, user_id=session_id, session_id=session_id
-            )
-            if existing:
-                return existing
-        except:
-            pass
-    return await session_service.create_session(app_name=APP_NAME, user_id=session_id or "anon")
+    return await open_chat_session(session_service, APP_NAME, session_id)
 
 class ChatRequest(BaseModel):
     session_id: Optional[str] = None
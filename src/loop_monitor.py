@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+
+
+class EventLoopLagMonitor:
+    """
+    Measure how late the event loop wakes up from a short sleep.
+
+    A background task sleeps ``interval`` seconds at a time; any overshoot
+    is time the loop spent running something else without yielding, i.e.
+    how long every other session had to wait. Sync work on the loop (a
+    blocking index load or model call) shows up here directly.
+    """
+
+    def __init__(self, interval: float = 0.05, window: int = 1200, stall_threshold: float = 0.1) -> None:
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self._samples: deque[float] = deque(maxlen=window)
+        self._max_lag = 0.0
+        self._stalls = 0
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started - self.interval)
+            self._samples.append(lag)
+            self._max_lag = max(self._max_lag, lag)
+            if lag >= self.stall_threshold:
+                self._stalls += 1
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def reset(self) -> None:
+        self._samples.clear()
+        self._max_lag = 0.0
+        self._stalls = 0
+
+    def stats(self) -> dict[str, float | int]:
+        """Lag percentiles over the recent window, in milliseconds, plus lifetime max and stall count."""
+        ordered = sorted(self._samples)
+
+        def pct(q: float) -> float:
+            if not ordered:
+                return 0.0
+            return round(ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))] * 1000, 2)
+
+        return {
+            "samples": len(ordered),
+            "p50_ms": pct(50),
+            "p99_ms": pct(99),
+            "max_ms": round(self._max_lag * 1000, 2),
+            "stalls": self._stalls,
+            "stall_threshold_ms": round(self.stall_threshold * 1000, 2),
+        }
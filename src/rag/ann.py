@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+
+
+# Rows assigned to centroids per block, bounding the (rows x nlist) scores.
+ASSIGN_BLOCK_ROWS = 8192
+# k-means trains on at most this many points per list.
+TRAIN_POINTS_PER_LIST = 32
+TRAIN_ITERATIONS = 8
+
+
+@dataclass(frozen=True)
+class IVFSettings:
+    """
+    When and how the inverted-file index is used.
+
+    Stores with fewer than ``min_vectors`` rows keep the exact scan.
+    ``nprobe`` is the recall/latency knob: the number of lists scanned per
+    query. ``nlist`` overrides the trained list count (default sqrt(n)).
+    """
+
+    min_vectors: int = 20_000
+    nprobe: int = 16
+    nlist: int | None = None
+
+
+def suggest_nlist(num_vectors: int) -> int:
+    return max(1, int(np.sqrt(num_vectors)))
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    out = np.empty(vectors.shape[0], dtype=np.int32)
+    for start in range(0, vectors.shape[0], ASSIGN_BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + ASSIGN_BLOCK_ROWS], dtype=np.float32)
+        out[start:start + block.shape[0]] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+class IVFIndex:
+    """
+    Inverted-file index over the rows of an L2-normalised embedding matrix.
+
+    Rows are partitioned by their nearest of ``nlist`` spherical k-means
+    centroids; a query scores the centroids, then only the rows in the
+    ``nprobe`` closest lists. New rows are inserted by assigning them to the
+    existing centroids, so the index never has to be rebuilt on upsert;
+    ``needs_retrain`` says when the corpus has outgrown its list count.
+    """
+
+    def __init__(self, centroids: np.ndarray, assignments: np.ndarray) -> None:
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.assignments = np.asarray(assignments, dtype=np.int32)
+        self.fingerprint = hashlib.sha1(self.centroids.tobytes()).hexdigest()
+        self._order: np.ndarray | None = None
+        self._offsets: np.ndarray | None = None
+
+    @property
+    def nlist(self) -> int:
+        return int(self.centroids.shape[0])
+
+    @property
+    def num_vectors(self) -> int:
+        return int(self.assignments.shape[0])
+
+    # --- Building ------------------------------------------------------------
+
+    @classmethod
+    def train(
+        cls,
+        matrix: np.ndarray,
+        *,
+        nlist: int | None = None,
+        iterations: int = TRAIN_ITERATIONS,
+        seed: int = 0,
+    ) -> "IVFIndex":
+        """Run spherical k-means on a sample of ``matrix`` and assign every row."""
+        rng = np.random.default_rng(seed)
+        nlist = min(nlist or suggest_nlist(matrix.shape[0]), matrix.shape[0])
+        sample_size = min(matrix.shape[0], nlist * TRAIN_POINTS_PER_LIST)
+        sample_rows = np.sort(rng.choice(matrix.shape[0], sample_size, replace=False))
+        sample = np.asarray(matrix[sample_rows], dtype=np.float32)
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = _assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+            empty = counts == 0
+            # Re-seed empty lists from random sample points.
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = sums / norms
+        return cls(centroids, _assign(matrix, centroids))
+
+    def reassigned(self, matrix: np.ndarray) -> "IVFIndex":
+        """This index's centroids over the rows of another matrix."""
+        return IVFIndex(self.centroids, _assign(matrix, self.centroids))
+
+    def extend(self, vectors: np.ndarray) -> None:
+        """Insert new rows (appended to the matrix) into their nearest lists."""
+        self.assignments = np.concatenate([self.assignments, _assign(vectors, self.centroids)])
+        self._order = self._offsets = None
+
+    def take(self, rows: np.ndarray) -> "IVFIndex":
+        """Index over the kept ``rows`` after deletions, renumbered in order."""
+        return IVFIndex(self.centroids, self.assignments[rows])
+
+    @classmethod
+    def concat(cls, parts: Sequence["IVFIndex"]) -> "IVFIndex":
+        """Stack indexes that share centroids, in row order."""
+        if len({part.fingerprint for part in parts}) != 1:
+            raise ValueError("IVF indexes with different centroids cannot be concatenated.")
+        return cls(parts[0].centroids, np.concatenate([part.assignments for part in parts]))
+
+    def needs_retrain(self, settings: IVFSettings) -> bool:
+        """True once the corpus has grown about 4x past what the lists were trained for."""
+        if settings.nlist:
+            return self.nlist != min(settings.nlist, self.num_vectors)
+        return self.nlist * 2 < suggest_nlist(self.num_vectors)
+
+    # --- Search --------------------------------------------------------------
+
+    def _lists(self) -> tuple[np.ndarray, np.ndarray]:
+        if self._order is None:
+            self._order = np.argsort(self.assignments, kind="stable").astype(np.int64)
+            counts = np.bincount(self.assignments, minlength=self.nlist)
+            self._offsets = np.concatenate([[0], np.cumsum(counts)])
+        return self._order, self._offsets
+
+    def probe(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Sorted row numbers in the ``nprobe`` lists closest to ``query``."""
+        order, offsets = self._lists()
+        nprobe = min(nprobe, self.nlist)
+        scores = self.centroids @ query
+        nearest = np.argpartition(-scores, nprobe - 1)[:nprobe]
+        rows = np.concatenate([order[offsets[i]:offsets[i + 1]] for i in nearest])
+        rows.sort()
+        return rows
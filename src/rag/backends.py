@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import re
+from collections import Counter
+from typing import Any
+
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.base.llms.types import CompletionResponse, CompletionResponseGen, LLMMetadata
+from llama_index.core.llms import LLM
+from llama_index.core.llms.callbacks import llm_completion_callback
+from llama_index.core.llms.custom import CustomLLM
+
+from rag.lexical import tokenize
+
+
+BACKENDS = ("gemini", "local")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+# Delimiters of LlamaIndex's default question-answering prompt.
+_QA_QUERY_RE = re.compile(r"Query:\s*(.*?)\s*Answer:\s*$", re.S)
+_QA_CONTEXT_RE = re.compile(r"-{5,}\n(.*)\n-{5,}", re.S)
+
+
+# --- Local embedding ---------------------------------------------------------
+
+# Dimensions each feature touches; sparse +-1 projections preserve cosine
+# similarity about as well as dense Gaussian ones and need no cached vectors.
+FEATURE_NONZEROS = 8
+
+
+def hashing_embedding(text: str, dim: int) -> list[float]:
+    """
+    Sparse random-projection embedding of ``text``'s unigram and bigram counts.
+
+    Every feature adds its weight with a pseudo-random sign to
+    ``FEATURE_NONZEROS`` dimensions picked by its hash, so identical inputs
+    always embed identically, texts sharing terms land close together and no
+    vocabulary has to be fitted.
+    """
+    tokens = tokenize(text)
+    features = Counter(tokens)
+    features.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    if not features:
+        return [0.0] * dim
+    weights = np.asarray(
+        [(1.0 + math.log(count)) * (0.5 if " " in feature else 1.0) for feature, count in features.items()]
+    )
+    digests = b"".join(
+        hashlib.blake2b(feature.encode("utf-8"), digest_size=4 * FEATURE_NONZEROS).digest() for feature in features
+    )
+    hashes = np.frombuffer(digests, dtype="<u4").reshape(-1, FEATURE_NONZEROS)
+    values = np.where(hashes & 1, -weights[:, None], weights[:, None])
+    vector = np.bincount(((hashes >> 1) % dim).ravel(), weights=values.ravel(), minlength=dim)
+    norm = float(np.linalg.norm(vector))
+    return (vector / norm if norm else vector).astype(np.float32).tolist()
+
+
+class HashingEmbedding(BaseEmbedding):
+    """Deterministic, offline stand-in for a hosted embedding model."""
+
+    dim: int = 768
+
+    def __init__(self, dim: int = 768, **kwargs: Any) -> None:
+        kwargs.setdefault("model_name", f"local-sparse-hashing-{dim}")
+        super().__init__(dim=dim, **kwargs)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "HashingEmbedding"
+
+    def _get_query_embedding(self, query: str) -> list[float]:
+        return hashing_embedding(query, self.dim)
+
+    async def _aget_query_embedding(self, query: str) -> list[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> list[float]:
+        return hashing_embedding(text, self.dim)
+
+    def _get_text_embeddings(self, texts: list[str]) -> list[list[float]]:
+        return [hashing_embedding(text, self.dim) for text in texts]
+
+
+# --- Local "LLM" -------------------------------------------------------------
+
+def extractive_answer(prompt: str, max_sentences: int = 3) -> str:
+    """
+    Answer with the context sentences that share the most terms with the query.
+
+    The query and context are taken from LlamaIndex's QA prompt layout; any
+    other prompt is treated as context whose last line is the query.
+    """
+    query_match = _QA_QUERY_RE.search(prompt)
+    context_match = _QA_CONTEXT_RE.search(prompt)
+    if query_match and context_match:
+        query, context = query_match.group(1), context_match.group(1)
+    else:
+        context, _, query = prompt.rstrip().rpartition("\n")
+    terms = set(tokenize(query))
+    sentences = [s.strip() for s in _SENTENCE_RE.split(context) if s.strip()]
+    scored = [(len(terms & set(tokenize(s))), -i) for i, s in enumerate(sentences)]
+    ranked = sorted(range(len(sentences)), key=lambda i: scored[i], reverse=True)
+    chosen = [i for i in ranked if scored[i][0] > 0][:max_sentences] or ranked[:max_sentences]
+    return " ".join(sentences[i] for i in sorted(chosen))
+
+
+class ExtractiveLLM(CustomLLM):
+    """Deterministic, offline stand-in for the chat model: quotes the best-matching context."""
+
+    context_window: int = 32_768
+    num_output: int = 256
+    max_sentences: int = 3
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ExtractiveLLM"
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(
+            context_window=self.context_window,
+            num_output=self.num_output,
+            model_name="local-extractive",
+        )
+
+    @llm_completion_callback()
+    def complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponse:
+        return CompletionResponse(text=extractive_answer(prompt, self.max_sentences))
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt: str, formatted: bool = False, **kwargs: Any) -> CompletionResponseGen:
+        text = extractive_answer(prompt, self.max_sentences)
+        yield CompletionResponse(text=text, delta=text)
+
+
+# --- Selection ---------------------------------------------------------------
+
+def create_backends(
+    backend: str,
+    *,
+    api_key: str | None = None,
+    model_name: str | None = None,
+    embed_model_name: str | None = None,
+    local_dim: int = 768,
+) -> tuple[LLM, BaseEmbedding]:
+    """
+    Return the ``(llm, embedding model)`` pair for ``backend``.
+
+    "gemini" uses the hosted models and needs ``api_key``; "local" needs
+    neither network nor credentials.
+    """
+    if backend == "local":
+        return ExtractiveLLM(), HashingEmbedding(dim=local_dim)
+    if backend == "gemini":
+        if not api_key:
+            raise RuntimeError("GEMINI_API_KEY is missing. Add it to .env or the environment.")
+        from llama_index.embeddings.google import GoogleGenAIEmbedding
+        from llama_index.llms.gemini import Gemini
+
+        return (
+            Gemini(model=model_name, api_key=api_key),
+            GoogleGenAIEmbedding(model_name=embed_model_name, api_key=api_key),
+        )
+    raise ValueError(f"Unknown RAG backend {backend!r}; expected one of {BACKENDS}.")
@@ -0,0 +1,357 @@
+"""
+Async web crawler feeding webpages into the RAG index.
+
+    python src/rag/crawler.py https://example.com/pricing https://example.com/blog/launch
+    python src/rag/crawler.py --file sources.txt --per-host 4 --shard user:founder-42
+
+Pages are fetched through one pooled HTTP client with at most ``--per-host``
+requests in flight per host. URLs crawled before are requested
+conditionally (If-None-Match / If-Modified-Since from the shard's ingest
+ledger) and a page is re-embedded only when its extracted text changed, so
+refreshing hundreds of sources mostly costs 304 responses.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Sequence
+from urllib.parse import urlsplit
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import httpx
+from bs4 import BeautifulSoup, Tag
+from llama_index.core import Document
+
+from rag.ledger import FetchValidators, IngestLedger, content_hash
+
+
+DEFAULT_MAX_CONNECTIONS = 32
+DEFAULT_PER_HOST = 4
+DEFAULT_TIMEOUT = 20.0
+USER_AGENT = "HardlaunchCrawler/1.0"
+HTML_TYPES = ("text/html", "application/xhtml+xml")
+# Non-heading blocks whose text is mostly link text are navigation.
+MAX_LINK_DENSITY = 0.5
+
+# Elements that never hold page content.
+_CHROME_TAGS = (
+    "script", "style", "noscript", "template", "svg", "canvas", "iframe",
+    "form", "button", "nav", "header", "footer", "aside",
+)
+_CHROME_ROLES = {"navigation", "banner", "contentinfo", "complementary", "search", "dialog"}
+# Class/id words of page chrome, matched as whole words ("share-buttons", not "shareholders").
+_CHROME_WORDS = frozenset({
+    "cookie", "consent", "gdpr", "banner", "nav", "navbar", "menu", "breadcrumb", "footer",
+    "sidebar", "share", "sharing", "social", "subscribe", "newsletter", "signup", "advert",
+    "advertisement", "sponsor", "promo", "popup", "modal", "related", "comment",
+})
+# Words of a class/id: split at separators and camelCase humps ("cookieBanner", "nav_menu").
+_NAME_WORD_RE = re.compile(r"[A-Z]?[a-z0-9]+|[A-Z]+(?![a-z])")
+# Containers a chrome-like class name must never remove wholesale.
+_PROTECTED_TAGS = {"html", "body", "main", "article"}
+_BLOCK_TAGS = (
+    "h1", "h2", "h3", "h4", "h5", "h6", "p", "li", "pre", "blockquote",
+    "td", "th", "dd", "dt", "figcaption",
+)
+_HEADINGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+_SPACE_RE = re.compile(r"\s+")
+
+
+# --- Extraction --------------------------------------------------------------
+
+def _is_chrome(tag: Tag) -> bool:
+    if tag.name in _PROTECTED_TAGS:
+        return False
+    if (tag.get("role") or "").lower() in _CHROME_ROLES or tag.get("aria-hidden") == "true":
+        return True
+    names = " ".join([*(tag.get("class") or []), tag.get("id") or ""])
+    for word in _NAME_WORD_RE.findall(names):
+        word = word.lower()
+        if word in _CHROME_WORDS or word.removesuffix("s") in _CHROME_WORDS:
+            return True
+    return False
+
+
+def _text(tag: Tag) -> str:
+    return _SPACE_RE.sub(" ", tag.get_text(" ", strip=True)).strip()
+
+
+def _nested_in_block(tag: Tag, root: Tag) -> bool:
+    for parent in tag.parents:
+        if parent is root:
+            return False
+        if parent.name in _BLOCK_TAGS:
+            return True
+    return False
+
+
+def extract_main_text(html: str) -> tuple[str, str]:
+    """
+    Return ``(title, text)`` of a page's main content.
+
+    Scripts, navigation, headers, footers, asides, forms and elements whose
+    role, class or id mark them as page chrome (cookie banners, menus, share
+    bars) are dropped, the largest ``<article>``/``<main>`` is preferred over
+    the whole body, and paragraph-level blocks that are mostly link text are
+    skipped. Blocks are separated by blank lines.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    title = _text(soup.title) if soup.title else ""
+    for tag in soup.find_all(_CHROME_TAGS):
+        if not tag.decomposed:
+            tag.decompose()
+    for tag in soup.find_all(_is_chrome):
+        if not tag.decomposed:
+            tag.decompose()
+    candidates = soup.find_all(["article", "main"]) or soup.find_all(attrs={"role": "main"})
+    root = max(candidates, key=lambda tag: len(_text(tag))) if candidates else (soup.body or soup)
+
+    blocks: list[str] = []
+    for tag in root.find_all(_BLOCK_TAGS):
+        if _nested_in_block(tag, root):
+            continue
+        text = _text(tag)
+        if not text or (blocks and blocks[-1] == text):
+            continue
+        link_chars = sum(len(_text(a)) for a in tag.find_all("a"))
+        if tag.name not in _HEADINGS and link_chars / len(text) > MAX_LINK_DENSITY:
+            continue
+        blocks.append(text)
+    if not blocks:
+        # Pages built from bare <div>s: keep every line of visible text.
+        lines = (_SPACE_RE.sub(" ", line).strip() for line in root.get_text("\n").splitlines())
+        blocks = [line for line in lines if line]
+    return title, "\n\n".join(blocks)
+
+
+# --- Fetching ----------------------------------------------------------------
+
+@dataclass
+class FetchResult:
+    """
+    Outcome of fetching one URL.
+
+    ``status`` is "changed" (``document`` holds the new text), "not_modified"
+    (the server answered 304), "unchanged" (refetched but the extracted text
+    hashes the same) or "failed" (``error`` says why).
+    """
+
+    url: str
+    status: str
+    document: Document | None = None
+    validators: FetchValidators | None = None
+    http_status: int | None = None
+    error: str | None = None
+    seconds: float = 0.0
+
+
+class Crawler:
+    """
+    Pooled async HTTP client that fetches pages conditionally.
+
+    One ``httpx.AsyncClient`` (keep-alive pool of ``max_connections``) is
+    shared by every request and each host gets at most ``per_host``
+    requests in flight. With a ``ledger``, URLs fetched before send their
+    stored validators, and text that hashes like the last fetch is
+    reported "unchanged" rather than "changed". Use as an async context
+    manager.
+    """
+
+    def __init__(
+        self,
+        ledger: IngestLedger | None = None,
+        *,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        per_host: int = DEFAULT_PER_HOST,
+        timeout: float = DEFAULT_TIMEOUT,
+        conditional: bool = True,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        self.ledger = ledger
+        self.per_host = max(per_host, 1)
+        self.conditional = conditional
+        self._client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(timeout),
+            follow_redirects=True,
+            headers={"User-Agent": USER_AGENT},
+            transport=transport,
+        )
+        self._hosts: dict[str, asyncio.Semaphore] = {}
+
+    async def __aenter__(self) -> "Crawler":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self._client.aclose()
+
+    def _host_slot(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc.lower()
+        slot = self._hosts.get(host)
+        if slot is None:
+            slot = self._hosts[host] = asyncio.Semaphore(self.per_host)
+        return slot
+
+    async def fetch(self, url: str) -> FetchResult:
+        previous = self.ledger.fetch_validators(url) if self.ledger is not None else None
+        headers = {}
+        if previous is not None and self.conditional:
+            if previous.etag:
+                headers["If-None-Match"] = previous.etag
+            if previous.last_modified:
+                headers["If-Modified-Since"] = previous.last_modified
+        started = time.perf_counter()
+        try:
+            async with self._host_slot(url):
+                response = await self._client.get(url, headers=headers)
+        except httpx.HTTPError as e:
+            return FetchResult(url, "failed", error=f"{type(e).__name__}: {e}", seconds=time.perf_counter() - started)
+        elapsed = time.perf_counter() - started
+        if response.status_code == 304 and previous is not None:
+            return FetchResult(url, "not_modified", validators=previous, http_status=304, seconds=elapsed)
+        if response.status_code >= 400:
+            return FetchResult(url, "failed", http_status=response.status_code,
+                               error=f"HTTP {response.status_code}", seconds=elapsed)
+
+        content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+        if not content_type or content_type in HTML_TYPES:
+            # Parsing is CPU-bound; keep the loop free for the other fetches.
+            title, text = await asyncio.to_thread(extract_main_text, response.text)
+        elif content_type.startswith("text/"):
+            title, text = "", response.text.strip()
+        else:
+            return FetchResult(url, "failed", http_status=response.status_code,
+                               error=f"Unsupported content type {content_type}", seconds=elapsed)
+        if not text:
+            return FetchResult(url, "failed", http_status=response.status_code,
+                               error="No text extracted", seconds=elapsed)
+
+        digest = content_hash(text)
+        validators = FetchValidators(
+            url, response.headers.get("etag"), response.headers.get("last-modified"), digest
+        )
+        if previous is not None and previous.content_hash == digest:
+            return FetchResult(url, "unchanged", validators=validators,
+                               http_status=response.status_code, seconds=elapsed)
+        metadata = {"source": url}
+        if title:
+            metadata["title"] = title
+        return FetchResult(
+            url,
+            "changed",
+            document=Document(text=text, metadata=metadata),
+            validators=validators,
+            http_status=response.status_code,
+            seconds=elapsed,
+        )
+
+    async def crawl(self, urls: Iterable[str]) -> list[FetchResult]:
+        """Fetch every distinct URL concurrently, within the pool and per-host limits."""
+        return list(await asyncio.gather(*(self.fetch(url) for url in dict.fromkeys(urls))))
+
+
+# --- Ingestion ---------------------------------------------------------------
+
+@dataclass
+class CrawlStats:
+    urls: int = 0
+    changed: int = 0
+    not_modified: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    indexed: int = 0
+    failures: list[tuple[str, str]] = field(default_factory=list)
+    seconds: dict[str, float] = field(default_factory=lambda: {"fetch": 0.0, "upsert": 0.0})
+
+    def report(self) -> str:
+        lines = [
+            f"urls: {self.urls} crawled in {self.seconds['fetch']:.1f}s, {self.changed} changed, "
+            f"{self.not_modified} not modified, {self.unchanged} unchanged, {self.failed} failed",
+            f"upsert: {self.indexed} documents indexed in {self.seconds['upsert']:.1f}s",
+        ]
+        lines.extend(f"failed: {url}: {error}" for url, error in self.failures)
+        return "\n".join(lines)
+
+
+async def aingest_urls(
+    urls: Sequence[str],
+    *,
+    shard: str | None = None,
+    force: bool = False,
+    **crawler_options,
+) -> CrawlStats:
+    """
+    Crawl ``urls`` and upsert the pages whose text changed into ``shard``'s index.
+
+    Validators are recorded in the shard's ledger only after the upsert
+    succeeds, so a failed run is retried in full next time. ``force`` skips
+    the conditional headers (every page is downloaded again) but unchanged
+    text is still not re-embedded.
+    """
+    from rag import service
+
+    shard = shard or service.GLOBAL_SHARD
+    ledger = service.shard_ledger(shard)
+    stats = CrawlStats()
+    started = time.perf_counter()
+    async with Crawler(ledger, conditional=not force, **crawler_options) as crawler:
+        results = await crawler.crawl(urls)
+    stats.seconds["fetch"] = time.perf_counter() - started
+    stats.urls = len(results)
+    for result in results:
+        setattr(stats, result.status, getattr(stats, result.status) + 1)
+        if result.error:
+            stats.failures.append((result.url, result.error))
+
+    documents = [result.document for result in results if result.document is not None]
+    started = time.perf_counter()
+    if documents:
+        stats.indexed = await asyncio.to_thread(service.upsert_documents, documents, shard=shard)
+    ledger.record_fetches([result.validators for result in results if result.validators is not None])
+    stats.seconds["upsert"] = time.perf_counter() - started
+    return stats
+
+
+def ingest_urls(urls: Sequence[str], **options) -> CrawlStats:
+    """Blocking ``aingest_urls`` for scripts; see it for the options."""
+    return asyncio.run(aingest_urls(urls, **options))
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("urls", nargs="*", help="pages to crawl")
+    parser.add_argument("--file", default=None, help="file with one URL per line")
+    parser.add_argument("--per-host", type=int, default=DEFAULT_PER_HOST, help="requests in flight per host")
+    parser.add_argument("--max-connections", type=int, default=DEFAULT_MAX_CONNECTIONS, help="pooled connections")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="seconds per request")
+    parser.add_argument("--shard", default=None, help="target index (default: global; a user's is user:<id>)")
+    parser.add_argument("--force", action="store_true", help="download every page even if the server says unchanged")
+    args = parser.parse_args(argv)
+
+    urls = list(args.urls)
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            urls.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    if not urls:
+        parser.error("no URLs given")
+    stats = ingest_urls(
+        urls,
+        shard=args.shard,
+        force=args.force,
+        per_host=args.per_host,
+        max_connections=args.max_connections,
+        timeout=args.timeout,
+    )
+    print(stats.report())
+
+
+if __name__ == "__main__":
+    main()
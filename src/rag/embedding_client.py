@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import re
+import threading
+import time
+from typing import Any, Callable
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+
+# Rough size of an embedding request in tokens; quotas are metered per token.
+CHARS_PER_TOKEN = 4
+RETRYABLE_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+_STATUS_IN_MESSAGE_RE = re.compile(r"\b(408|429|500|502|503|504)\b|RESOURCE_EXHAUSTED|UNAVAILABLE|DEADLINE_EXCEEDED")
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def error_status(exc: BaseException) -> int | None:
+    """HTTP status carried by an API client exception, if any."""
+    for attr in ("code", "status_code"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Quota (429), timeout and server (5xx) errors are worth retrying; anything else is not."""
+    status = error_status(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return isinstance(exc, (TimeoutError, ConnectionError)) or bool(_STATUS_IN_MESSAGE_RE.search(str(exc)))
+
+
+def embed_queries(model: BaseEmbedding, queries: list[str]) -> list[list[float]]:
+    """
+    Query-type embeddings of ``queries``, batched where the model allows it.
+
+    Wrappers with ``get_query_embedding_batch`` batch the queries themselves;
+    ``GoogleGenAIEmbedding`` embeds a whole batch in one call with the
+    RETRIEVAL_QUERY task type. LlamaIndex has no batched query call in
+    general, so any other model embeds the queries one by one.
+    """
+    embed_batch = getattr(model, "get_query_embedding_batch", None)
+    if embed_batch is not None:
+        return embed_batch(queries)
+    embed_texts = getattr(model, "_embed_texts", None)
+    if embed_texts is not None:
+        return embed_texts(queries, task_type="RETRIEVAL_QUERY")
+    return [model.get_query_embedding(query) for query in queries]
+
+
+# --- Rate limiting -----------------------------------------------------------
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at ``limit`` units per ``period`` seconds.
+
+    The bucket holds ``burst`` of one period's allowance (at least one
+    unit), so traffic stays close to the steady rate instead of spending a
+    whole quota window at once. Reservations may overdraw it: a request
+    larger than the bucket just waits longer. A ``None`` limit never blocks.
+    """
+
+    def __init__(self, limit: float | None, *, period: float = 60.0, burst: float = 0.1) -> None:
+        self.limit = limit or None
+        self.period = period
+        self.capacity = max(1.0, (limit or 0) * burst)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """Take ``amount`` units and return how long to sleep before using them."""
+        if not self.limit:
+            return 0.0
+        rate = self.limit / self.period
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * rate)
+            self._updated = now
+            self._tokens -= amount
+            return -self._tokens / rate if self._tokens < 0 else 0.0
+
+
+# --- Embedding model wrapper -------------------------------------------------
+
+class RateLimitedEmbedding(BaseEmbedding):
+    """
+    Wrap an embedding model so each batch is one quota-aware request.
+
+    Texts are sent in batches of up to ``max_batch`` (capped further so a
+    batch fits the token budget); every request first draws from the
+    requests-per-minute and tokens-per-minute buckets (``quota_period``
+    only shortens the "minute" for tests and benchmarks), and quota,
+    timeout or 5xx errors are retried with full-jitter exponential backoff.
+    The wrapped model's name is kept so cached embeddings stay valid.
+    """
+
+    _inner: BaseEmbedding = PrivateAttr()
+    _rpm: TokenBucket = PrivateAttr()
+    _tpm: TokenBucket = PrivateAttr()
+    _max_retries: int = PrivateAttr()
+    _backoff_base: float = PrivateAttr()
+    _backoff_max: float = PrivateAttr()
+    _sleep: Callable[[float], None] = PrivateAttr()
+    _stats: dict[str, float] = PrivateAttr()
+    _stats_lock: threading.Lock = PrivateAttr()
+    _in_flight: int = PrivateAttr()
+    _busy_since: float = PrivateAttr()
+
+    def __init__(
+        self,
+        inner: BaseEmbedding,
+        *,
+        max_batch: int = 100,
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+        max_retries: int = 6,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        quota_period: float = 60.0,
+        sleep: Callable[[float], None] = time.sleep,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(model_name=inner.model_name, embed_batch_size=max_batch, **kwargs)
+        self._inner = inner
+        self._rpm = TokenBucket(requests_per_minute, period=quota_period)
+        self._tpm = TokenBucket(tokens_per_minute, period=quota_period)
+        self._max_retries = max_retries
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+        self._sleep = sleep
+        self._stats = {
+            "requests": 0,
+            "embeddings": 0,
+            "tokens": 0,
+            "retries": 0,
+            "failures": 0,
+            "throttled_seconds": 0.0,
+            "backoff_seconds": 0.0,
+            "busy_seconds": 0.0,
+        }
+        self._stats_lock = threading.Lock()
+        self._in_flight = 0
+        self._busy_since = 0.0
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "RateLimitedEmbedding"
+
+    @property
+    def inner(self) -> BaseEmbedding:
+        return self._inner
+
+    def _batches(self, texts: list[str]) -> list[list[str]]:
+        """Split ``texts`` into the fewest requests allowed by the batch size and token quota."""
+        token_cap = self._tpm.limit or float("inf")
+        batches: list[list[str]] = []
+        current: list[str] = []
+        tokens = 0
+        for text in texts:
+            cost = estimate_tokens(text)
+            if current and (len(current) >= self.embed_batch_size or tokens + cost > token_cap):
+                batches.append(current)
+                current, tokens = [], 0
+            current.append(text)
+            tokens += cost
+        if current:
+            batches.append(current)
+        return batches
+
+    def _count(self, key: str, amount: float = 1) -> None:
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _request(self, call: Callable[[], Any], texts: list[str]) -> Any:
+        """Run one embedding request under the rate limits, retrying transient failures."""
+        tokens = sum(estimate_tokens(text) for text in texts)
+        with self._stats_lock:
+            if self._in_flight == 0:
+                self._busy_since = time.perf_counter()
+            self._in_flight += 1
+        try:
+            for attempt in range(self._max_retries + 1):
+                wait = max(self._rpm.reserve(1), self._tpm.reserve(tokens))
+                if wait > 0:
+                    self._count("throttled_seconds", wait)
+                    self._sleep(wait)
+                try:
+                    result = call()
+                except Exception as e:
+                    if attempt == self._max_retries or not is_retryable(e):
+                        self._count("failures")
+                        raise
+                    delay = random.uniform(0, min(self._backoff_max, self._backoff_base * 2 ** attempt))
+                    self._count("retries")
+                    self._count("backoff_seconds", delay)
+                    self._sleep(delay)
+                    continue
+                with self._stats_lock:
+                    self._stats["requests"] += 1
+                    self._stats["embeddings"] += len(texts)
+                    self._stats["tokens"] += tokens
+                return result
+        finally:
+            with self._stats_lock:
+                self._in_flight -= 1
+                if self._in_flight == 0:
+                    self._stats["busy_seconds"] += time.perf_counter() - self._busy_since
+
+    def _get_query_embedding(self, query: str) -> list[float]:
+        return self._request(lambda: self._inner.get_query_embedding(query), [query])
+
+    async def _aget_query_embedding(self, query: str) -> list[float]:
+        return await asyncio.to_thread(self._get_query_embedding, query)
+
+    def get_query_embedding_batch(self, queries: list[str]) -> list[list[float]]:
+        """Embed ``queries`` as queries, one quota-aware request per batch (see ``embed_queries``)."""
+        vectors: list[list[float]] = []
+        for batch in self._batches(queries):
+            vectors.extend(self._request(lambda: embed_queries(self._inner, batch), batch))
+        return vectors
+
+    def _get_text_embedding(self, text: str) -> list[float]:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_text_embeddings(self, texts: list[str]) -> list[list[float]]:
+        vectors: list[list[float]] = []
+        for batch in self._batches(texts):
+            # The inner model's own batching is bypassed: one batch, one request.
+            vectors.extend(self._request(lambda: self._inner._get_text_embeddings(batch), batch))
+        return vectors
+
+    async def _aget_text_embeddings(self, texts: list[str]) -> list[list[float]]:
+        return await asyncio.to_thread(self._get_text_embeddings, texts)
+
+    async def _aget_text_embedding(self, text: str) -> list[float]:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def stats(self) -> dict[str, float]:
+        """Request/retry counters and achieved embeddings per second of busy (in-flight) time."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+            if self._in_flight:
+                stats["busy_seconds"] += time.perf_counter() - self._busy_since
+        busy = stats["busy_seconds"]
+        stats["embeddings_per_second"] = round(stats["embeddings"] / busy, 2) if busy else 0.0
+        stats["requests_per_minute_limit"] = self._rpm.limit
+        stats["tokens_per_minute_limit"] = self._tpm.limit
+        stats["max_batch"] = self.embed_batch_size
+        return stats
@@ -0,0 +1,248 @@
+"""
+Non-interactive batch ingestion into the RAG persist dir.
+
+    python src/rag/ingest.py src/data
+    python src/rag/ingest.py "reports/**/*.pdf" notes.txt --workers 8
+    python src/rag/ingest.py uploads/founder-42 --shard user:founder-42
+
+Files are extracted in worker processes, chunked, embedded in batched
+requests through the shared quota-aware embedding client (``RAG_EMBED_RPM``
+/ ``RAG_EMBED_TPM``) and upserted through ``rag.service``. Files whose
+content hash matches the last successful run are skipped.
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from llama_index.core import Document
+
+from rag.ledger import file_hash
+from rag.pdf_stream import iter_pdf_pages
+
+
+SUPPORTED_SUFFIXES = (".pdf", ".txt", ".md")
+# Identifies a file in the ingest ledger; kept out of embeddings and prompts.
+SOURCE_ID_KEY = "source_id"
+
+
+# --- File discovery ------------------------------------------------------
+
+def discover_files(targets: Iterable[str]) -> list[Path]:
+    """Expand directories (recursively) and glob patterns into supported files."""
+    found: dict[Path, None] = {}
+    for target in targets:
+        path = Path(target)
+        if path.is_dir():
+            candidates = sorted(p for p in path.rglob("*") if p.is_file())
+        else:
+            candidates = sorted(Path(p) for p in glob.glob(target, recursive=True))
+        for candidate in candidates:
+            if candidate.suffix.lower() in SUPPORTED_SUFFIXES:
+                found.setdefault(candidate.resolve(), None)
+    return list(found)
+
+
+# --- Extraction (worker processes) -------------------------------------------
+
+def source_key(path: str | Path) -> str:
+    return f"file:{path}"
+
+
+def extract_file(path: str) -> tuple[str, list[Document], int]:
+    """Return ``(path, documents, pages)`` for one file; runs in a worker."""
+    metadata = {SOURCE_ID_KEY: source_key(path)}
+    if path.lower().endswith(".pdf"):
+        # Already inside a worker: extract this file's pages inline.
+        docs = list(iter_pdf_pages(path, workers=1, metadata={**metadata, "source": "pdf"}))
+        pages = len(docs)
+    else:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            text = f.read()
+        docs = [Document(text=text, metadata={**metadata, "filename": Path(path).name, "source": "file"})]
+        docs, pages = (docs if text.strip() else []), 1
+    for doc in docs:
+        doc.excluded_embed_metadata_keys.append(SOURCE_ID_KEY)
+        doc.excluded_llm_metadata_keys.append(SOURCE_ID_KEY)
+    return path, docs, pages
+
+
+# --- Stats -------------------------------------------------------------------
+
+@dataclass
+class IngestStats:
+    files_seen: int = 0
+    files_skipped: int = 0
+    files_ingested: int = 0
+    files_failed: int = 0
+    pages: int = 0
+    chunks: int = 0
+    embeddings: int = 0
+    embed_requests: int = 0
+    planned: list[str] = field(default_factory=list)
+    # Busy seconds per stage; extraction is wall time since it runs in parallel.
+    seconds: dict[str, float] = field(
+        default_factory=lambda: {"extract": 0.0, "chunk": 0.0, "embed": 0.0, "upsert": 0.0}
+    )
+
+    def rate(self, count: int, stage: str) -> float:
+        elapsed = self.seconds[stage]
+        return count / elapsed if elapsed else 0.0
+
+    def report(self) -> str:
+        return "\n".join([
+            f"files: {self.files_seen} seen, {self.files_ingested} ingested, "
+            f"{self.files_skipped} unchanged, {self.files_failed} failed",
+            f"extract: {self.pages} pages in {self.seconds['extract']:.1f}s "
+            f"({self.rate(self.pages, 'extract'):.1f} pages/s)",
+            f"chunk:   {self.chunks} chunks in {self.seconds['chunk']:.1f}s "
+            f"({self.rate(self.chunks, 'chunk'):.1f} chunks/s)",
+            f"embed:   {self.embeddings} embeddings in {self.embed_requests} requests, "
+            f"{self.seconds['embed']:.1f}s ({self.rate(self.embeddings, 'embed'):.1f} embeddings/s)",
+            f"upsert:  {self.seconds['upsert']:.1f}s",
+        ])
+
+
+# --- Pipeline ----------------------------------------------------------------
+
+def ingest(
+    targets: Iterable[str],
+    *,
+    workers: int | None = None,
+    batch_docs: int | None = None,
+    embed_batch: int | None = None,
+    force: bool = False,
+    dry_run: bool = False,
+    shard: str | None = None,
+) -> IngestStats:
+    """
+    Ingest every supported file under ``targets`` and return throughput stats.
+
+    Extracted documents are flushed to ``shard``'s index (the global one by
+    default) in batches of ``batch_docs`` (``RAG_INGEST_BATCH_DOCS`` by
+    default) after being checked against the shard's ingest ledger, so
+    unchanged pages are not re-embedded and changed ones replace their
+    previous version. A file's hash is recorded only once all of its
+    documents have been upserted.
+    """
+    from rag import service
+
+    stats = IngestStats()
+    shard = shard or service.GLOBAL_SHARD
+    ledger = service.shard_ledger(shard)
+    batch_docs = batch_docs or service.INGEST_BATCH_DOCS
+
+    todo: dict[str, str] = {}
+    for path in discover_files(targets):
+        stats.files_seen += 1
+        digest = file_hash(path)
+        if not force and ledger.source_unchanged(source_key(path), digest):
+            stats.files_skipped += 1
+            continue
+        todo[str(path)] = digest
+    stats.planned = list(todo)
+    if dry_run or not todo:
+        return stats
+
+    pending_docs: list[Document] = []
+    pending_files: list[str] = []
+    seen: set[str] = set()
+
+    def flush() -> None:
+        if not pending_files:
+            return
+        t0 = time.perf_counter()
+        # Files are flushed with all of their pages, so shrunk files lose their extra pages.
+        plan = ledger.plan(pending_docs, seen=seen, whole_files=True)
+        nodes = service.chunk_documents(plan.documents)
+        t1 = time.perf_counter()
+        stats.embed_requests += service.embed_nodes(nodes, batch_size=embed_batch)
+        t2 = time.perf_counter()
+        service.upsert_nodes(
+            nodes,
+            {doc.doc_id: doc.hash for doc in plan.documents},
+            replaced_doc_ids=plan.replaced_doc_ids,
+            ledger_entries=plan.entries,
+            retired_source_ids=plan.retired_source_ids,
+            shard=shard,
+        )
+        t3 = time.perf_counter()
+        stats.chunks += len(nodes)
+        stats.embeddings += len(nodes)
+        stats.seconds["chunk"] += t1 - t0
+        stats.seconds["embed"] += t2 - t1
+        stats.seconds["upsert"] += t3 - t2
+        for path in pending_files:
+            ledger.record_source(source_key(path), todo[path])
+        stats.files_ingested += len(pending_files)
+        pending_docs.clear()
+        pending_files.clear()
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        futures = [pool.submit(extract_file, path) for path in todo]
+        for future in as_completed(futures):
+            try:
+                path, docs, pages = future.result()
+            except Exception as e:
+                print(f"❌ Extraction failed: {e}", file=sys.stderr)
+                stats.files_failed += 1
+                continue
+            stats.pages += pages
+            pending_docs.extend(docs)
+            pending_files.append(path)
+            if len(pending_docs) >= batch_docs:
+                flush()
+        # Flushes run in this process while workers keep extracting, so
+        # extraction is credited with the wall time not spent flushing.
+        flushing = sum(v for stage, v in stats.seconds.items() if stage != "extract")
+        stats.seconds["extract"] = time.perf_counter() - started - flushing
+    flush()
+    return stats
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("targets", nargs="+", help="directories, files or glob patterns")
+    parser.add_argument("--workers", type=int, default=None, help="extraction processes (default: CPU count)")
+    parser.add_argument("--batch-docs", type=int, default=None, help="documents per index segment")
+    parser.add_argument("--embed-batch", type=int, default=None, help="texts per embedding request")
+    parser.add_argument("--force", action="store_true", help="re-ingest files even if unchanged")
+    parser.add_argument("--dry-run", action="store_true", help="only report which files would be ingested")
+    parser.add_argument("--shard", default=None, help="target index (default: global; a user's is user:<id>)")
+    args = parser.parse_args(argv)
+
+    stats = ingest(
+        args.targets,
+        workers=args.workers,
+        batch_docs=args.batch_docs,
+        embed_batch=args.embed_batch,
+        force=args.force,
+        dry_run=args.dry_run,
+        shard=args.shard,
+    )
+    if args.dry_run:
+        for path in stats.planned:
+            print(f"would ingest {path}")
+    print(stats.report())
+    if stats.embed_requests:
+        from rag import service
+
+        client = service.embedding_client_stats()
+        print(f"quota:   {client['retries']} retried requests, {client['throttled_seconds']:.1f}s throttled, "
+              f"{client['backoff_seconds']:.1f}s backing off")
+
+
+if __name__ == "__main__":
+    main()
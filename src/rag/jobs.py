@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import multiprocessing as mp
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import BinaryIO
+
+from rag.ingest import SOURCE_ID_KEY, SUPPORTED_SUFFIXES, extract_file
+
+
+JOB_STAGES = ("queued", "extracting", "chunking", "embedding", "upserting", "done", "failed")
+COPY_CHUNK_BYTES = 1024 * 1024
+_UNSAFE_FILENAME_RE = re.compile(r"[^A-Za-z0-9._ -]+")
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the ingestion queue already holds its maximum of jobs."""
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds the configured size cap."""
+
+
+def safe_filename(filename: str) -> str:
+    name = _UNSAFE_FILENAME_RE.sub("_", Path(filename or "").name).strip(" .")
+    return name or "upload"
+
+
+# --- Jobs --------------------------------------------------------------------
+
+@dataclass
+class IngestJob:
+    """Progress of one uploaded file through extraction, embedding and upsert."""
+
+    job_id: str
+    filename: str
+    shard: str
+    path: Path
+    size_bytes: int
+    stage: str = "queued"
+    pages: int = 0
+    documents: int = 0
+    unchanged_documents: int = 0
+    chunks: int = 0
+    chunks_embedded: int = 0
+    error: str | None = None
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    embed_started_at: float | None = None
+    embed_finished_at: float | None = None
+    finished_at: float | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.stage in ("done", "failed")
+
+    def to_dict(self) -> dict[str, object]:
+        now = self.finished_at or time.time()
+        embed_seconds = (self.embed_finished_at or now) - self.embed_started_at if self.embed_started_at else 0.0
+        return {
+            "job_id": self.job_id,
+            "filename": self.filename,
+            "shard": self.shard,
+            "stage": self.stage,
+            "size_bytes": self.size_bytes,
+            "pages": self.pages,
+            "documents": self.documents,
+            "unchanged_documents": self.unchanged_documents,
+            "chunks": self.chunks,
+            "chunks_embedded": self.chunks_embedded,
+            "progress": round(self.chunks_embedded / self.chunks, 3) if self.chunks else float(self.finished),
+            "chunks_per_second": round(self.chunks_embedded / embed_seconds, 2) if embed_seconds > 0 else 0.0,
+            "queued_seconds": round((self.started_at or now) - self.created_at, 3),
+            "elapsed_seconds": round(now - (self.started_at or now), 3),
+            "error": self.error,
+        }
+
+
+# --- Queue -------------------------------------------------------------------
+
+class IngestionQueue:
+    """
+    Bounded background pool that ingests uploaded files into an index shard.
+
+    Jobs run on their own threads, apart from request handling and the RAG
+    lookup pool; PDF/text extraction runs in separate processes so it does
+    not hold the server's GIL. At most ``max_pending`` jobs are queued or
+    running at once; ``submit`` raises ``QueueFullError`` beyond that. Job
+    state lives in this process only (the last ``history`` jobs are kept);
+    an upload's directory is deleted once its job finishes or fails.
+    """
+
+    def __init__(
+        self,
+        upload_dir: Path,
+        *,
+        workers: int = 2,
+        max_pending: int = 32,
+        max_upload_bytes: int | None = None,
+        history: int = 1000,
+    ) -> None:
+        self.upload_dir = Path(upload_dir)
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self.max_upload_bytes = max_upload_bytes
+        self.history = history
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="rag-ingest-job")
+        self._extractor: ProcessPoolExecutor | None = None
+        self._jobs: OrderedDict[str, IngestJob] = OrderedDict()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._counts = {"submitted": 0, "done": 0, "failed": 0, "rejected": 0}
+
+    def store_upload(self, stream: BinaryIO, filename: str) -> tuple[str, Path, int]:
+        """
+        Copy an upload stream to its own directory in fixed-size chunks.
+
+        Returns ``(job_id, path, size)``; the partial file is removed and
+        ``UploadTooLargeError`` raised once ``max_upload_bytes`` is exceeded.
+        Blocking: call it from a worker thread in async code.
+        """
+        job_id = uuid.uuid4().hex
+        target = self.upload_dir / job_id / safe_filename(filename)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        size = 0
+        try:
+            with open(target, "wb") as out:
+                while chunk := stream.read(COPY_CHUNK_BYTES):
+                    size += len(chunk)
+                    if self.max_upload_bytes and size > self.max_upload_bytes:
+                        raise UploadTooLargeError(
+                            f"{filename} is larger than {self.max_upload_bytes / (1024 * 1024):g} MB"
+                        )
+                    out.write(chunk)
+        except BaseException:
+            shutil.rmtree(target.parent, ignore_errors=True)
+            raise
+        return job_id, target, size
+
+    def discard_upload(self, path: Path) -> None:
+        shutil.rmtree(Path(path).parent, ignore_errors=True)
+
+    def submit(self, job_id: str, path: Path, *, filename: str, shard: str) -> IngestJob:
+        if Path(path).suffix.lower() not in SUPPORTED_SUFFIXES:
+            raise ValueError(f"unsupported file type {Path(path).suffix!r}; expected one of {SUPPORTED_SUFFIXES}")
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._counts["rejected"] += 1
+                raise QueueFullError(f"ingestion queue is full ({self.max_pending} jobs pending)")
+            self._pending += 1
+            self._counts["submitted"] += 1
+            job = IngestJob(job_id, filename, shard, Path(path), Path(path).stat().st_size)
+            self._jobs[job_id] = job
+            self._trim_history()
+        self._pool.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> IngestJob | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self, shard: str | None = None) -> list[IngestJob]:
+        with self._lock:
+            return [job for job in self._jobs.values() if shard is None or job.shard == shard]
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if not job.finished and job.stage != "queued")
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                "running": running,
+                **self._counts,
+            }
+
+    def shutdown(self, wait: bool = False) -> None:
+        self._pool.shutdown(wait=wait, cancel_futures=not wait)
+        if self._extractor is not None:
+            self._extractor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def _trim_history(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(self._jobs) - self.history)]:
+            del self._jobs[job_id]
+
+    def _extract(self, path: Path):
+        with self._lock:
+            if self._extractor is None:
+                # Spawned, not forked: the server process is full of threads.
+                self._extractor = ProcessPoolExecutor(max_workers=self.workers, mp_context=mp.get_context("spawn"))
+            extractor = self._extractor
+        return extractor.submit(extract_file, str(path)).result()
+
+    def _run(self, job: IngestJob) -> None:
+        from rag import service
+
+        job.started_at = time.time()
+        try:
+            job.stage = "extracting"
+            _, docs, job.pages = self._extract(job.path)
+            for doc in docs:
+                # Key the ledger by upload name so a re-upload replaces the old version.
+                doc.metadata["filename"] = job.filename
+                doc.metadata[SOURCE_ID_KEY] = f"upload:{job.filename}"
+            ledger = service.shard_ledger(job.shard)
+            # One upload is the whole file: pages a previous version had beyond these are deleted.
+            plan = ledger.plan(docs, whole_files=True)
+            job.documents, job.unchanged_documents = len(plan.documents), plan.skipped
+            if plan.documents or plan.replaced_doc_ids:
+                job.stage = "chunking"
+                nodes = service.chunk_documents(plan.documents)
+                job.chunks = len(nodes)
+                job.stage = "embedding"
+                job.embed_started_at = time.time()
+                size = service.Settings.embed_model.embed_batch_size
+                for start in range(0, len(nodes), size):
+                    batch = nodes[start:start + size]
+                    service.embed_nodes(batch, batch_size=size)
+                    job.chunks_embedded += len(batch)
+                job.embed_finished_at = time.time()
+                job.stage = "upserting"
+                service.upsert_nodes(
+                    nodes,
+                    {doc.doc_id: doc.hash for doc in plan.documents},
+                    replaced_doc_ids=plan.replaced_doc_ids,
+                    ledger_entries=plan.entries,
+                    retired_source_ids=plan.retired_source_ids,
+                    shard=job.shard,
+                )
+            job.stage = "done"
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.stage = "failed"
+        finally:
+            self.discard_upload(job.path)
+            job.finished_at = time.time()
+            with self._lock:
+                self._pending -= 1
+                self._counts[job.stage] += 1
+
+
+_QUEUE: IngestionQueue | None = None
+_QUEUE_LOCK = threading.Lock()
+
+
+def ingestion_queue() -> IngestionQueue:
+    """The process-wide queue, configured from ``rag.service`` on first use."""
+    global _QUEUE
+    with _QUEUE_LOCK:
+        if _QUEUE is None:
+            from rag import service
+
+            _QUEUE = IngestionQueue(
+                service.UPLOAD_DIR,
+                workers=service.JOB_WORKERS,
+                max_pending=service.JOB_QUEUE_SIZE,
+                max_upload_bytes=service.MAX_UPLOAD_BYTES,
+            )
+        return _QUEUE
+
+
+def shutdown_queue(wait: bool = False) -> None:
+    """Stop the process-wide queue's workers; a no-op if it was never created."""
+    with _QUEUE_LOCK:
+        queue = _QUEUE
+    if queue is not None:
+        queue.shutdown(wait=wait)
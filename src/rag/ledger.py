@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Sequence
+
+from llama_index.core import Document
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def file_hash(path: str | Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+PAGE_SEPARATOR = "#page="
+
+
+def document_source_id(doc: Document) -> str:
+    """
+    Stable identity of the source a document came from.
+
+    An explicit ``source_id`` metadata key wins; otherwise the file name or
+    source URL is used, qualified by page for paged documents. Documents
+    with no identifying metadata are addressed by their content alone.
+    """
+    metadata = doc.metadata or {}
+    source_id = metadata.get("source_id") or metadata.get("filename") or metadata.get("source")
+    if not source_id:
+        return f"content:{content_hash(doc.text)}"
+    if metadata.get("page") is not None:
+        return f"{source_id}{PAGE_SEPARATOR}{metadata['page']}"
+    return str(source_id)
+
+
+def file_source_id(source_id: str) -> str:
+    """The source id without its page qualifier, i.e. the whole file's."""
+    return source_id.partition(PAGE_SEPARATOR)[0]
+
+
+@dataclass(frozen=True)
+class LedgerEntry:
+    source_id: str
+    content_hash: str
+    doc_ids: tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class FetchValidators:
+    """HTTP cache validators and extracted-text hash of the last fetch of a URL."""
+
+    url: str
+    etag: str | None
+    last_modified: str | None
+    content_hash: str | None
+
+
+@dataclass
+class UpsertPlan:
+    """What an upsert has to do after consulting the ledger."""
+
+    documents: list[Document]
+    replaced_doc_ids: list[str]
+    entries: list[LedgerEntry]
+    skipped: int = 0
+    # Ledger rows of pages the new version of their file no longer has.
+    retired_source_ids: list[str] = field(default_factory=list)
+
+
+class IngestLedger:
+    """
+    Content-addressed record of what is already in the index.
+
+    ``documents`` maps a source id to the hash of its text and the doc ids
+    it was indexed under; the content hash column is indexed so identical
+    text arriving under any source is recognised. ``sources`` maps raw
+    inputs (files, media URLs) to a fingerprint so unchanged inputs can be
+    skipped before they are downloaded, extracted or transcribed.
+    ``fetches`` keeps each crawled URL's ETag/Last-Modified for conditional
+    requests.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " source_id TEXT PRIMARY KEY,"
+            " content_hash TEXT NOT NULL,"
+            " doc_ids TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS documents_hash ON documents (content_hash)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sources ("
+            " source_key TEXT PRIMARY KEY,"
+            " fingerprint TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fetches ("
+            " url TEXT PRIMARY KEY,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " content_hash TEXT,"
+            " fetched_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    # --- Documents -----------------------------------------------------------
+
+    def get(self, source_id: str) -> LedgerEntry | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash, doc_ids FROM documents WHERE source_id = ?", (source_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return LedgerEntry(source_id, row[0], tuple(json.loads(row[1])))
+
+    def file_entries(self, file_id: str) -> list[LedgerEntry]:
+        """Rows of the whole file ``file_id`` and of each of its pages."""
+        # Page ids sort between "<file>#page=" and "<file>#page>"; the range keeps the primary key usable.
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT source_id, content_hash, doc_ids FROM documents"
+                " WHERE source_id = ? OR (source_id >= ? AND source_id < ?)",
+                (file_id, file_id + PAGE_SEPARATOR, file_id + PAGE_SEPARATOR[:-1] + ">"),
+            ).fetchall()
+        return [LedgerEntry(row[0], row[1], tuple(json.loads(row[2]))) for row in rows]
+
+    def has_content(self, digest: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM documents WHERE content_hash = ? LIMIT 1", (digest,)
+            ).fetchone()
+        return row is not None
+
+    def plan(
+        self,
+        documents: Iterable[Document],
+        *,
+        seen: set[str] | None = None,
+        fresh: bool = False,
+        whole_files: bool = False,
+    ) -> UpsertPlan:
+        """
+        Split ``documents`` into new or changed ones and no-ops.
+
+        Unchanged sources and text already indexed under any source are
+        skipped; a changed source lists its previous doc ids for deletion.
+        ``seen`` carries content hashes across batches of one ingest, and
+        ``fresh`` ignores existing rows (for a full rebuild).
+
+        With ``whole_files`` the documents hold every page of each file
+        they come from, so pages an earlier version of a file had and this
+        one lacks (e.g. a shorter re-upload) are deleted and their rows
+        listed in ``retired_source_ids``.
+        """
+        plan = UpsertPlan(documents=[], replaced_doc_ids=[], entries=[])
+        grouped: dict[str, list[Document]] = {}
+        for doc in documents:
+            grouped.setdefault(document_source_id(doc), []).append(doc)
+        seen = set() if seen is None else seen
+        for source_id, docs in grouped.items():
+            digest = content_hash("\x1e".join(doc.text for doc in docs))
+            entry = None if fresh else self.get(source_id)
+            if digest in seen or (entry is not None and entry.content_hash == digest):
+                plan.skipped += len(docs)
+                continue
+            if entry is None and not fresh and self.has_content(digest):
+                plan.skipped += len(docs)
+                continue
+            seen.add(digest)
+            if entry is not None:
+                plan.replaced_doc_ids.extend(entry.doc_ids)
+            plan.documents.extend(docs)
+            plan.entries.append(LedgerEntry(source_id, digest, tuple(doc.doc_id for doc in docs)))
+        if whole_files and not fresh:
+            files = {file_source_id(source_id) for source_id in grouped if not source_id.startswith("content:")}
+            for file_id in sorted(files):
+                for entry in self.file_entries(file_id):
+                    if entry.source_id not in grouped:
+                        plan.replaced_doc_ids.extend(entry.doc_ids)
+                        plan.retired_source_ids.append(entry.source_id)
+        return plan
+
+    def record(self, entries: Sequence[LedgerEntry]) -> None:
+        if not entries:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO documents (source_id, content_hash, doc_ids, updated_at)"
+                " VALUES (?, ?, ?, ?)",
+                [(e.source_id, e.content_hash, json.dumps(list(e.doc_ids)), now) for e in entries],
+            )
+            self._conn.commit()
+
+    def forget(self, source_ids: Sequence[str]) -> None:
+        if not source_ids:
+            return
+        with self._lock:
+            self._conn.executemany("DELETE FROM documents WHERE source_id = ?", [(s,) for s in source_ids])
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """Forget everything, e.g. after the index was rebuilt from scratch."""
+        with self._lock:
+            self._conn.execute("DELETE FROM documents")
+            self._conn.execute("DELETE FROM sources")
+            self._conn.execute("DELETE FROM fetches")
+            self._conn.commit()
+
+    # --- Raw sources ---------------------------------------------------------
+
+    def fingerprint(self, source_key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint FROM sources WHERE source_key = ?", (source_key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def source_unchanged(self, source_key: str, fingerprint: str) -> bool:
+        return self.fingerprint(source_key) == fingerprint
+
+    def record_source(self, source_key: str, fingerprint: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sources (source_key, fingerprint, updated_at) VALUES (?, ?, ?)",
+                (source_key, fingerprint, time.time()),
+            )
+            self._conn.commit()
+
+    # --- Crawled URLs --------------------------------------------------------
+
+    def fetch_validators(self, url: str) -> FetchValidators | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified, content_hash FROM fetches WHERE url = ?", (url,)
+            ).fetchone()
+        return FetchValidators(url, *row) if row else None
+
+    def record_fetches(self, validators: Sequence[FetchValidators]) -> None:
+        if not validators:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO fetches (url, etag, last_modified, content_hash, fetched_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [(v.url, v.etag, v.last_modified, v.content_hash, now) for v in validators],
+            )
+            self._conn.commit()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            (documents,) = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()
+            (sources,) = self._conn.execute("SELECT COUNT(*) FROM sources").fetchone()
+            (fetches,) = self._conn.execute("SELECT COUNT(*) FROM fetches").fetchone()
+        return {"documents": documents, "sources": sources, "fetches": fetches}
@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import math
+import re
+import threading
+from collections import Counter
+from typing import Collection, Iterable, Sequence
+
+import numpy as np
+from llama_index.core.schema import NodeWithScore
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+_QUESTION_WORDS = frozenset(
+    "how what why when where which who whom whose should could would can does do is are explain".split()
+)
+STOPWORDS = frozenset(
+    """a an and are as at be but by for from has have i if in into is it its of on or our so
+    that the their them then there these they this to was we were what when which who will
+    with you your""".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def is_keyword_query(query: str, *, max_terms: int = 4) -> bool:
+    """
+    Heuristic for queries a lexical index can answer on its own.
+
+    Quoted phrases and short term lists ("Series A", "TAM SAM SOM") qualify;
+    natural-language questions do not.
+    """
+    if '"' in query:
+        return True
+    if "?" in query:
+        return False
+    words = _TOKEN_RE.findall(query.lower())
+    if not words or words[0] in _QUESTION_WORDS:
+        return False
+    return len(tokenize(query)) <= max_terms
+
+
+class BM25Index:
+    """
+    In-process inverted index with Okapi BM25 scoring.
+
+    Postings are kept per term as parallel row / term-frequency lists and
+    converted to numpy arrays on first use, so a query touches only the
+    postings of its own terms.
+    """
+
+    def __init__(self, *, k1: float = 1.2, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self.node_ids: list[str] = []
+        self.doc_lengths: list[int] = []
+        self._postings: dict[str, tuple[list[int], list[int]]] = {}
+        self._arrays: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        self._total_length = 0
+        # Rows of removed documents; their postings stay but never score.
+        self._deleted: set[int] = set()
+        # Latest row per node id, built on the first filtered search.
+        self._row_of: dict[str, int] | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.node_ids)
+
+    # --- Building ------------------------------------------------------------
+
+    def add(self, node_id: str, text: str) -> None:
+        tokens = tokenize(text)
+        self._add_counts(node_id, Counter(tokens), len(tokens))
+
+    def _add_counts(self, node_id: str, counts: dict[str, int], length: int) -> None:
+        with self._lock:
+            row = len(self.node_ids)
+            for term, tf in counts.items():
+                rows, tfs = self._postings.setdefault(term, ([], []))
+                rows.append(row)
+                tfs.append(tf)
+                self._arrays.pop(term, None)
+            self.doc_lengths.append(length)
+            self._total_length += length
+            self.node_ids.append(node_id)
+            self._row_of = None
+
+    def extend(self, other: "BM25Index") -> None:
+        """Append every document of ``other``, shifting its row numbers."""
+        with self._lock:
+            offset = len(self.node_ids)
+            for term, (rows, tfs) in other._postings.items():
+                mine = self._postings.setdefault(term, ([], []))
+                mine[0].extend(r + offset for r in rows)
+                mine[1].extend(tfs)
+                self._arrays.pop(term, None)
+            self.doc_lengths.extend(other.doc_lengths)
+            self._total_length += other._total_length
+            self._deleted.update(r + offset for r in other._deleted)
+            self.node_ids.extend(other.node_ids)
+            self._row_of = None
+
+    def remove(self, node_ids: Iterable[str]) -> None:
+        """Exclude documents from search results without rewriting postings."""
+        doomed = set(node_ids)
+        with self._lock:
+            self._deleted.update(row for row, node_id in enumerate(self.node_ids) if node_id in doomed)
+
+    def copy(self) -> "BM25Index":
+        """An index with the same documents whose postings can change independently."""
+        clone = BM25Index(k1=self.k1, b=self.b)
+        with self._lock:
+            clone.node_ids = list(self.node_ids)
+            clone.doc_lengths = list(self.doc_lengths)
+            clone._postings = {term: (list(rows), list(tfs)) for term, (rows, tfs) in self._postings.items()}
+            clone._arrays = dict(self._arrays)
+            clone._total_length = self._total_length
+            clone._deleted = set(self._deleted)
+        return clone
+
+    @classmethod
+    def from_texts(cls, items: Iterable[tuple[str, str]]) -> "BM25Index":
+        index = cls()
+        for node_id, text in items:
+            index.add(node_id, text)
+        return index
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "node_ids": self.node_ids,
+                "doc_lengths": self.doc_lengths,
+                "postings": {term: [rows, tfs] for term, (rows, tfs) in self._postings.items()},
+            }
+
+    @classmethod
+    def from_dict(cls, payload: dict) -> "BM25Index":
+        index = cls()
+        index.node_ids = list(payload["node_ids"])
+        index.doc_lengths = list(payload["doc_lengths"])
+        index._total_length = sum(index.doc_lengths)
+        index._postings = {
+            term: (list(rows), list(tfs)) for term, (rows, tfs) in payload["postings"].items()
+        }
+        return index
+
+    # --- Scoring -------------------------------------------------------------
+
+    def _term_arrays(self, term: str) -> tuple[np.ndarray, np.ndarray] | None:
+        with self._lock:
+            arrays = self._arrays.get(term)
+            if arrays is None:
+                posting = self._postings.get(term)
+                if posting is None:
+                    return None
+                arrays = (np.asarray(posting[0], dtype=np.int64), np.asarray(posting[1], dtype=np.float32))
+                self._arrays[term] = arrays
+            return arrays
+
+    def _allowed_mask(self, node_ids: Collection[str], n: int) -> np.ndarray:
+        with self._lock:
+            if self._row_of is None:
+                self._row_of = {node_id: row for row, node_id in enumerate(self.node_ids)}
+            rows = [self._row_of[node_id] for node_id in node_ids if node_id in self._row_of]
+        mask = np.zeros(n, dtype=bool)
+        rows = np.asarray(rows, dtype=np.int64)
+        mask[rows[rows < n]] = True
+        return mask
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        *,
+        allowed: Collection[str] | None = None,
+    ) -> list[tuple[str, float]]:
+        """Top ``top_k`` (node id, score) pairs, scoring only ``allowed`` node ids if given."""
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self.node_ids)
+            lengths = np.asarray(self.doc_lengths[:n], dtype=np.float32)
+            avg_length = self._total_length / n if n else 0.0
+            deleted = [row for row in self._deleted if row < n]
+        if not terms or not n or (allowed is not None and not allowed):
+            return []
+        mask = self._allowed_mask(allowed, n) if allowed is not None else None
+        scores = np.zeros(n, dtype=np.float32)
+        norm = self.k1 * (1 - self.b + self.b * lengths / (avg_length or 1.0))
+        for term in terms:
+            arrays = self._term_arrays(term)
+            if arrays is None:
+                continue
+            rows, tfs = arrays
+            keep = rows < n
+            rows, tfs = rows[keep], tfs[keep]
+            df = len(rows)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            if mask is not None:
+                # Filtered out rows are skipped but still count towards idf.
+                keep = mask[rows]
+                rows, tfs = rows[keep], tfs[keep]
+            scores[rows] += idf * tfs * (self.k1 + 1) / (tfs + norm[rows])
+        scores[deleted] = 0.0
+        hits = np.flatnonzero(scores)
+        if not hits.size:
+            return []
+        k = min(top_k, hits.size)
+        top = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(self.node_ids[i], float(scores[i])) for i in top]
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[NodeWithScore]],
+    top_k: int,
+    *,
+    k: int = 60,
+) -> list[NodeWithScore]:
+    """Fuse ranked lists with RRF; the fused score replaces the original ones."""
+    scores: dict[str, float] = {}
+    nodes: dict[str, NodeWithScore] = {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking):
+            node_id = hit.node.node_id
+            scores[node_id] = scores.get(node_id, 0.0) + 1.0 / (k + rank + 1)
+            nodes.setdefault(node_id, hit)
+    ordered = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    return [NodeWithScore(node=nodes[node_id].node, score=scores[node_id]) for node_id in ordered]
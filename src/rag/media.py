@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import yt_dlp
+
+from rag.ledger import file_hash
+from rag.transcription import SAMPLE_RATE, transcribe_stream
+
+
+FFMPEG = os.getenv("RAG_FFMPEG", "ffmpeg")
+# Lowest-bitrate audio-only stream: speech recognition gains nothing from more.
+AUDIO_FORMAT = "worstaudio[vcodec=none]/worstaudio/bestaudio"
+PCM_CHUNK_SECONDS = 30
+
+
+class MediaDecodeError(RuntimeError):
+    """Raised when ffmpeg cannot read or decode a media source."""
+
+
+@dataclass(frozen=True)
+class AudioSource:
+    """Where ffmpeg reads audio from: a local file or a direct stream URL."""
+
+    location: str
+    title: str
+    source_id: str
+    headers: dict[str, str] = field(default_factory=dict)
+
+
+# --- Source resolution -------------------------------------------------------
+
+def local_media_path(source: str) -> Path | None:
+    """Return the path behind ``source`` if it is a local path or file:// URL."""
+    if source.startswith("file://"):
+        return Path(urlparse(source).path)
+    if "://" in source:
+        return None
+    return Path(source).expanduser()
+
+
+def youtube_video_id(source: str) -> str | None:
+    parsed = urlparse(source)
+    host = parsed.netloc.lower()
+    if host.endswith("youtu.be"):
+        return parsed.path.lstrip("/") or None
+    if host.endswith("youtube.com"):
+        return parse_qs(parsed.query).get("v", [None])[0]
+    return None
+
+
+def media_key(source: str) -> tuple[str, str]:
+    """
+    Ledger key and fingerprint for ``source``, computed without any network
+    access so cached media can be recognised before it is downloaded.
+    """
+    path = local_media_path(source)
+    if path is not None:
+        resolved = path.resolve()
+        return f"file:{resolved}", file_hash(resolved)
+    video_id = youtube_video_id(source)
+    if video_id:
+        # YouTube video ids are immutable, so the id is the fingerprint.
+        return f"YouTube:{video_id}", video_id
+    return f"url:{source}", source
+
+
+def resolve_audio_source(source: str) -> AudioSource:
+    """
+    Resolve ``source`` to something ffmpeg can decode.
+
+    Local files (the offline stand-in for remote media) are used as is; for
+    URLs, yt-dlp picks the lowest-bitrate audio-only format and returns its
+    direct stream URL without downloading anything.
+    """
+    path = local_media_path(source)
+    if path is not None:
+        if not path.is_file():
+            raise FileNotFoundError(f"Media file not found: {path}")
+        return AudioSource(location=str(path), title=path.stem, source_id=f"file:{path.resolve()}")
+    options = {"format": AUDIO_FORMAT, "quiet": True, "no_warnings": True, "noplaylist": True}
+    with yt_dlp.YoutubeDL(options) as ydl:
+        info = ydl.extract_info(source, download=False)
+    extractor = info.get("extractor_key") or "media"
+    prefix = "YouTube" if extractor.lower() == "youtube" else extractor
+    return AudioSource(
+        location=info["url"],
+        title=info.get("title") or info["id"],
+        source_id=f"{prefix}:{info['id']}",
+        headers=dict(info.get("http_headers") or {}),
+    )
+
+
+# --- Decoding ----------------------------------------------------------------
+
+def _ffmpeg_command(source: AudioSource) -> list[str]:
+    command = [FFMPEG, "-nostdin", "-loglevel", "error"]
+    if source.headers:
+        command += ["-headers", "".join(f"{k}: {v}\r\n" for k, v in source.headers.items())]
+    return command + [
+        "-i", source.location,
+        "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE),
+        "-f", "s16le", "-",
+    ]
+
+
+def stream_pcm(source: AudioSource, *, chunk_seconds: float = PCM_CHUNK_SECONDS) -> Iterator[np.ndarray]:
+    """
+    Decode ``source`` to 16 kHz mono float32 through an ffmpeg pipe.
+
+    Audio is yielded in ``chunk_seconds`` blocks as ffmpeg produces it; video
+    streams are never decoded and nothing is written to disk.
+    """
+    process = subprocess.Popen(
+        _ffmpeg_command(source),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    chunk_bytes = int(chunk_seconds * SAMPLE_RATE) * 2
+    completed = False
+    try:
+        while data := process.stdout.read(chunk_bytes):
+            samples = np.frombuffer(data[: len(data) // 2 * 2], dtype=np.int16)
+            yield samples.astype(np.float32) / 32768.0
+        completed = True
+    finally:
+        process.stdout.close()
+        if not completed and process.poll() is None:
+            process.kill()
+        stderr = process.stderr.read().decode("utf-8", errors="replace")
+        process.stderr.close()
+        process.wait()
+    if process.returncode:
+        raise MediaDecodeError(f"ffmpeg failed to decode {source.title!r}: {stderr.strip()}")
+
+
+def download_audio(source: str, workdir: Path) -> Path:
+    """Fallback for streams ffmpeg cannot open directly: fetch audio only into ``workdir``."""
+    options = {
+        "format": AUDIO_FORMAT,
+        "quiet": True,
+        "no_warnings": True,
+        "noplaylist": True,
+        "outtmpl": str(workdir / "%(id)s.%(ext)s"),
+    }
+    with yt_dlp.YoutubeDL(options) as ydl:
+        info = ydl.extract_info(source, download=True)
+        return Path(ydl.prepare_filename(info))
+
+
+# --- Public API --------------------------------------------------------------
+
+def transcribe_media(
+    source: str,
+    *,
+    model_size: str = "base",
+    language: str | None = None,
+    silence_threshold: float | None = None,
+) -> tuple[str, AudioSource]:
+    """
+    Transcribe a URL or local media file, returning the text and its source.
+
+    Audio is piped from ffmpeg into the transcriber window by window, so
+    transcription starts while the stream is still decoding and the whole
+    recording is never held in memory. If the remote stream cannot be read
+    directly, the audio-only format is downloaded into a private temporary
+    directory for this job, so concurrent ingests never share file names.
+    """
+    resolved = resolve_audio_source(source)
+    options = {"model_size": model_size, "language": language, "silence_threshold": silence_threshold}
+    try:
+        text = transcribe_stream(stream_pcm(resolved), **options)
+    except MediaDecodeError:
+        if local_media_path(source) is not None:
+            raise
+        with tempfile.TemporaryDirectory(prefix="rag-media-") as workdir:
+            path = download_audio(source, Path(workdir))
+            downloaded = AudioSource(location=str(path), title=resolved.title, source_id=resolved.source_id)
+            text = transcribe_stream(stream_pcm(downloaded), **options)
+    return text, resolved
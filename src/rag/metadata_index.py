@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, time as dt_time, timezone
+from pathlib import PurePath
+from typing import Iterable, Sequence
+
+from llama_index.core.schema import BaseNode
+
+
+# Unix seconds at which a chunk was indexed; kept out of embeddings and prompts.
+INGESTED_AT_KEY = "ingested_at"
+SOURCE_TYPES = ("pdf", "video", "youtube", "web", "file", "other")
+
+
+def source_type(metadata: dict) -> str:
+    """
+    Coarse source category of a node, derived from its ``source``/``filename``.
+
+    YouTube transcripts and captions carry ``YouTube:<id>`` sources, uploaded
+    videos ``video``, crawled pages their URL and files a ``filename``.
+    """
+    source = str(metadata.get("source") or "")
+    filename = str(metadata.get("filename") or "")
+    if source.lower().startswith("youtube:"):
+        return "youtube"
+    if source == "video":
+        return "video"
+    if source == "pdf" or filename.lower().endswith(".pdf"):
+        return "pdf"
+    if source.startswith(("http://", "https://")):
+        return "web"
+    if filename or source == "file":
+        return "file"
+    return "other"
+
+
+def _filename_key(filename: str) -> str:
+    return PurePath(filename).name.lower()
+
+
+def stamp_ingested(nodes: Sequence[BaseNode], when: float | None = None) -> None:
+    """Record the ingestion time on ``nodes`` without affecting embeddings or prompts."""
+    stamp = int(when if when is not None else time.time())
+    for node in nodes:
+        node.metadata[INGESTED_AT_KEY] = stamp
+        for excluded in (node.excluded_embed_metadata_keys, node.excluded_llm_metadata_keys):
+            if INGESTED_AT_KEY not in excluded:
+                excluded.append(INGESTED_AT_KEY)
+
+
+def parse_timestamp(value: str | float | date | None, *, end_of_day: bool = False) -> float | None:
+    """Accept Unix seconds, ``date``/``datetime`` objects or ISO-8601 strings (UTC unless zoned)."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value) if "T" in value or " " in value else date.fromisoformat(value)
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, dt_time.max if end_of_day else dt_time.min)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+@dataclass(frozen=True)
+class RetrievalFilter:
+    """
+    Restrict retrieval to nodes matching every given constraint.
+
+    ``source_types`` and ``filenames`` match any of their values (file names
+    by base name, case-insensitively); ``ingested_after``/``ingested_before``
+    bound the ingestion time in Unix seconds, inclusive. Nodes indexed before
+    ingestion times were recorded never match a date range.
+    """
+
+    source_types: tuple[str, ...] = ()
+    filenames: tuple[str, ...] = ()
+    ingested_after: float | None = None
+    ingested_before: float | None = None
+
+    def __post_init__(self) -> None:
+        unknown = set(self.source_types) - set(SOURCE_TYPES)
+        if unknown:
+            raise ValueError(f"Unknown source types {sorted(unknown)}; expected any of {SOURCE_TYPES}.")
+
+    @classmethod
+    def from_args(
+        cls,
+        *,
+        source_type: str | Sequence[str] | None = None,
+        filename: str | Sequence[str] | None = None,
+        since: str | float | date | None = None,
+        until: str | float | date | None = None,
+    ) -> "RetrievalFilter | None":
+        """Build a filter from loose arguments (comma-separated strings, ISO dates); None if empty."""
+
+        def values(arg: str | Sequence[str] | None) -> tuple[str, ...]:
+            if not arg:
+                return ()
+            items = arg.split(",") if isinstance(arg, str) else arg
+            return tuple(item.strip() for item in items if item.strip())
+
+        flt = cls(
+            source_types=tuple(v.lower() for v in values(source_type)),
+            filenames=values(filename),
+            ingested_after=parse_timestamp(since),
+            ingested_before=parse_timestamp(until, end_of_day=True),
+        )
+        return None if flt.is_empty else flt
+
+    @property
+    def is_empty(self) -> bool:
+        return not (
+            self.source_types or self.filenames
+            or self.ingested_after is not None or self.ingested_before is not None
+        )
+
+    def cache_key(self) -> tuple:
+        return (
+            tuple(sorted(self.source_types)),
+            tuple(sorted(_filename_key(f) for f in self.filenames)),
+            self.ingested_after,
+            self.ingested_before,
+        )
+
+
+class MetadataIndex:
+    """
+    Posting lists from metadata values to node ids, plus a sorted ingestion
+    time column for range queries.
+
+    Built from node metadata when a snapshot loads and maintained in place
+    on append and delete, so a filter resolves to its matching node ids
+    without visiting any other node.
+    """
+
+    def __init__(self) -> None:
+        self._postings: dict[str, dict[str, set[str]]] = {"source_type": {}, "filename": {}}
+        self._ingested_at: dict[str, float] = {}
+        self._timeline: tuple[list[float], list[str]] | None = None
+        self._lock = threading.Lock()
+
+    # --- Building ------------------------------------------------------------
+
+    def add(self, node_id: str, metadata: dict) -> None:
+        with self._lock:
+            self._add(node_id, metadata)
+
+    def _add(self, node_id: str, metadata: dict) -> None:
+        self._postings["source_type"].setdefault(source_type(metadata), set()).add(node_id)
+        if metadata.get("filename"):
+            self._postings["filename"].setdefault(_filename_key(str(metadata["filename"])), set()).add(node_id)
+        if metadata.get(INGESTED_AT_KEY) is not None:
+            self._ingested_at[node_id] = float(metadata[INGESTED_AT_KEY])
+            self._timeline = None
+
+    def extend(self, items: Iterable[tuple[str, dict]]) -> None:
+        with self._lock:
+            for node_id, metadata in items:
+                self._add(node_id, metadata)
+
+    def copy(self) -> "MetadataIndex":
+        """An index with the same postings that can change independently."""
+        clone = MetadataIndex()
+        with self._lock:
+            clone._postings = {
+                key: {value: set(node_ids) for value, node_ids in postings.items()}
+                for key, postings in self._postings.items()
+            }
+            clone._ingested_at = dict(self._ingested_at)
+            clone._timeline = self._timeline
+        return clone
+
+    def remove(self, node_ids: Iterable[str]) -> None:
+        doomed = set(node_ids)
+        if not doomed:
+            return
+        with self._lock:
+            for postings in self._postings.values():
+                for value in list(postings):
+                    postings[value] -= doomed
+                    if not postings[value]:
+                        del postings[value]
+            for node_id in doomed & self._ingested_at.keys():
+                del self._ingested_at[node_id]
+            self._timeline = None
+
+    # --- Lookup --------------------------------------------------------------
+
+    def _ingested_between(self, after: float | None, before: float | None) -> set[str]:
+        if self._timeline is None:
+            ordered = sorted(self._ingested_at.items(), key=lambda item: item[1])
+            self._timeline = ([t for _, t in ordered], [n for n, _ in ordered])
+        times, node_ids = self._timeline
+        lo = 0 if after is None else bisect.bisect_left(times, after)
+        hi = len(times) if before is None else bisect.bisect_right(times, before)
+        return set(node_ids[lo:hi])
+
+    def match(self, flt: RetrievalFilter) -> set[str]:
+        """Node ids satisfying ``flt``, smallest candidate set first."""
+        with self._lock:
+            candidates: list[set[str]] = []
+            if flt.source_types:
+                postings = self._postings["source_type"]
+                candidates.append(set().union(*(postings.get(t, set()) for t in flt.source_types)))
+            if flt.filenames:
+                postings = self._postings["filename"]
+                candidates.append(set().union(*(postings.get(_filename_key(f), set()) for f in flt.filenames)))
+            if flt.ingested_after is not None or flt.ingested_before is not None:
+                candidates.append(self._ingested_between(flt.ingested_after, flt.ingested_before))
+        if not candidates:
+            raise ValueError("Empty RetrievalFilter; pass None instead.")
+        candidates.sort(key=len)
+        return candidates[0].intersection(*candidates[1:])
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        with self._lock:
+            return {
+                field: {value: len(ids) for value, ids in postings.items()}
+                for field, postings in self._postings.items()
+            }
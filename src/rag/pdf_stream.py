@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterator
+
+import pypdf
+from llama_index.core import Document
+
+
+# Pages handed to a worker per task: large enough to amortise IPC, small
+# enough that results stream back while the rest of the file is extracted.
+PAGES_PER_TASK = 8
+# Page metadata that should not leak into chunk embeddings.
+PAGE_METADATA_KEYS = ["page", "page_count"]
+
+ErrorCallback = Callable[[int, str], None]
+
+
+# --- Worker side -------------------------------------------------------------
+
+# Each worker process keeps the reader of the file it is working on, so the
+# cross-reference table is parsed once per worker rather than once per task.
+_OPEN_READER: tuple[str, object, pypdf.PdfReader] | None = None
+
+
+def _reader(path: str) -> pypdf.PdfReader:
+    global _OPEN_READER
+    if _OPEN_READER is None or _OPEN_READER[0] != path:
+        if _OPEN_READER is not None:
+            _OPEN_READER[1].close()
+        # A file handle (not bytes) lets pypdf seek to page objects lazily
+        # instead of holding the whole file in memory.
+        handle = open(path, "rb")
+        _OPEN_READER = (path, handle, pypdf.PdfReader(handle))
+    return _OPEN_READER[2]
+
+
+def _extract_pages(path: str, start: int, stop: int) -> list[tuple[int, str, str | None]]:
+    """Extract pages ``[start, stop)`` as ``(page_number, text, error)`` tuples."""
+    reader = _reader(path)
+    results = []
+    for i in range(start, stop):
+        try:
+            results.append((i + 1, reader.pages[i].extract_text() or "", None))
+        except Exception as e:
+            results.append((i + 1, "", str(e)))
+    return results
+
+
+# --- Streaming API -----------------------------------------------------------
+
+def pdf_page_count(path: str | Path) -> int:
+    with open(path, "rb") as f:
+        return len(pypdf.PdfReader(f).pages)
+
+
+def iter_pdf_pages(
+    path: str | Path,
+    *,
+    workers: int | None = None,
+    pages_per_task: int = PAGES_PER_TASK,
+    metadata: dict | None = None,
+    on_error: ErrorCallback | None = None,
+) -> Iterator[Document]:
+    """
+    Yield one ``Document`` per non-empty page of the PDF at ``path``, in order.
+
+    Pages are extracted in a process pool with at most two tasks in flight
+    per worker, so memory stays bounded by ``workers * pages_per_task`` pages
+    regardless of document length. Each page carries ``filename``, ``page``
+    and ``page_count`` metadata. Pages that fail to extract are skipped and
+    reported through ``on_error(page_number, message)``.
+    """
+    path = str(path)
+    total = pdf_page_count(path)
+    base = {"filename": Path(path).name, **(metadata or {})}
+    ranges = [(start, min(start + pages_per_task, total)) for start in range(0, total, pages_per_task)]
+
+    def documents(batch: list[tuple[int, str, str | None]]) -> Iterator[Document]:
+        for page, text, error in batch:
+            if error is not None:
+                if on_error is not None:
+                    on_error(page, error)
+                continue
+            if not text.strip():
+                continue
+            yield Document(
+                text=text,
+                metadata={**base, "page": page, "page_count": total},
+                excluded_embed_metadata_keys=list(PAGE_METADATA_KEYS),
+            )
+
+    workers = min(workers or os.cpu_count() or 1, len(ranges))
+    if workers <= 1:
+        for start, stop in ranges:
+            yield from documents(_extract_pages(path, start, stop))
+        return
+
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        tasks = iter(ranges)
+        pending: deque[Future] = deque()
+        for start, stop in tasks:
+            pending.append(pool.submit(_extract_pages, path, start, stop))
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            batch = pending.popleft().result()
+            task = next(tasks, None)
+            if task is not None:
+                pending.append(pool.submit(_extract_pages, path, *task))
+            yield from documents(batch)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def extract_pdf_text(path: str | Path, **kwargs) -> str:
+    """Whole-document text with ``[Page N]`` markers, assembled in one join."""
+    return "".join(
+        f"\n[Page {doc.metadata['page']}]\n{doc.text}" for doc in iter_pdf_pages(path, **kwargs)
+    )
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Hashable, Sequence
+
+import numpy as np
+
+
+@dataclass
+class _Stamped:
+    index_version: Hashable
+    created_at: float
+
+
+@dataclass
+class _Entry(_Stamped):
+    embedding: np.ndarray
+    question: str
+    answer: str
+    scope: Hashable
+
+
+@dataclass
+class _MemoEntry(_Stamped):
+    value: object
+
+
+def _shard_version(stamp: Hashable, shard: str, default: int | None) -> int | None:
+    # Sharded stamps are ((shard, version), ...) tuples.
+    return dict(stamp).get(shard, default)
+
+
+class _VersionedCache:
+    """
+    LRU + TTL store of entries stamped with the index version they were
+    computed against.
+
+    The index version may also be a ``((shard, version), ...)`` tuple for
+    results drawn from several independently versioned indexes; pass
+    ``shard`` to ``retain_version``/``restamp`` to update one of them.
+    """
+
+    def __init__(self, *, max_entries: int, ttl_seconds: float) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, _Stamped] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _trim(self) -> None:
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def retain_version(self, index_version: int | None, shard: str | None = None) -> None:
+        """Drop entries stamped with any other index version (of ``shard``, if given)."""
+        with self._lock:
+            if shard is None:
+                stale = [k for k, e in self._entries.items() if e.index_version != index_version]
+            else:
+                stale = [
+                    k for k, e in self._entries.items()
+                    if _shard_version(e.index_version, shard, index_version) != index_version
+                ]
+            for key in stale:
+                del self._entries[key]
+            self.evictions += len(stale)
+
+    def restamp(self, old_version: int | None, new_version: int, shard: str | None = None) -> None:
+        """Move entries across a version change that did not alter index contents."""
+        with self._lock:
+            for entry in self._entries.values():
+                if shard is None:
+                    if entry.index_version == old_version:
+                        entry.index_version = new_version
+                elif _shard_version(entry.index_version, shard, None) == old_version:
+                    entry.index_version = tuple(
+                        (name, new_version if name == shard else version)
+                        for name, version in entry.index_version
+                    )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _stats(self) -> dict[str, object]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def stats(self) -> dict[str, object]:
+        with self._lock:
+            return self._stats()
+
+
+class SemanticQueryCache(_VersionedCache):
+    """
+    LRU + TTL cache of RAG answers keyed by query embedding.
+
+    A lookup hits when a live entry in the same ``scope`` (e.g. top_k) was
+    stored against the same index version and its query embedding has cosine
+    similarity of at least ``threshold`` with the new query.
+    """
+
+    def __init__(
+        self,
+        *,
+        threshold: float = 0.95,
+        max_entries: int = 512,
+        ttl_seconds: float = 3600.0,
+    ) -> None:
+        super().__init__(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.threshold = threshold
+        self._next_id = 0
+
+    @staticmethod
+    def _unit(embedding: Sequence[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self, now: float) -> None:
+        expired = [key for key, e in self._entries.items() if now - e.created_at > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+        self.evictions += len(expired)
+
+    def lookup(
+        self,
+        embedding: Sequence[float],
+        index_version: Hashable,
+        scope: Hashable = None,
+    ) -> str | None:
+        query = self._unit(embedding)
+        with self._lock:
+            self._expire(time.monotonic())
+            candidates = [
+                (key, entry)
+                for key, entry in self._entries.items()
+                if entry.scope == scope and entry.index_version == index_version
+            ]
+            if candidates:
+                scores = np.stack([entry.embedding for _, entry in candidates]) @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    key, entry = candidates[best]
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.answer
+            self.misses += 1
+            return None
+
+    def store(
+        self,
+        embedding: Sequence[float],
+        question: str,
+        answer: str,
+        index_version: Hashable,
+        scope: Hashable = None,
+    ) -> None:
+        with self._lock:
+            self._entries[self._next_id] = _Entry(
+                embedding=self._unit(embedding),
+                question=question,
+                answer=answer,
+                scope=scope,
+                index_version=index_version,
+                created_at=time.monotonic(),
+            )
+            self._next_id += 1
+            self._trim()
+
+
+class LookupMemo(_VersionedCache):
+    """
+    LRU + TTL memo of lookup results keyed exactly (e.g. question and context version).
+
+    Like ``SemanticQueryCache`` an entry only hits for the index version it
+    was stored against. Hits and misses are also counted per ``caller``
+    (e.g. the agent that asked) to show where caching pays off.
+    """
+
+    def __init__(self, *, max_entries: int = 1024, ttl_seconds: float = 3600.0) -> None:
+        super().__init__(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self._callers: dict[str, dict[str, int]] = {}
+
+    def _count(self, caller: str | None, outcome: str) -> None:
+        counts = self._callers.setdefault(caller or "unknown", {"hits": 0, "misses": 0})
+        counts[outcome] += 1
+        if outcome == "hits":
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def lookup(self, key: Hashable, index_version: Hashable, caller: str | None = None) -> object | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.created_at > self.ttl_seconds:
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+            if entry is None or entry.index_version != index_version:
+                self._count(caller, "misses")
+                return None
+            self._entries.move_to_end(key)
+            self._count(caller, "hits")
+            return entry.value
+
+    def store(self, key: Hashable, value: object, index_version: Hashable) -> None:
+        with self._lock:
+            self._entries[key] = _MemoEntry(index_version=index_version, created_at=time.monotonic(), value=value)
+            self._entries.move_to_end(key)
+            self._trim()
+
+    def _stats(self) -> dict[str, object]:
+        def rate(hits: int, misses: int) -> float:
+            return hits / (hits + misses) if hits + misses else 0.0
+
+        return {
+            **super()._stats(),
+            "by_caller": {
+                caller: {**counts, "hit_rate": rate(counts["hits"], counts["misses"])}
+                for caller, counts in sorted(self._callers.items())
+            },
+        }
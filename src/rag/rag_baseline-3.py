@@ -1,21 +1,11 @@
 # -*- coding: utf-8 -*-
 """RAG_baseline"""
 
-from llama_index.core import (
-    Settings,
-    VectorStoreIndex,
-    Document,
-    StorageContext,
-    load_index_from_storage,
-)
-import yt_dlp
-import whisper
+from llama_index.core import Document
+import asyncio
 import os
-from llama_index.embeddings.google_genai import GoogleGenAIEmbedding
-from llama_index.llms.google_genai import GoogleGenAI
+import sys
 from youtube_transcript_api import YouTubeTranscriptApi
-import requests
-from bs4 import BeautifulSoup
 from urllib.parse import urlparse, parse_qs
 from youtube_transcript_api import (
     YouTubeTranscriptApi,
@@ -29,6 +19,13 @@ import io
 import torch
 from dotenv import load_dotenv
 from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from rag import service as rag_service
+from rag.pdf_stream import iter_pdf_pages
+from rag.crawler import Crawler, ingest_urls
+from rag.media import media_key, transcribe_media
+
 print("PyTorch version:", torch.__version__)
 
 # Commented out IPython magic to ensure Python compatibility.
@@ -75,24 +72,9 @@ print("\n" + "="*70)
 print("BUILDING RAG SYSTEM")
 print("="*70)
 
-Settings.llm = GoogleGenAI(
-    model=MODEL_NAME  
-)
-Settings.embed_model = GoogleGenAIEmbedding(
-    model_name="models/embedding-001")  # Corrected model name
-
-print(f"LlamaIndex configured with {MODEL_NAME}")
-
-
-def download_youtube_video(url, output_path="video.mp4"):
-    try:
-        yt_ops = {'outtmpl': output_path}
-        with yt_dlp.YoutubeDL(yt_ops) as ydl:
-            ydl.download([url])
-        return output_path
-    except Exception as e:
-        print(f"❌ Error downloading YouTube video: {e}")
-        return None
+# Settings.llm / Settings.embed_model are configured by rag.service, which
+# also owns the persisted index.
+print(f"LlamaIndex configured with {rag_service.MODEL_NAME}")
 
 
 def upload_mp4():
@@ -106,11 +88,11 @@ def upload_mp4():
     return path
 
 
-def transcribe_video(file_path, model_size="medium"):
+def transcribe_video(source, model_size="medium"):
+    """Transcribe a local media file or URL; returns (text, AudioSource) or None."""
     try:
-        model = whisper.load_model(model_size, device="cpu")
-        result = model.transcribe(file_path)
-        return result["text"]
+        # Audio only, piped from ffmpeg; models stay loaded between calls.
+        return transcribe_media(source, model_size=model_size)
     except Exception as e:
         print(f"❌ Error transcribing video: {e}")
         return None
@@ -132,60 +114,45 @@ def ingest_video_to_rag():
     source = input("Paste youtube link or type 'upload' to use MP4: ").strip()
 
     if source.lower() == 'upload':
-        video_path = upload_mp4()
-        base_name = os.path.splitext(os.path.basename(video_path))[
-            0] if video_path else "uploaded_video"
-    else:
-        video_path = download_youtube_video(source, output_path="video.mp4")
-        base_name = "youtube_video"
+        source = upload_mp4()
+        if not source:
+            return
+
+    key, fingerprint = media_key(source)
+    if rag_service.LEDGER.source_unchanged(key, fingerprint):
+        print("✅ This video is already ingested; skipping download and transcription.")
+        return
 
-    if video_path:
-        print("🎙️ Transcribing video...")
-        transcript = transcribe_video(video_path)
+    print("🎙️ Transcribing video...")
+    result = transcribe_video(source)
+    if result:
+        transcript, media = result
+        # Named after the file or video id, so concurrent ingests don't collide.
+        base_name = media.title if media.source_id.startswith("file:") else media.source_id.split(":", 1)[1]
         if transcript:
             transcript_path = save_transcript(transcript, base_name)
 
             if transcript_path:
                 doc = Document(text=transcript, metadata={
                     "filename": base_name, "source": "video"})
-                try:
-                    # Check if index exists and merge, or create new
-                    if os.path.exists(PERSIST_DIR):
-                        # Load existing index
-                        storage_context = StorageContext.from_defaults(
-                            persist_dir=PERSIST_DIR)
-                        index = load_index_from_storage(storage_context)
-                        # Add new document to existing index
-                        index.insert(doc)
-                        print(f"✅ Added transcript to existing index")
-                    else:
-                        # Create new index
-                        index = VectorStoreIndex.from_documents([doc])
-                        print(f"✅ Created new index with transcript")
-
-                    # Save updated index
-                    index.storage_context.persist(persist_dir=PERSIST_DIR)
-                    print(f"💾 Index saved to {PERSIST_DIR}")
-                except Exception as e:
-                    print(f"❌ Error building or saving index: {e}")
+                if add_document_to_index(doc):
+                    rag_service.LEDGER.record_source(key, fingerprint)
 
 
 def fetch_youtube_audio_and_transcribe(video_id, output_dir="./audio"):
     url = f"https://www.youtube.com/watch?v={video_id}"
-    audio_path = os.path.join(output_dir, f"{video_id}.mp3")
-
-    # Download audio with yt-dlp
-    ydl_opts = {"format": "bestaudio/best", "outtmpl": audio_path}
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        ydl.download([url])
-
-    # Transcribe audio with Whisper
-    model = whisper.load_model("base")
-    result = model.transcribe(audio_path)
-    transcript = result["text"]
+    os.makedirs(output_dir, exist_ok=True)
     filename = os.path.join(output_dir, f"{video_id}_whisper.txt")
-    with open(filename, "w") as f:
-        f.write(transcript)
+
+    if os.path.exists(filename):
+        # Transcribed before: reuse it instead of downloading and transcribing again.
+        with open(filename) as f:
+            transcript = f.read()
+    else:
+        # Stream the audio track through ffmpeg into Whisper; no audio file is kept
+        transcript, _ = transcribe_media(url, model_size="base")
+        with open(filename, "w") as f:
+            f.write(transcript)
     return Document(text=transcript, metadata={"source": f"YouTube:{video_id}-whisper"})
 
 # === WEBPAGE + CAPTION INGESTION ===
@@ -194,22 +161,19 @@ def fetch_youtube_audio_and_transcribe(video_id, output_dir="./audio"):
 def fetch_webpage_as_document(url):
     print(f"Attempting to fetch webpage: {url}")
     try:
-        html = requests.get(url).text
-        print("Successfully fetched HTML content.")
-        soup = BeautifulSoup(html, "html.parser")
-        print("Successfully parsed HTML with BeautifulSoup.")
-        clean_text = soup.get_text()
-        print(f"Extracted text length: {len(clean_text)}")
+        result = asyncio.run(fetch_pages([url]))[0]
+        if result.document is None:
+            print(f"❌ Error fetching webpage {url}: {result.error}")
+            return None
+        clean_text = result.document.text
+        print(f"Extracted main text length: {len(clean_text)}")
         filename = os.path.join(WEBPAGE_DIR, url.replace(
             "https://", "").replace("/", "_") + ".txt")
         print(f"Saving cleaned text to: {filename}")
         with open(filename, "w") as f:
             f.write(clean_text)
         print("Successfully saved cleaned text to file.")
-        return Document(text=clean_text, metadata={"source": url})
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Error fetching webpage {url}: {e}")
-        return None
+        return result.document
     except IOError as e:
         print(f"❌ Error writing webpage content to file {filename}: {e}")
         return None
@@ -219,6 +183,21 @@ def fetch_webpage_as_document(url):
         return None
 
 
+async def fetch_pages(urls):
+    async with Crawler() as crawler:
+        return await crawler.crawl(urls)
+
+
+def refresh_webpages_in_rag():
+    raw = input("Paste webpage URLs (space or comma separated): ").strip()
+    urls = [u for u in raw.replace(",", " ").split() if u]
+    if not urls:
+        print("❌ No URLs provided.")
+        return
+    # Pages fetched before are requested conditionally; only changed text is re-embedded.
+    print(ingest_urls(urls).report())
+
+
 def extract_youtube_id(url_or_id: str) -> str:
     """Accept either a full YouTube URL or a raw video ID and return the video ID."""
     text = url_or_id.strip()
@@ -284,37 +263,35 @@ def fetch_youtube_caption_as_document(url_or_id: str):
 def extract_text_from_pdf(pdf_bytes: bytes) -> str:
     try:
         reader = pypdf.PdfReader(io.BytesIO(pdf_bytes))
-        text = ""
+        parts = []
         for i, page in enumerate(reader.pages):
             try:
-                text += f"\n[Page {i+1}]\n"
+                parts.append(f"\n[Page {i+1}]\n")
                 page_text = page.extract_text()
                 if page_text:
-                    text += page_text
+                    parts.append(page_text)
             except Exception as e:
                 print(f"❌ Error extracting text from page {i+1}: {e}")
-                text += f"\n[Error extracting text from page {i+1}]\n"
-        return text
+                parts.append(f"\n[Error extracting text from page {i+1}]\n")
+        return "".join(parts)
     except Exception as e:
         print(f"❌ Error reading PDF file: {e}")
         return ""
 
 
-def add_document_to_index(doc: Document):
+def add_document_to_index(doc: Document) -> bool:
     """Add a single Document to the existing index, or create one if none exists."""
     try:
-        # Try to load existing index
-        storage_context = StorageContext.from_defaults(persist_dir=PERSIST_DIR)
-        index = load_index_from_storage(storage_context)
-        print("📚 Loaded existing index. Inserting new document...")
-        index.insert(doc)
+        # Appends one segment; the rest of the persist dir is left untouched.
+        # Content already in the index is a no-op, changed content replaces it.
+        if rag_service.upsert_documents([doc]):
+            print(f"💾 Document appended to index at {rag_service.PERSIST_DIR}")
+        else:
+            print("✅ Identical content is already indexed; nothing to do.")
+        return True
     except Exception as e:
-        print(f"⚠️ Could not load existing index ({e}), creating a new one...")
-        index = VectorStoreIndex.from_documents([doc])
-
-    # Persist index
-    index.storage_context.persist(persist_dir=PERSIST_DIR)
-    print(f"💾 Index saved to {PERSIST_DIR}")
+        print(f"❌ Error building or saving index: {e}")
+        return False
 
 
 def ingest_youtube_captions_to_rag():
@@ -345,53 +322,59 @@ def upload_and_build_index():
         return None
 
     filenames = [name.strip() for name in filenames_input.split(",")]
-    documents = []
-
-    for filename in filenames:
-        file_path = os.path.join(BASE_DIR, filename)  # BASE_DIR = './data'
-        if not os.path.exists(file_path):
-            print(f"❌ File not found: {file_path}")
-            continue
-
-        print(f"\n📂 Processing {file_path}")
-        try:
-            if filename.lower().endswith(".pdf"):
-                with open(file_path, "rb") as f:
-                    pdf_bytes = f.read()
-                text = extract_text_from_pdf(pdf_bytes)
-            else:
-                with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                    text = f.read()
-
-            print(f"✅ Extracted {len(text):,} characters")
-            documents.append(
-                Document(text=text, metadata={"filename": filename}))
-        except Exception as e:
-            print(f"❌ Error processing file {filename}: {e}")
-            continue
-
-    if not documents:
-        print("❌ No documents were successfully processed. Index not built.")
-        return None
+
+    def report_page_error(page: int, message: str) -> None:
+        print(f"❌ Error extracting text from page {page}: {message}")
+
+    processed = 0
+
+    def iter_documents():
+        nonlocal processed
+        # Pages are streamed into the embedder as they are extracted, so large
+        # PDFs are never held in memory as one string.
+        for filename in filenames:
+            file_path = os.path.join(BASE_DIR, filename)  # BASE_DIR = './data'
+            if not os.path.exists(file_path):
+                print(f"❌ File not found: {file_path}")
+                continue
+
+            print(f"\n📂 Processing {file_path}")
+            try:
+                if filename.lower().endswith(".pdf"):
+                    pages = 0
+                    for page_doc in iter_pdf_pages(file_path, on_error=report_page_error):
+                        pages += 1
+                        processed += 1
+                        yield page_doc
+                    print(f"✅ Extracted {pages:,} pages")
+                else:
+                    with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+                        text = f.read()
+                    print(f"✅ Extracted {len(text):,} characters")
+                    processed += 1
+                    yield Document(text=text, metadata={"filename": filename})
+            except Exception as e:
+                print(f"❌ Error processing file {filename}: {e}")
+                continue
 
     print(f"\n📚 Building vector index using {MODEL_NAME} embedding...")
     try:
-        index = VectorStoreIndex.from_documents(documents)
-        index.storage_context.persist(persist_dir=PERSIST_DIR)
-        print(f"💾 Index has been saved to {PERSIST_DIR}")
-        return index
+        rag_service.rebuild_index(iter_documents())
+        print(f"💾 Index has been saved to {rag_service.PERSIST_DIR}")
+        return rag_service._load_index()
     except Exception as e:
+        if not processed:
+            print("❌ No documents were successfully processed. Index not built.")
+            return None
         print(f"❌ Error building or saving index: {e}")
         return None
 
 
 def load_query_engine(top_k: int = 5):
     try:
-        storage_context = StorageContext.from_defaults(persist_dir=PERSIST_DIR)
-        index = load_index_from_storage(storage_context)
-        return index.as_query_engine(similarity_top_k=top_k)
+        return rag_service.get_query_engine(top_k=top_k)
     except Exception as e:
-        print(f"❌ Error loading index from {PERSIST_DIR}: {e}")
+        print(f"❌ Error loading index from {rag_service.PERSIST_DIR}: {e}")
         print("Please ensure you have uploaded documents and built the index first (Option 1).")
         return None
 
@@ -511,10 +494,7 @@ def main():
         mode = input(
             "Type 'web' for webpage or 'yt' for YouTube captions: ").strip().lower()
         if mode == "web":
-            url = input("Enter webpage URL: ")
-            doc = fetch_webpage_as_document(url)
-            if doc:
-                add_document_to_index(doc)
+            refresh_webpages_in_rag()
         elif mode == "yt":
             ingest_youtube_captions_to_rag()
         else:
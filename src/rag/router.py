@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+
+
+_SEPARATOR_RE = re.compile(r"[\s-]+")
+
+
+def _normalize_term(term: str) -> str:
+    return _SEPARATOR_RE.sub(" ", term.strip().lower())
+
+
+def _route_key(question: str) -> str:
+    return " ".join(question.lower().split())
+
+
+@dataclass(frozen=True)
+class Section:
+    """A routable knowledge-base entry: its key, display label, trigger terms and text."""
+
+    key: str
+    label: str
+    terms: tuple[str, ...]
+    text: str
+
+
+@dataclass(frozen=True)
+class SectionMatch:
+    key: str
+    label: str
+    score: float
+    similarity: float
+    keyword_hits: tuple[str, ...]
+
+
+class SectionRouter:
+    """
+    Rank knowledge-base sections for a question in one pass.
+
+    All sections' terms are compiled into a single whole-word pattern
+    (longest first, so "market size" wins over "market"; plural ``s`` and
+    space/hyphen variants allowed), and the question embedding is compared
+    with each section's embedding. Section embeddings are computed once per
+    router through ``Settings.embed_model``, whose chunk cache keeps them
+    on disk across restarts. A section is returned if a term matched or
+    its cosine similarity reaches ``min_similarity``; the score is the
+    similarity plus ``keyword_weight`` per distinct term matched. The last
+    ``cache_size`` routed questions are remembered, so a repeated question
+    costs no query embedding.
+    """
+
+    def __init__(
+        self,
+        sections: Sequence[Section],
+        *,
+        min_similarity: float = 0.7,
+        keyword_weight: float = 0.25,
+        cache_size: int = 1024,
+    ) -> None:
+        self.sections = list(sections)
+        self.min_similarity = min_similarity
+        self.keyword_weight = keyword_weight
+        self._term_sections: dict[str, list[int]] = {}
+        for i, section in enumerate(self.sections):
+            for term in section.terms:
+                self._term_sections.setdefault(_normalize_term(term), []).append(i)
+        alternatives = sorted(self._term_sections, key=len, reverse=True)
+        pattern = "|".join(r"[\s-]+".join(map(re.escape, term.split(" "))) for term in alternatives)
+        self._pattern = re.compile(rf"(?<!\w)(?:{pattern})s?(?!\w)", re.IGNORECASE)
+        self._embeddings: np.ndarray | None = None
+        self._lock = threading.Lock()
+        self.cache_size = cache_size
+        self._routes: OrderedDict[str, list[SectionMatch]] = OrderedDict()
+
+    def keyword_hits(self, question: str) -> list[set[str]]:
+        """Distinct terms matched in ``question``, per section."""
+        hits: list[set[str]] = [set() for _ in self.sections]
+        for match in self._pattern.finditer(question):
+            term = _normalize_term(match.group(0))
+            if term not in self._term_sections:
+                term = term[:-1]
+            for i in self._term_sections.get(term, ()):
+                hits[i].add(term)
+        return hits
+
+    def section_embeddings(self) -> np.ndarray:
+        """Unit-normalised embedding matrix of the sections (label and text), computed once."""
+        with self._lock:
+            if self._embeddings is None:
+                from llama_index.core import Settings
+
+                texts = [f"{section.label}\n{section.text.strip()}" for section in self.sections]
+                matrix = np.asarray(Settings.embed_model.get_text_embedding_batch(texts), dtype=np.float32)
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                self._embeddings = matrix / np.where(norms == 0, 1.0, norms)
+            return self._embeddings
+
+    def similarities(self, question: str, embedding: Sequence[float] | None = None) -> np.ndarray:
+        if embedding is None:
+            from llama_index.core import Settings
+
+            embedding = Settings.embed_model.get_query_embedding(question)
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(query))
+        return self.section_embeddings() @ (query / norm if norm else query)
+
+    def cached_route(self, question: str) -> list[SectionMatch] | None:
+        """The remembered sections for ``question``, or None if it has to be routed (and embedded)."""
+        key = _route_key(question)
+        with self._lock:
+            if key not in self._routes:
+                return None
+            self._routes.move_to_end(key)
+            return list(self._routes[key])
+
+    def route(
+        self,
+        question: str,
+        *,
+        embedding: Sequence[float] | None = None,
+        semantic: bool = True,
+    ) -> list[SectionMatch]:
+        """
+        Sections relevant to ``question``, best first.
+
+        ``embedding`` reuses a query embedding the caller already has. If
+        the embedding model is unavailable, routing falls back to terms only.
+        """
+        if embedding is None and semantic:
+            cached = self.cached_route(question)
+            if cached is not None:
+                return cached
+        hits = self.keyword_hits(question)
+        similarities = np.zeros(len(self.sections), dtype=np.float32)
+        embedded = False
+        if semantic:
+            try:
+                similarities = self.similarities(question, embedding)
+                embedded = True
+            except Exception:
+                pass
+        matches = [
+            SectionMatch(
+                key=section.key,
+                label=section.label,
+                score=round(float(similarities[i]) + self.keyword_weight * len(hits[i]), 4),
+                similarity=round(float(similarities[i]), 4),
+                keyword_hits=tuple(sorted(hits[i])),
+            )
+            for i, section in enumerate(self.sections)
+            if hits[i] or similarities[i] >= self.min_similarity
+        ]
+        matches.sort(key=lambda match: match.score, reverse=True)
+        if embedded and self.cache_size:
+            with self._lock:
+                self._routes[_route_key(question)] = matches
+                while len(self._routes) > self.cache_size:
+                    self._routes.popitem(last=False)
+        return list(matches)
@@ -0,0 +1,584 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Iterator, Sequence
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialised within a process.
+    fcntl = None
+
+from llama_index.core import StorageContext, VectorStoreIndex
+from llama_index.core.data_structs import IndexDict
+from llama_index.core.schema import BaseNode
+from llama_index.core.storage.docstore import SimpleDocumentStore
+from llama_index.core.storage.docstore.utils import json_to_doc
+from llama_index.core.storage.index_store import SimpleIndexStore
+from llama_index.core.storage.kvstore.simple_kvstore import SimpleKVStore
+
+from rag.ann import IVFSettings
+from rag.lexical import BM25Index
+from rag.metadata_index import MetadataIndex
+from rag.vector_store import NumpyVectorStore, load_json_store
+
+
+# Pointer to the live manifest version; replaced atomically on publish.
+CURRENT_FNAME = "CURRENT"
+MANIFESTS_DIRNAME = "manifests"
+# Single mutable manifest written by older builds; read until the next commit.
+MANIFEST_FNAME = "manifest.json"
+LOCK_FNAME = ".write.lock"
+SEGMENTS_DIRNAME = "segments"
+DOCSTORE_FNAME = "docstore.json"
+LEXICAL_FNAME = "lexical.json"
+# NumpyVectorStore derives its matrix/sidecar file names from this path.
+VECTORS_HINT_FNAME = "default__vector_store.json"
+
+NODE_COLLECTION = "docstore/data"
+METADATA_COLLECTION = "docstore/metadata"
+REF_DOC_COLLECTION = "docstore/ref_doc_info"
+
+# A superseded manifest (and its segments) stays readable this long, so
+# readers in other processes that just resolved it can finish loading.
+DEFAULT_GC_GRACE_SECONDS = 300.0
+# Segment directories no manifest references (crashed writers) are removed
+# after this long; younger ones may belong to a writer about to commit.
+ORPHAN_SEGMENT_SECONDS = 24 * 3600.0
+
+
+# --- Durable file helpers ----------------------------------------------------
+
+def _fsync_dir(path: Path) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _fsync_tree(path: Path) -> None:
+    for child in path.iterdir():
+        if child.is_file():
+            with open(child, "rb") as f:
+                os.fsync(f.fileno())
+    _fsync_dir(path)
+
+
+_PROCESS_LOCKS: dict[Path, threading.Lock] = {}
+_PROCESS_LOCKS_GUARD = threading.Lock()
+
+
+def _process_lock(path: Path) -> threading.Lock:
+    """In-process companion of the ``flock`` on ``path`` (and the only lock without fcntl)."""
+    key = path.resolve()
+    with _PROCESS_LOCKS_GUARD:
+        return _PROCESS_LOCKS.setdefault(key, threading.Lock())
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    """Write ``text`` to a temp file beside ``path`` and rename it into place."""
+    tmp = path.parent / f".{path.name}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(path.parent)
+
+
+# --- Data model --------------------------------------------------------------
+
+@dataclass(frozen=True)
+class Manifest:
+    version: int
+    segments: tuple[str, ...]
+    # Document ids deleted since the segments holding them were written.
+    tombstones: tuple[str, ...] = ()
+
+    def to_dict(self) -> dict:
+        return {
+            "version": self.version,
+            "segments": list(self.segments),
+            "tombstones": list(self.tombstones),
+        }
+
+    @classmethod
+    def from_dict(cls, payload: dict) -> "Manifest":
+        return cls(
+            version=payload["version"],
+            segments=tuple(payload["segments"]),
+            tombstones=tuple(payload.get("tombstones", ())),
+        )
+
+
+@dataclass
+class Segment:
+    """One immutable batch of nodes: a docstore subset, its vectors and postings."""
+
+    name: str
+    docstore_data: dict[str, dict]
+    vectors: NumpyVectorStore
+    lexical: BM25Index
+
+
+@dataclass
+class Snapshot:
+    """A loaded, queryable view of one manifest version."""
+
+    index: VectorStoreIndex
+    lexical: BM25Index
+    version: int | None
+    metadata: MetadataIndex = field(default_factory=MetadataIndex)
+
+
+def lexical_from_docstore_data(docstore_data: dict[str, dict]) -> BM25Index:
+    return BM25Index.from_texts(
+        (node_id, json_to_doc(payload).get_content())
+        for node_id, payload in docstore_data.get(NODE_COLLECTION, {}).items()
+    )
+
+
+def node_metadata(docstore_data: dict[str, dict]) -> Iterable[tuple[str, dict]]:
+    """``(node_id, metadata)`` for every node, read without deserialising the nodes."""
+    for node_id, payload in docstore_data.get(NODE_COLLECTION, {}).items():
+        yield node_id, payload.get("__data__", {}).get("metadata") or {}
+
+
+def segment_payload(
+    nodes: Sequence[BaseNode],
+    doc_hashes: dict[str, str],
+) -> tuple[dict[str, dict], NumpyVectorStore, BM25Index]:
+    """Split embedded nodes into docstore collections, vectors and postings."""
+    docstore = SimpleDocumentStore()
+    stripped = []
+    for node in nodes:
+        copy = node.model_copy()
+        copy.embedding = None
+        stripped.append(copy)
+    docstore.add_documents(stripped, allow_update=True)
+    for doc_id, doc_hash in doc_hashes.items():
+        docstore.set_document_hash(doc_id, doc_hash)
+    vectors = NumpyVectorStore()
+    vectors.add(nodes)
+    lexical = BM25Index.from_texts((node.node_id, node.get_content()) for node in nodes)
+    return docstore.to_dict(), vectors, lexical
+
+
+def merge_docstore_data(parts: Sequence[dict[str, dict]]) -> dict[str, dict]:
+    merged: dict[str, dict] = {NODE_COLLECTION: {}, METADATA_COLLECTION: {}, REF_DOC_COLLECTION: {}}
+    for part in parts:
+        merged[NODE_COLLECTION].update(part.get(NODE_COLLECTION, {}))
+        merged[METADATA_COLLECTION].update(part.get(METADATA_COLLECTION, {}))
+        for ref_doc_id, info in part.get(REF_DOC_COLLECTION, {}).items():
+            existing = merged[REF_DOC_COLLECTION].get(ref_doc_id)
+            if existing is None:
+                merged[REF_DOC_COLLECTION][ref_doc_id] = {
+                    "node_ids": list(info.get("node_ids", [])),
+                    "metadata": dict(info.get("metadata", {})),
+                }
+            else:
+                existing["node_ids"].extend(
+                    n for n in info.get("node_ids", []) if n not in existing["node_ids"]
+                )
+    return merged
+
+
+def build_snapshot(
+    segments: Sequence[Segment],
+    version: int | None,
+    tombstones: Sequence[str] = (),
+) -> Snapshot:
+    lexical = BM25Index()
+    for segment in segments:
+        lexical.extend(segment.lexical)
+    metadata = MetadataIndex()
+    for segment in segments:
+        metadata.extend(node_metadata(segment.docstore_data))
+    snapshot = Snapshot(index=build_index(segments), lexical=lexical, version=version, metadata=metadata)
+    apply_tombstones(snapshot, tombstones)
+    return snapshot
+
+
+def copy_snapshot(snapshot: Snapshot) -> Snapshot:
+    """
+    A copy of ``snapshot`` that can be appended to or tombstoned while
+    readers keep querying the original. Docstore collections, row lists and
+    postings are copied; vector matrices are shared.
+    """
+    data = {collection: dict(mapping) for collection, mapping in snapshot.index.docstore.to_dict().items()}
+    # The docstore extends a document's node id list in place on insert.
+    data[REF_DOC_COLLECTION] = {
+        doc_id: {**info, "node_ids": list(info.get("node_ids", []))}
+        for doc_id, info in data.get(REF_DOC_COLLECTION, {}).items()
+    }
+    return Snapshot(
+        index=_assemble_index(data, snapshot.index.vector_store.copy()),
+        lexical=snapshot.lexical.copy(),
+        version=snapshot.version,
+        metadata=snapshot.metadata.copy(),
+    )
+
+
+def apply_tombstones(snapshot: Snapshot, doc_ids: Sequence[str]) -> None:
+    """
+    Remove deleted documents from a snapshot in memory only. The snapshot is
+    changed in place, so it must not be shared with readers yet.
+    """
+    docstore = snapshot.index.docstore
+    infos = {doc_id: docstore.get_ref_doc_info(doc_id) for doc_id in doc_ids}
+    live = [doc_id for doc_id, info in infos.items() if info is not None]
+    if not live:
+        return
+    node_ids = [node_id for doc_id in live for node_id in infos[doc_id].node_ids]
+    snapshot.index.vector_store.delete_ref_docs(live)
+    for node_id in node_ids:
+        snapshot.index.index_struct.delete(node_id)
+    for doc_id in live:
+        docstore.delete_ref_doc(doc_id, raise_error=False)
+    snapshot.lexical.remove(node_ids)
+    snapshot.metadata.remove(node_ids)
+
+
+def drop_documents(
+    docstore_data: dict[str, dict],
+    vectors: NumpyVectorStore,
+    doc_ids: Sequence[str],
+) -> dict[str, dict]:
+    """Return ``docstore_data`` without ``doc_ids``, deleting their vectors too."""
+    doomed = set(doc_ids)
+    dead_nodes = {
+        node_id
+        for doc_id, info in docstore_data.get(REF_DOC_COLLECTION, {}).items()
+        if doc_id in doomed
+        for node_id in info.get("node_ids", [])
+    }
+    vectors.delete_ref_docs(doomed)
+    return {
+        NODE_COLLECTION: {
+            k: v for k, v in docstore_data.get(NODE_COLLECTION, {}).items() if k not in dead_nodes
+        },
+        METADATA_COLLECTION: {
+            k: v for k, v in docstore_data.get(METADATA_COLLECTION, {}).items()
+            if k not in dead_nodes and k not in doomed
+        },
+        REF_DOC_COLLECTION: {
+            k: v for k, v in docstore_data.get(REF_DOC_COLLECTION, {}).items() if k not in doomed
+        },
+    }
+
+
+def build_index(segments: Sequence[Segment]) -> VectorStoreIndex:
+    """Assemble an in-memory ``VectorStoreIndex`` over the given segments."""
+    data = merge_docstore_data([segment.docstore_data for segment in segments])
+    return _assemble_index(data, NumpyVectorStore.concat([segment.vectors for segment in segments]))
+
+
+def _assemble_index(data: dict[str, dict], vectors: NumpyVectorStore) -> VectorStoreIndex:
+    docstore = SimpleDocumentStore(simple_kvstore=SimpleKVStore(data))
+    index_struct = IndexDict()
+    for node_id in data.get(NODE_COLLECTION, {}):
+        index_struct.nodes_dict[node_id] = node_id
+    index_store = SimpleIndexStore()
+    index_store.add_index_struct(index_struct)
+    storage_context = StorageContext.from_defaults(docstore=docstore, index_store=index_store, vector_store=vectors)
+    return VectorStoreIndex(index_struct=index_struct, storage_context=storage_context)
+
+
+# --- Segment store -----------------------------------------------------------
+
+class SegmentStore:
+    """
+    Append-only persist-dir layout with versioned, immutable snapshots.
+
+    Every published version is an immutable ``manifests/<version>.json``
+    listing its segments under ``segments/``; ``CURRENT`` names the live
+    version. Writers add a fully written, fsynced segment directory, write
+    the next manifest and then publish it by atomically replacing
+    ``CURRENT``, so a crash at any point leaves either the old or the new
+    version and never a torn one. Readers take no lock: they resolve
+    ``CURRENT`` once and load that version's files, which are never
+    modified. Ingest I/O is proportional to the new segment only; ``merge``
+    folds segments back into one.
+
+    Manifest updates from any process are serialised by ``locked()``;
+    replaced versions are deleted later by ``collect_garbage``.
+    """
+
+    def __init__(
+        self,
+        persist_dir: str | Path,
+        *,
+        quantization: str = "none",
+        ivf: IVFSettings | None = None,
+    ) -> None:
+        self.persist_dir = Path(persist_dir)
+        # Compact search matrix written with and loaded for every segment.
+        self.quantization = quantization
+        # Inverted-file index trained when merges produce large segments.
+        self.ivf = ivf
+        self.segments_dir = self.persist_dir / SEGMENTS_DIRNAME
+        self.manifests_dir = self.persist_dir / MANIFESTS_DIRNAME
+        self.current_path = self.persist_dir / CURRENT_FNAME
+        self.legacy_manifest_path = self.persist_dir / MANIFEST_FNAME
+        self.lock_path = self.persist_dir / LOCK_FNAME
+
+    # --- Manifest ------------------------------------------------------------
+
+    def _manifest_path(self, version: int) -> Path:
+        return self.manifests_dir / f"{version:012d}.json"
+
+    def exists(self) -> bool:
+        return self.current_path.exists() or self.legacy_manifest_path.exists()
+
+    def version(self) -> int | None:
+        """The live version, from ``CURRENT`` alone."""
+        try:
+            return int(self.current_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            legacy = self._read_legacy_manifest()
+            return legacy.version if legacy else None
+
+    def _read_legacy_manifest(self) -> Manifest | None:
+        try:
+            with open(self.legacy_manifest_path, encoding="utf-8") as f:
+                return Manifest.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def read_manifest(self, version: int | None = None) -> Manifest | None:
+        """The manifest of ``version``, or of the live version."""
+        if version is None:
+            version = self.version()
+            if version is None:
+                return None
+        try:
+            with open(self._manifest_path(version), encoding="utf-8") as f:
+                return Manifest.from_dict(json.load(f))
+        except FileNotFoundError:
+            legacy = self._read_legacy_manifest()
+            if legacy is not None and legacy.version == version:
+                return legacy
+            raise
+
+    def versions(self) -> list[int]:
+        if not self.manifests_dir.exists():
+            return []
+        return sorted(int(path.stem) for path in self.manifests_dir.glob("*.json"))
+
+    def _write_manifest(self, manifest: Manifest) -> None:
+        self.manifests_dir.mkdir(parents=True, exist_ok=True)
+        legacy = self._read_legacy_manifest()
+        if legacy is not None and not self._manifest_path(legacy.version).exists():
+            # Keep the replaced single-file version around for readers and GC.
+            _write_atomic(self._manifest_path(legacy.version), json.dumps(legacy.to_dict()))
+        _write_atomic(self._manifest_path(manifest.version), json.dumps(manifest.to_dict()))
+        _write_atomic(self.current_path, str(manifest.version))
+        self.legacy_manifest_path.unlink(missing_ok=True)
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """
+        Hold the persist dir's write lock, shared by every process.
+
+        Wrap each read-modify-write of the manifest (``commit``/``append``
+        and the reads they depend on) in it; readers never need it.
+        """
+        self.persist_dir.mkdir(parents=True, exist_ok=True)
+        with _process_lock(self.lock_path), open(self.lock_path, "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def commit(self, segments: Sequence[str], *, tombstones: Sequence[str] | None = None) -> Manifest:
+        """
+        Publish ``segments`` as the live set under the next manifest version.
+
+        Tombstones carry over from the current manifest unless given.
+        """
+        current = self.read_manifest()
+        if tombstones is None:
+            tombstones = current.tombstones if current else ()
+        manifest = Manifest(
+            version=max([current.version if current else 0, *self.versions()]) + 1,
+            segments=tuple(segments),
+            tombstones=tuple(dict.fromkeys(tombstones)),
+        )
+        self._write_manifest(manifest)
+        return manifest
+
+    def append(self, names: Sequence[str], *, tombstones: Sequence[str] = ()) -> Manifest:
+        """Add segments and delete ``tombstones`` document ids in one manifest update."""
+        current = self.read_manifest()
+        existing = current.segments if current else ()
+        dead = current.tombstones if current else ()
+        return self.commit([*existing, *names], tombstones=[*dead, *tombstones])
+
+    # --- Garbage collection --------------------------------------------------
+
+    def collect_garbage(
+        self,
+        *,
+        pinned: Iterable[int | None] = (),
+        grace_seconds: float = DEFAULT_GC_GRACE_SECONDS,
+        orphan_seconds: float = ORPHAN_SEGMENT_SECONDS,
+    ) -> list[str]:
+        """
+        Delete superseded versions and the segments only they referenced.
+
+        A version survives while it is live, ``pinned`` (loaded by this
+        process) or was superseded less than ``grace_seconds`` ago. Segments
+        that no manifest references are left to their writer unless older
+        than ``orphan_seconds``. Returns the removed segment names.
+        """
+        now = time.time()
+        with self.locked():
+            live = self.version()
+            versions = self.versions()
+            keep = {live, *pinned}
+            for older, newer in zip(versions, versions[1:]):
+                try:
+                    superseded_at = self._manifest_path(newer).stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                if now - superseded_at < grace_seconds:
+                    keep.add(older)
+            kept_segments: set[str] = set()
+            dropped_segments: set[str] = set()
+            dropped_versions = []
+            for version in versions:
+                manifest = self.read_manifest(version)
+                if version in keep:
+                    kept_segments.update(manifest.segments)
+                else:
+                    dropped_segments.update(manifest.segments)
+                    dropped_versions.append(version)
+            doomed = dropped_segments - kept_segments
+            if self.segments_dir.exists():
+                for path in self.segments_dir.iterdir():
+                    name = path.name.removeprefix(".tmp-")
+                    if name in kept_segments or name in dropped_segments:
+                        continue
+                    if now - path.stat().st_mtime > orphan_seconds:
+                        doomed.add(path.name)
+            self.remove_segments(sorted(doomed))
+            for version in dropped_versions:
+                self._manifest_path(version).unlink(missing_ok=True)
+        return sorted(doomed)
+
+    # --- Segments ------------------------------------------------------------
+
+    def write_segment(
+        self,
+        docstore_data: dict[str, dict],
+        vectors: NumpyVectorStore,
+        lexical: BM25Index | None = None,
+    ) -> str:
+        """Durably write a new segment directory and return its name."""
+        if lexical is None:
+            lexical = lexical_from_docstore_data(docstore_data)
+        name = f"seg-{uuid.uuid4().hex[:16]}"
+        tmp_dir = self.segments_dir / f".tmp-{name}"
+        tmp_dir.mkdir(parents=True)
+        with open(tmp_dir / DOCSTORE_FNAME, "w", encoding="utf-8") as f:
+            json.dump(docstore_data, f)
+        with open(tmp_dir / LEXICAL_FNAME, "w", encoding="utf-8") as f:
+            json.dump(lexical.to_dict(), f)
+        vectors.requantize(self.quantization).persist(str(tmp_dir / VECTORS_HINT_FNAME))
+        _fsync_tree(tmp_dir)
+        os.rename(tmp_dir, self.segments_dir / name)
+        _fsync_dir(self.segments_dir)
+        return name
+
+    def load_segment(self, name: str, *, mmap: bool = True) -> Segment:
+        segment_dir = self.segments_dir / name
+        with open(segment_dir / DOCSTORE_FNAME, encoding="utf-8") as f:
+            docstore_data = json.load(f)
+        vectors = NumpyVectorStore.from_persist_dir(
+            segment_dir,
+            mmap=mmap,
+            quantization=self.quantization,
+            nprobe=self.ivf.nprobe if self.ivf else 0,
+        )
+        try:
+            with open(segment_dir / LEXICAL_FNAME, encoding="utf-8") as f:
+                lexical = BM25Index.from_dict(json.load(f))
+        except FileNotFoundError:
+            lexical = lexical_from_docstore_data(docstore_data)
+        return Segment(name=name, docstore_data=docstore_data, vectors=vectors, lexical=lexical)
+
+    def remove_segments(self, names: Sequence[str]) -> None:
+        for name in names:
+            shutil.rmtree(self.segments_dir / name, ignore_errors=True)
+
+    def load_snapshot(self, version: int | None = None) -> Snapshot:
+        """Load every segment of ``version`` (default: the live one)."""
+        for attempt in range(3):
+            manifest = self.read_manifest(version)
+            if manifest is None:
+                raise FileNotFoundError(f"No manifest in {self.persist_dir}")
+            try:
+                segments = [self.load_segment(name) for name in manifest.segments]
+            except FileNotFoundError:
+                # Only possible when loading took longer than the GC grace
+                # period; retry on the newest version.
+                if attempt == 2 or version is not None:
+                    raise
+                continue
+            return build_snapshot(segments, manifest.version, manifest.tombstones)
+        raise AssertionError("unreachable")
+
+    # --- Compaction & migration ---------------------------------------------
+
+    def merge(self, names: Sequence[str], tombstones: Sequence[str] = ()) -> str:
+        """Write the union of ``names`` as a single new segment, minus ``tombstones``."""
+        segments = [self.load_segment(name, mmap=False) for name in names]
+        data = merge_docstore_data([segment.docstore_data for segment in segments])
+        vectors = NumpyVectorStore.concat([segment.vectors for segment in segments])
+        if tombstones:
+            data = drop_documents(data, vectors, tombstones)
+        if self.ivf and vectors.num_vectors >= self.ivf.min_vectors:
+            if vectors.ivf is None or vectors.ivf.needs_retrain(self.ivf):
+                vectors.build_ivf(self.ivf)
+        if tombstones:
+            # Postings are rebuilt rather than filtered.
+            return self.write_segment(data, vectors)
+        lexical = BM25Index()
+        for segment in segments:
+            lexical.extend(segment.lexical)
+        return self.write_segment(data, vectors, lexical)
+
+    def migrate_flat_layout(self) -> bool:
+        """
+        Convert a flat LlamaIndex persist dir into a single base segment.
+
+        The flat files are left in place (the bundled knowledge base is
+        tracked in git); once ``CURRENT`` exists they are no longer read.
+        Returns False when there is nothing to migrate.
+        """
+        legacy_docstore = self.persist_dir / "docstore.json"
+        if self.exists() or not legacy_docstore.exists():
+            return False
+        with self.locked():
+            if self.exists() or not legacy_docstore.exists():
+                return False
+            with open(legacy_docstore, encoding="utf-8") as f:
+                docstore_data = json.load(f)
+            if NumpyVectorStore.exists(self.persist_dir):
+                vectors = NumpyVectorStore.from_persist_dir(self.persist_dir, mmap=False)
+            else:
+                vectors = load_json_store(self.persist_dir / "default__vector_store.json")
+            name = self.write_segment(docstore_data, vectors)
+            self.commit([name])
+        return True
@@ -1,113 +1,1025 @@
 from __future__ import annotations
 
+import asyncio
+import dataclasses
+import functools
+import hashlib
 import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from pathlib import Path
-from typing import Iterable, Sequence
+from typing import Callable, Iterable, Iterator, Sequence
 
+import numpy as np
 from dotenv import load_dotenv
-from llama_index.core import (
-    Document,
-    Settings,
-    StorageContext,
-    VectorStoreIndex,
-    load_index_from_storage,
-)
-from llama_index.embeddings.google import GoogleGenAIEmbedding
-from llama_index.llms.gemini import Gemini
+from llama_index.core import Document, Settings, VectorStoreIndex, get_response_synthesizer
+from llama_index.core.indices.vector_store.retrievers import VectorIndexRetriever
+from llama_index.core.ingestion import run_transformations
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.schema import BaseNode, MetadataMode, NodeWithScore, QueryBundle
+
+from rag.ann import IVFSettings
+from rag.backends import create_backends
+from rag.embedding_cache import CachedEmbedding, EmbeddingCache, text_hash
+from rag.embedding_client import RateLimitedEmbedding, embed_queries
+from rag.query_cache import LookupMemo, SemanticQueryCache
+from rag.ledger import IngestLedger, LedgerEntry
+from rag.lexical import is_keyword_query, reciprocal_rank_fusion
+from rag.metadata_index import RetrievalFilter, stamp_ingested
+from rag.segments import SegmentStore, Snapshot, apply_tombstones, build_snapshot, copy_snapshot, segment_payload
 
 
 # --- Environment & model configuration ---------------------------------------
 
 load_dotenv()
 
+# "gemini" (hosted models) or "local" (offline hashing embedding and
+# extractive answers, for tests and benchmarks without network access).
+RAG_BACKEND = os.getenv("RAG_BACKEND", "gemini")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise RuntimeError("GEMINI_API_KEY is missing. Add it to .env or the environment.")
+LOCAL_EMBED_DIM = int(os.getenv("RAG_LOCAL_EMBED_DIM", "768"))
 
 MODEL_NAME = os.getenv("MODEL_NAME", "gemini-2.5-flash")
 EMBED_MODEL_NAME = os.getenv("EMBED_MODEL_NAME", "models/embedding-001")
+# Number of live segments that triggers a background compaction.
+COMPACT_SEGMENTS = int(os.getenv("RAG_COMPACT_SEGMENTS", "8"))
+# Documents embedded and written per segment when ingesting a stream.
+INGEST_BATCH_DOCS = int(os.getenv("RAG_INGEST_BATCH_DOCS", "64"))
+# Compact matrix vector search scans before exact re-scoring: none|float16|int8.
+VECTOR_QUANTIZATION = os.getenv("RAG_VECTOR_QUANTIZATION", "none")
+# "ivf" searches large merged segments through an inverted-file index that
+# scans RAG_IVF_NPROBE lists per query; "exact" always scans every vector.
+VECTOR_INDEX = os.getenv("RAG_VECTOR_INDEX", "exact")
+IVF_SETTINGS = IVFSettings(
+    min_vectors=int(os.getenv("RAG_IVF_MIN_VECTORS", "20000")),
+    nprobe=int(os.getenv("RAG_IVF_NPROBE", "16")),
+    nlist=int(os.getenv("RAG_IVF_NLIST", "0")) or None,
+)
+# Upper bound on questions answered in parallel by retrieve_evidence.
+QUERY_CONCURRENCY = int(os.getenv("RAG_QUERY_CONCURRENCY", "4"))
+# Threads serving the async lookup API; bounds blocking RAG work per process.
+LOOKUP_WORKERS = int(os.getenv("RAG_LOOKUP_WORKERS", "4"))
+# How long a replaced index snapshot stays on disk for readers still loading it.
+SNAPSHOT_GRACE_SECONDS = float(os.getenv("RAG_SNAPSHOT_GRACE_SECONDS", "300"))
+# Per-user shards kept loaded in memory at once (the global shard is pinned).
+MAX_LOADED_SHARDS = int(os.getenv("RAG_MAX_LOADED_SHARDS", "16"))
+# Background ingestion of uploads: concurrent jobs (each with one extraction
+# process), jobs allowed to wait and upload size cap. Their embedding requests
+# share the RAG_EMBED_RPM / RAG_EMBED_TPM quota with every other caller.
+JOB_WORKERS = int(os.getenv("RAG_JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("RAG_JOB_QUEUE_SIZE", "32"))
+MAX_UPLOAD_BYTES = int(float(os.getenv("RAG_MAX_UPLOAD_MB", "50")) * 1024 * 1024)
 
-Settings.llm = Gemini(model=MODEL_NAME, api_key=GEMINI_API_KEY)
-Settings.embed_model = GoogleGenAIEmbedding(model_name=EMBED_MODEL_NAME, api_key=GEMINI_API_KEY)
+# Cosine similarity at which rag_lookup's section router picks a knowledge-base
+# section without a keyword match; depends on the embedding model.
+ROUTER_MIN_SIMILARITY = float(os.getenv("RAG_ROUTER_MIN_SIMILARITY", "0.7"))
 
-BASE_DIR = Path(__file__).resolve().parents[1] / "data"
+EMBED_CACHE_MAX_ENTRIES = int(os.getenv("RAG_EMBED_CACHE_MAX_ENTRIES", "200000"))
+# Embedding API client: texts per request, per-minute quotas (unset means
+# unlimited) and retries of quota/5xx errors before a request fails.
+EMBED_BATCH = int(os.getenv("RAG_EMBED_BATCH", "100"))
+EMBED_RPM = float(os.getenv("RAG_EMBED_RPM", "0")) or None
+EMBED_TPM = float(os.getenv("RAG_EMBED_TPM", "0")) or None
+EMBED_MAX_RETRIES = int(os.getenv("RAG_EMBED_MAX_RETRIES", "6"))
+# Answer cache for query_documents: similarity threshold, size and lifetime.
+QUERY_CACHE_THRESHOLD = float(os.getenv("RAG_QUERY_CACHE_THRESHOLD", "0.95"))
+QUERY_CACHE_SIZE = int(os.getenv("RAG_QUERY_CACHE_SIZE", "512"))
+QUERY_CACHE_TTL = float(os.getenv("RAG_QUERY_CACHE_TTL", "3600"))
+# Memo of contextual lookups keyed by (question, context version, index version).
+LOOKUP_MEMO_SIZE = int(os.getenv("RAG_LOOKUP_MEMO_SIZE", "1024"))
+LOOKUP_MEMO_TTL = float(os.getenv("RAG_LOOKUP_MEMO_TTL", "3600"))
+# Weight of business-context similarity when re-ranking retrieved passages,
+# and how many candidates per requested passage are re-ranked.
+CONTEXT_RERANK_WEIGHT = float(os.getenv("RAG_CONTEXT_RERANK_WEIGHT", "0.3"))
+CONTEXT_RERANK_CANDIDATES = int(os.getenv("RAG_CONTEXT_RERANK_CANDIDATES", "3"))
+
+BASE_DIR = Path(os.getenv("RAG_DATA_DIR") or Path(__file__).resolve().parents[1] / "data")
 PERSIST_DIR = BASE_DIR / "persist"
 TRANSCRIPT_DIR = PERSIST_DIR / "transcript"
 WEBPAGE_DIR = BASE_DIR / "webpages"
+CACHE_DIR = BASE_DIR / "cache"
+# One subdirectory (persist dir + ingest ledger) per non-global shard.
+SHARD_DIR = BASE_DIR / "shards"
+UPLOAD_DIR = BASE_DIR / "uploads"
 
-for path in (BASE_DIR, PERSIST_DIR, TRANSCRIPT_DIR, WEBPAGE_DIR):
+for path in (BASE_DIR, PERSIST_DIR, TRANSCRIPT_DIR, WEBPAGE_DIR, CACHE_DIR, SHARD_DIR):
     path.mkdir(parents=True, exist_ok=True)
 
+EMBEDDING_CACHE = EmbeddingCache(CACHE_DIR / "embeddings.sqlite3", max_entries=EMBED_CACHE_MAX_ENTRIES)
+# Source id + content hash -> doc ids of everything ingested into PERSIST_DIR.
+LEDGER = IngestLedger(CACHE_DIR / "ingest_ledger.sqlite3")
+QUERY_CACHE = SemanticQueryCache(
+    threshold=QUERY_CACHE_THRESHOLD,
+    max_entries=QUERY_CACHE_SIZE,
+    ttl_seconds=QUERY_CACHE_TTL,
+)
+LOOKUP_MEMO = LookupMemo(max_entries=LOOKUP_MEMO_SIZE, ttl_seconds=LOOKUP_MEMO_TTL)
+# Candidates retrieved for a bare question, shared by every context (user).
+CANDIDATE_MEMO = LookupMemo(max_entries=LOOKUP_MEMO_SIZE, ttl_seconds=LOOKUP_MEMO_TTL)
+# Caches stamped with shard versions, kept in step with index updates.
+_VERSIONED_CACHES = (QUERY_CACHE, LOOKUP_MEMO, CANDIDATE_MEMO)
+
+_llm, _embed_model = create_backends(
+    RAG_BACKEND,
+    api_key=GEMINI_API_KEY,
+    model_name=MODEL_NAME,
+    embed_model_name=EMBED_MODEL_NAME,
+    local_dim=LOCAL_EMBED_DIM,
+)
+Settings.llm = _llm
+EMBEDDING_CLIENT = RateLimitedEmbedding(
+    _embed_model,
+    max_batch=EMBED_BATCH,
+    requests_per_minute=EMBED_RPM,
+    tokens_per_minute=EMBED_TPM,
+    max_retries=EMBED_MAX_RETRIES,
+)
+Settings.embed_model = CachedEmbedding(EMBEDDING_CLIENT, EMBEDDING_CACHE)
+
+
+# --- Shards ------------------------------------------------------------------
+
+# The shared knowledge base; everything else is a tenant corpus.
+GLOBAL_SHARD = "global"
+_SHARD_NAME_RE = re.compile(r"[^A-Za-z0-9_-]+")
+
+
+def user_shard(user_id: str) -> str:
+    """Name of the shard holding ``user_id``'s uploaded research."""
+    return f"user:{user_id}"
+
+
+def _shard_dirname(name: str) -> str:
+    # Readable prefix plus a digest, so distinct names never share a directory.
+    slug = _SHARD_NAME_RE.sub("_", name).strip("_")[:48] or "shard"
+    return f"{slug}-{hashlib.sha1(name.encode('utf-8')).hexdigest()[:10]}"
+
+
+class _Shard:
+    """
+    One independently persisted index: its segments, ingest ledger and
+    cached snapshot.
+
+    The global shard lives at ``PERSIST_DIR`` with ``LEDGER``; other shards
+    get their own directory under ``SHARD_DIR``, created on first write.
+    """
+
+    def __init__(self, name: str, persist_dir: Path, ledger_path: Path, ledger: IngestLedger | None = None) -> None:
+        self.name = name
+        self.persist_dir = persist_dir
+        self._ledger_path = ledger_path
+        self._ledger = ledger
+        self.cache = _IndexCache(self)
+        self.compaction_running = threading.Event()
+
+    @classmethod
+    def named(cls, name: str) -> "_Shard":
+        if name == GLOBAL_SHARD:
+            return cls(name, PERSIST_DIR, CACHE_DIR / "ingest_ledger.sqlite3", LEDGER)
+        root = SHARD_DIR / _shard_dirname(name)
+        return cls(name, root / "persist", root / "ingest_ledger.sqlite3")
+
+    @property
+    def ledger(self) -> IngestLedger:
+        # Opened on first use: most shards are only ever read.
+        if self._ledger is None:
+            self._ledger_path.parent.mkdir(parents=True, exist_ok=True)
+            self._ledger = IngestLedger(self._ledger_path)
+        return self._ledger
+
+    def segments(self) -> SegmentStore:
+        return SegmentStore(
+            self.persist_dir,
+            quantization=VECTOR_QUANTIZATION,
+            ivf=IVF_SETTINGS if VECTOR_INDEX == "ivf" else None,
+        )
+
+    def index_exists(self) -> bool:
+        return self.segments().exists() or (self.persist_dir / "docstore.json").exists()
+
+    def migrate_legacy_layout(self) -> None:
+        """Convert a flat LlamaIndex persist dir left by an older build into segments."""
+        if not self.persist_dir.exists():
+            return
+        try:
+            self.segments().migrate_flat_layout()
+        except (FileNotFoundError, ValueError):
+            # Another worker migrated it first, or there is nothing to migrate.
+            pass
+
+    def collect_garbage(self) -> None:
+        """Delete superseded snapshots, keeping the one this process has loaded."""
+        self.segments().collect_garbage(pinned=[self.cache.version], grace_seconds=SNAPSHOT_GRACE_SECONDS)
+
+
+class _IndexCache:
+    """
+    Process-wide cache of a shard's loaded index and its query engines.
+
+    The index is reloaded from disk only when the manifest version changes,
+    i.e. when another process has published a new snapshot. Writes made by
+    this process are applied to a copy of the cached snapshot, which then
+    replaces it; a snapshot is never changed once readers can hold it.
+    """
+
+    def __init__(self, shard: _Shard) -> None:
+        self._shard = shard
+        self._lock = threading.RLock()
+        self._snapshot: Snapshot | None = None
+        self._key: int | None = None
+        self._engines: dict[int, object] = {}
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def get(self) -> Snapshot:
+        self._shard.migrate_legacy_layout()
+        # Identify the persisted snapshot by its manifest version.
+        key = self._shard.segments().version()
+        with self._lock:
+            if self._snapshot is not None and key == self._key:
+                self.hits += 1
+                return self._snapshot
+            if self._snapshot is None:
+                self.misses += 1
+            else:
+                self.reloads += 1
+            self._snapshot = self._shard.segments().load_snapshot()
+            self._key = self._snapshot.version
+            self._engines.clear()
+            return self._snapshot
+
+    def store(self, snapshot: Snapshot) -> None:
+        """Adopt a snapshot this process just published, without reloading it."""
+        with self._lock:
+            self._snapshot = snapshot
+            self._key = snapshot.version
+            self._engines.clear()
+
+    def apply_append(
+        self,
+        nodes: Sequence[BaseNode],
+        doc_hashes: dict[str, str],
+        old_version: int | None,
+        new_version: int,
+        deleted_doc_ids: Sequence[str] = (),
+    ) -> None:
+        """Swap in the cached snapshot plus a just-persisted append (and deletions), if it is current."""
+        with self._lock:
+            if self._snapshot is None or self._key != old_version:
+                return
+            snapshot = copy_snapshot(self._snapshot)
+            apply_tombstones(snapshot, deleted_doc_ids)
+            snapshot.index.insert_nodes(list(nodes))
+            for doc_id, doc_hash in doc_hashes.items():
+                snapshot.index.docstore.set_document_hash(doc_id, doc_hash)
+            for node in nodes:
+                snapshot.lexical.add(node.node_id, node.get_content())
+                snapshot.metadata.add(node.node_id, node.metadata)
+            snapshot.version = new_version
+            self._snapshot, self._key = snapshot, new_version
+            self._engines.clear()
+
+    @property
+    def version(self) -> int | None:
+        with self._lock:
+            return self._key
+
+    @property
+    def loaded(self) -> bool:
+        with self._lock:
+            return self._snapshot is not None
+
+    def rekey(self, old_version: int | None, new_version: int) -> None:
+        """Carry the cached index over a manifest change that kept its contents."""
+        with self._lock:
+            if self._snapshot is not None and self._key == old_version:
+                self._snapshot = dataclasses.replace(self._snapshot, version=new_version)
+                self._key = new_version
+
+    def unload(self) -> None:
+        """Drop the loaded index; lookups already holding the snapshot finish on it."""
+        with self._lock:
+            self._snapshot = None
+            self._key = None
+            self._engines.clear()
+
+    def query_engine(self, top_k: int):
+        snapshot = self.get()
+        with self._lock:
+            engine = self._engines.get(top_k)
+            if engine is None:
+                engine = RetrieverQueryEngine.from_args(_dense_retriever(snapshot, top_k))
+                # Don't cache an engine over a snapshot replaced meanwhile.
+                if snapshot is self._snapshot:
+                    self._engines[top_k] = engine
+            return engine
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "reloads": self.reloads}
+
+
+class _ShardRegistry:
+    """
+    Shards by name, with their loaded snapshots LRU-evicted.
+
+    Shard objects (paths, locks) are cheap and kept for the process
+    lifetime so writers always share one lock per shard; only the loaded
+    indexes count against ``max_loaded``. The global shard never counts and
+    is never evicted.
+    """
+
+    def __init__(self, max_loaded: int) -> None:
+        self.max_loaded = max_loaded
+        self._lock = threading.Lock()
+        self._shards: dict[str, _Shard] = {}
+        self._recent: OrderedDict[str, None] = OrderedDict()
+        self.evictions = 0
+
+    def get(self, name: str) -> _Shard:
+        with self._lock:
+            shard = self._shards.get(name)
+            if shard is None:
+                shard = self._shards[name] = _Shard.named(name)
+            return shard
+
+    def snapshot(self, name: str) -> Snapshot:
+        """Load (or reuse) the shard's snapshot and mark it most recently used."""
+        shard = self.get(name)
+        snapshot = shard.cache.get()
+        if name == GLOBAL_SHARD:
+            return snapshot
+        evicted: list[_Shard] = []
+        with self._lock:
+            self._recent[name] = None
+            self._recent.move_to_end(name)
+            while len(self._recent) > max(self.max_loaded, 1):
+                old, _ = self._recent.popitem(last=False)
+                evicted.append(self._shards[old])
+            self.evictions += len(evicted)
+        for old in evicted:
+            old.cache.unload()
+        return snapshot
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            shards = list(self._shards.values())
+            evictions = self.evictions
+        totals = {"hits": 0, "misses": 0, "reloads": 0}
+        for shard in shards:
+            for key, value in shard.cache.stats().items():
+                totals[key] += value
+        return {
+            **totals,
+            "shards": len(shards),
+            "loaded": sum(shard.cache.loaded for shard in shards),
+            "max_loaded": self.max_loaded,
+            "evictions": evictions,
+        }
+
+
+_SHARDS = _ShardRegistry(MAX_LOADED_SHARDS)
+
+
+def _load_index(shard: str = GLOBAL_SHARD) -> VectorStoreIndex:
+    return _SHARDS.snapshot(shard).index
+
+
+def shard_ledger(shard: str = GLOBAL_SHARD) -> IngestLedger:
+    """Ingest ledger of ``shard`` (``LEDGER`` for the global shard)."""
+    return _SHARDS.get(shard).ledger
+
 
 # --- Internal helpers --------------------------------------------------------
 
-def _index_exists() -> bool:
-    return PERSIST_DIR.exists() and any(PERSIST_DIR.iterdir())
+def _batches(documents: Iterable[Document], size: int) -> Iterator[list[Document]]:
+    iterator = iter(documents)
+    while batch := list(islice(iterator, max(size, 1))):
+        yield batch
+
 
+def _embed_documents(docs: Sequence[Document]) -> tuple[list[BaseNode], dict[str, str]]:
+    """Chunk documents with the configured transformations and embed every chunk."""
+    nodes = chunk_documents(docs)
+    embed_nodes(nodes)
+    return nodes, {doc.doc_id: doc.hash for doc in docs}
 
-def _load_index() -> VectorStoreIndex:
-    storage_context = StorageContext.from_defaults(persist_dir=str(PERSIST_DIR))
-    return load_index_from_storage(storage_context)
+
+def _compact(shard: _Shard) -> None:
+    store = shard.segments()
+    try:
+        manifest = store.read_manifest()
+        if manifest is None or len(manifest.segments) < 2:
+            return
+        merged = store.merge(manifest.segments, manifest.tombstones)
+        with store.locked():
+            current = store.read_manifest()
+            if not set(manifest.segments) <= set(current.segments):
+                # Another process compacted or rebuilt these segments first.
+                store.remove_segments([merged])
+                return
+            tail = [name for name in current.segments if name not in manifest.segments]
+            # Tombstones applied by the merge are dropped; later ones still apply.
+            tombstones = [t for t in current.tombstones if t not in manifest.tombstones]
+            published = store.commit([merged, *tail], tombstones=tombstones)
+            if store.ivf is None:
+                shard.cache.rekey(current.version, published.version)
+            # Otherwise the merge may have (re)trained the IVF index, which
+            # only a reload picks up.
+            for cache in _VERSIONED_CACHES:
+                cache.restamp(current.version, published.version, shard=shard.name)
+        shard.collect_garbage()
+    finally:
+        shard.compaction_running.clear()
 
 
-def _persist(index: VectorStoreIndex) -> None:
-    index.storage_context.persist(persist_dir=str(PERSIST_DIR))
+def _maybe_compact(shard: _Shard, segment_count: int) -> None:
+    if segment_count < COMPACT_SEGMENTS or shard.compaction_running.is_set():
+        return
+    shard.compaction_running.set()
+    threading.Thread(target=_compact, args=(shard,), name="rag-compaction", daemon=True).start()
 
 
 # --- Public ingestion API ----------------------------------------------------
 
-def rebuild_index(documents: Sequence[Document]) -> None:
-    """Create a fresh index from the provided documents."""
-    docs = list(documents)
-    if not docs:
+def rebuild_index(
+    documents: Iterable[Document],
+    *,
+    batch_size: int | None = None,
+    shard: str = GLOBAL_SHARD,
+) -> None:
+    """
+    Create a fresh index for ``shard`` from the provided documents.
+
+    ``documents`` may be a generator (e.g. ``pdf_stream.iter_pdf_pages``); it
+    is consumed ``batch_size`` documents at a time, each batch written as its
+    own segment, and the new segments replace the old ones in one commit.
+    """
+    target = _SHARDS.get(shard)
+    store = target.segments()
+    names: list[str] = []
+    entries: list[LedgerEntry] = []
+    seen: set[str] = set()
+    try:
+        for batch in _batches(documents, batch_size or INGEST_BATCH_DOCS):
+            plan = target.ledger.plan(batch, seen=seen, fresh=True)
+            if plan.documents:
+                names.append(store.write_segment(*segment_payload(*_embed_documents(plan.documents))))
+                entries.extend(plan.entries)
+    except BaseException:
+        store.remove_segments(names)
+        raise
+    if not names:
         raise ValueError("rebuild_index requires at least one document.")
-    index = VectorStoreIndex.from_documents(docs)
-    _persist(index)
+    with store.locked():
+        manifest = store.commit(names, tombstones=())
+        target.cache.store(build_snapshot([store.load_segment(name) for name in names], manifest.version))
+        for cache in _VERSIONED_CACHES:
+            cache.retain_version(manifest.version, shard=shard)
+        target.ledger.clear()
+        target.ledger.record(entries)
+    target.collect_garbage()
+    _maybe_compact(target, len(manifest.segments))
+
 
+def chunk_documents(docs: Sequence[Document]) -> list[BaseNode]:
+    """Split documents into nodes with the configured transformations, stamped with the ingestion time."""
+    nodes = run_transformations(list(docs), Settings.transformations)
+    stamp_ingested(nodes)
+    return nodes
 
-def upsert_documents(documents: Iterable[Document]) -> None:
-    """Insert new documents into the existing index, or create one if absent."""
-    docs = list(documents)
-    if not docs:
+
+def embed_nodes(
+    nodes: Sequence[BaseNode],
+    *,
+    batch_size: int | None = None,
+) -> int:
+    """
+    Attach embeddings to ``nodes`` in batches of ``batch_size`` texts.
+
+    Requests go through ``Settings.embed_model``, so they draw from the
+    embedding client's quota (``RAG_EMBED_RPM`` / ``RAG_EMBED_TPM``) like
+    every other embedding call. Returns the number of batches embedded.
+    """
+    texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+    size = batch_size or Settings.embed_model.embed_batch_size
+    requests = 0
+    for start in range(0, len(texts), size):
+        batch = texts[start:start + size]
+        vectors = Settings.embed_model.get_text_embedding_batch(batch)
+        for node, embedding in zip(nodes[start:start + size], vectors):
+            node.embedding = embedding
+        requests += 1
+    return requests
+
+
+def upsert_nodes(
+    nodes: Sequence[BaseNode],
+    doc_hashes: dict[str, str],
+    *,
+    replaced_doc_ids: Sequence[str] = (),
+    ledger_entries: Sequence[LedgerEntry] = (),
+    retired_source_ids: Sequence[str] = (),
+    shard: str = GLOBAL_SHARD,
+) -> None:
+    """
+    Append already embedded nodes to ``shard`` as one new segment.
+
+    ``replaced_doc_ids`` are tombstoned in the same manifest update, so a
+    changed source swaps its old chunks for the new ones atomically;
+    ``ledger_entries`` are recorded and ``retired_source_ids`` forgotten
+    once the update is published.
+    """
+    if not nodes and not replaced_doc_ids:
         return
-    try:
-        index = _load_index()
-    except Exception:
-        index = VectorStoreIndex.from_documents(docs)
-    else:
-        for doc in docs:
-            index.insert(doc)
-    _persist(index)
+    target = _SHARDS.get(shard)
+    target.migrate_legacy_layout()
+    store = target.segments()
+    with store.locked():
+        previous = store.version()
+        names = [store.write_segment(*segment_payload(nodes, doc_hashes))] if nodes else []
+        manifest = store.append(names, tombstones=replaced_doc_ids)
+        target.cache.apply_append(nodes, doc_hashes, previous, manifest.version, replaced_doc_ids)
+        for cache in _VERSIONED_CACHES:
+            cache.retain_version(manifest.version, shard=shard)
+        target.ledger.record(ledger_entries)
+        target.ledger.forget(retired_source_ids)
+    _maybe_compact(target, len(manifest.segments))
+
+
+def upsert_documents(
+    documents: Iterable[Document],
+    *,
+    batch_size: int | None = None,
+    shard: str = GLOBAL_SHARD,
+) -> int:
+    """
+    Insert new documents into ``shard``'s index, or create one if absent.
+
+    Each batch of ``batch_size`` documents is written as one additional
+    segment, so the I/O cost is proportional to the documents being added
+    rather than to the corpus, and a generator of documents is never held in
+    memory at once. Once ``RAG_COMPACT_SEGMENTS`` segments accumulate they
+    are merged in the background.
+
+    Documents are checked against the shard's ledger first: content that is
+    already indexed is a no-op and a source whose content changed replaces
+    its previous chunks. Returns the number of documents actually indexed.
+    """
+    ledger = _SHARDS.get(shard).ledger
+    indexed = 0
+    seen: set[str] = set()
+    for batch in _batches(documents, batch_size or INGEST_BATCH_DOCS):
+        plan = ledger.plan(batch, seen=seen)
+        nodes, doc_hashes = _embed_documents(plan.documents) if plan.documents else ([], {})
+        upsert_nodes(
+            nodes,
+            doc_hashes,
+            replaced_doc_ids=plan.replaced_doc_ids,
+            ledger_entries=plan.entries,
+            shard=shard,
+        )
+        indexed += len(plan.documents)
+    return indexed
+
+
+def compact_index(shard: str = GLOBAL_SHARD) -> None:
+    """Merge all live segments of ``shard`` into one, synchronously."""
+    target = _SHARDS.get(shard)
+    target.compaction_running.set()
+    _compact(target)
 
 
 # --- Retrieval utilities -----------------------------------------------------
 
-def get_query_engine(top_k: int = 5):
-    """Return a LlamaIndex query engine backed by the persisted store."""
-    if not _index_exists():
+RETRIEVAL_MODES = ("auto", "hybrid", "vector", "lexical")
+# How often each retrieval path actually served a lookup.
+_MODE_COUNTS: dict[str, int] = {mode: 0 for mode in RETRIEVAL_MODES[1:]}
+
+
+_SHARD_POOL = ThreadPoolExecutor(max_workers=max(LOOKUP_WORKERS, 2), thread_name_prefix="rag-shard")
+
+
+def _fan_out(fn: Callable, items: Sequence) -> list:
+    """Map ``fn`` over ``items`` in parallel; the first item runs on the calling thread."""
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    futures = [_SHARD_POOL.submit(fn, item) for item in items[1:]]
+    return [fn(items[0]), *(future.result() for future in futures)]
+
+
+def _snapshots(shards: Sequence[str] | None = None) -> list[tuple[str, Snapshot]]:
+    """Load ``shards`` (default: the global one) in parallel, skipping shards with no index yet."""
+    names = list(dict.fromkeys(shards or (GLOBAL_SHARD,)))
+
+    def load(name: str) -> Snapshot | None:
+        return _SHARDS.snapshot(name) if _SHARDS.get(name).index_exists() else None
+
+    found = [(name, snapshot) for name, snapshot in zip(names, _fan_out(load, names)) if snapshot is not None]
+    if not found:
         raise RuntimeError("No persisted index found; ingest documents first.")
-    index = _load_index()
-    return index.as_query_engine(similarity_top_k=top_k)
+    return found
+
+
+def _stamp(snapshots: Sequence[tuple[str, Snapshot]]) -> tuple[tuple[str, int | None], ...]:
+    """Answer-cache version of a lookup: the version of every shard it read."""
+    return tuple((name, snapshot.version) for name, snapshot in snapshots)
+
+
+def _dense_retriever(snapshot: Snapshot, top_k: int, allowed: set[str] | None = None) -> VectorIndexRetriever:
+    """
+    Vector retriever over ``allowed`` node ids, or over everything.
+
+    ``VectorStoreIndex.as_retriever`` always passes every node id, which
+    turns each query into a filtered scan and bypasses the IVF index.
+    """
+    return VectorIndexRetriever(
+        snapshot.index,
+        similarity_top_k=top_k,
+        node_ids=list(allowed) if allowed is not None else None,
+    )
+
+
+def _lexical_hits(
+    snapshot: Snapshot,
+    question: str,
+    top_k: int,
+    allowed: set[str] | None = None,
+) -> list[NodeWithScore]:
+    ranked = snapshot.lexical.search(question, top_k, allowed=allowed)
+    if not ranked:
+        return []
+    nodes = snapshot.index.docstore.get_nodes([node_id for node_id, _ in ranked])
+    return [NodeWithScore(node=node, score=score) for node, (_, score) in zip(nodes, ranked)]
+
+
+def _retrieve(
+    snapshot: Snapshot,
+    question: str,
+    top_k: int,
+    mode: str,
+    embedding: list[float] | None = None,
+    filters: RetrievalFilter | None = None,
+) -> list[NodeWithScore]:
+    """
+    Rank nodes for ``question``.
+
+    "vector" is dense similarity only, "lexical" is BM25 only and "hybrid"
+    fuses both with reciprocal rank fusion. "auto" answers keyword-like
+    queries lexically, without any embedding call, and falls back to hybrid
+    when no term matches or the query reads like a question.
+
+    ``filters`` are resolved to node ids through the snapshot's metadata
+    index first; both rankers then score only those nodes.
+    """
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode {mode!r}; expected one of {RETRIEVAL_MODES}.")
+    allowed = snapshot.metadata.match(filters) if filters is not None else None
+    if allowed is not None and not allowed:
+        return []
+    if mode in ("lexical", "auto") and (mode == "lexical" or is_keyword_query(question)):
+        hits = _lexical_hits(snapshot, question, top_k, allowed)
+        if hits or mode == "lexical":
+            _MODE_COUNTS["lexical"] += 1
+            return hits
+    if mode == "auto":
+        mode = "hybrid"
+    _MODE_COUNTS[mode] += 1
+    bundle = QueryBundle(query_str=question, embedding=embedding)
+    candidates = top_k if mode == "vector" else max(top_k * 2, 10)
+    dense = _dense_retriever(snapshot, candidates, allowed).retrieve(bundle)
+    if mode == "vector":
+        return dense
+    sparse = _lexical_hits(snapshot, question, candidates, allowed)
+    return reciprocal_rank_fusion([dense, sparse], top_k)
+
+
+def _retrieve_shards(
+    snapshots: Sequence[tuple[str, Snapshot]],
+    question: str,
+    top_k: int,
+    mode: str,
+    embedding: list[float] | None = None,
+    filters: RetrievalFilter | None = None,
+) -> list[tuple[str, NodeWithScore]]:
+    """
+    Run ``_retrieve`` on every shard in parallel and merge the hits by score.
+
+    The query is embedded once for all shards. Dense and fused scores are
+    comparable across shards (cosine similarity and reciprocal ranks);
+    BM25 scores only approximately, as each shard has its own statistics.
+    """
+    if len(snapshots) > 1 and embedding is None and (
+        mode in ("vector", "hybrid") or (mode == "auto" and not is_keyword_query(question))
+    ):
+        embedding = Settings.embed_model.get_query_embedding(question)
 
+    def search(item: tuple[str, Snapshot]) -> list[tuple[str, NodeWithScore]]:
+        name, snapshot = item
+        return [(name, hit) for hit in _retrieve(snapshot, question, top_k, mode, embedding, filters)]
 
-def query_documents(question: str, *, top_k: int = 5) -> str:
-    """Run a semantic RAG query and return the model's answer as text."""
-    engine = get_query_engine(top_k=top_k)
-    response = engine.query(question)
-    return str(response)
+    ranked = [pair for hits in _fan_out(search, snapshots) for pair in hits]
+    if len(snapshots) > 1:
+        ranked.sort(key=lambda pair: pair[1].score or 0.0, reverse=True)
+    return ranked[:top_k]
+
+
+def _synthesize(question: str, hits: Sequence[NodeWithScore]) -> str:
+    return str(get_response_synthesizer().synthesize(question, nodes=list(hits)))
+
+
+def get_query_engine(top_k: int = 5, shard: str = GLOBAL_SHARD):
+    """Return a LlamaIndex query engine backed by ``shard``'s persisted store."""
+    _snapshots([shard])
+    return _SHARDS.get(shard).cache.query_engine(top_k)
+
+
+def _citation(metadata: dict) -> str:
+    filename = metadata.get("filename")
+    if filename:
+        return Path(filename).name
+    return str(metadata.get("source") or "unknown")
+
+
+def _passage(shard: str, hit: NodeWithScore) -> dict[str, object]:
+    metadata = dict(hit.node.metadata or {})
+    return {
+        "text": hit.node.get_content(),
+        "score": float(hit.score) if hit.score is not None else None,
+        "source": _citation(metadata),
+        "node_id": hit.node.node_id,
+        "shard": shard,
+        "metadata": metadata,
+    }
+
+
+def retrieve_documents(
+    question: str,
+    *,
+    top_k: int = 5,
+    mode: str = "auto",
+    filters: RetrievalFilter | None = None,
+    shards: Sequence[str] | None = None,
+) -> list[dict[str, object]]:
+    """
+    Retrieval-only lookup: return the top-k passages for ``question``.
+
+    Each passage carries its text, score, a citation (file name or source),
+    the shard it came from and the raw node metadata. No LLM synthesis call
+    is made. See ``_retrieve`` for the available modes and ``filters``.
+
+    ``shards`` lists the indexes to search (default: the global one), e.g.
+    ``[GLOBAL_SHARD, user_shard(user_id)]``; they are searched in parallel
+    and the hits merged by score. Shards nobody has ingested into yet are
+    skipped.
+    """
+    hits = _retrieve_shards(_snapshots(shards), question, top_k, mode, filters=filters)
+    return [_passage(shard, hit) for shard, hit in hits]
+
+
+def query_documents(
+    question: str,
+    *,
+    top_k: int = 5,
+    mode: str = "hybrid",
+    filters: RetrievalFilter | None = None,
+    shards: Sequence[str] | None = None,
+) -> str:
+    """
+    Run a semantic RAG query over ``shards`` and return the model's answer as text.
+
+    Answers are served from ``QUERY_CACHE`` when a previous query against the
+    same shard versions (and filters) was close enough in embedding space;
+    the query embedding is computed once and reused for retrieval on a miss.
+    Lexically answered queries skip the embedding and the cache.
+    """
+    snapshots = _snapshots(shards)
+    if mode == "lexical" or (mode == "auto" and is_keyword_query(question)):
+        hits = _retrieve_shards(snapshots, question, top_k, mode, filters=filters)
+        if hits or mode == "lexical":
+            return _synthesize(question, [hit for _, hit in hits])
+        mode = "hybrid"
+    embedding = Settings.embed_model.get_query_embedding(question)
+    stamp = _stamp(snapshots)
+    scope = (top_k, mode, filters.cache_key() if filters is not None else None)
+    cached = QUERY_CACHE.lookup(embedding, stamp, scope=scope)
+    if cached is not None:
+        return cached
+    hits = _retrieve_shards(snapshots, question, top_k, mode, embedding, filters)
+    answer = _synthesize(question, [hit for _, hit in hits])
+    QUERY_CACHE.store(embedding, question, answer, stamp, scope=scope)
+    return answer
 
 
 def retrieve_evidence(
     questions: Sequence[str],
     *,
     top_k: int = 5,
+    max_concurrency: int | None = None,
+    filters: RetrievalFilter | None = None,
+    shards: Sequence[str] | None = None,
 ) -> dict[str, str]:
     """
     Convenience helper for agents: ask multiple focused questions
     and receive a dict mapping each prompt to its textual answer.
+
+    The questions are embedded together as queries (one batched request
+    where the embedding model supports it, see ``embed_queries``), then
+    answered in parallel, at most ``max_concurrency`` at a time
+    (``RAG_QUERY_CONCURRENCY`` by default). ``filters`` and ``shards`` apply
+    to every question.
+    """
+    unique = list(dict.fromkeys(questions))
+    if not unique:
+        return {}
+    snapshots = _snapshots(shards)
+    # Query embeddings, not document ones: they bypass the chunk cache.
+    embeddings = embed_queries(Settings.embed_model, unique)
+
+    def answer(question: str, embedding: list[float]) -> str:
+        hits = _retrieve_shards(snapshots, question, top_k, "hybrid", embedding, filters)
+        return _synthesize(question, [hit for _, hit in hits])
+
+    workers = min(max_concurrency or QUERY_CONCURRENCY, len(unique))
+    if workers <= 1:
+        answers = [answer(question, embedding) for question, embedding in zip(unique, embeddings)]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rag-evidence") as pool:
+            answers = list(pool.map(answer, unique, embeddings))
+    return dict(zip(unique, answers))
+
+
+def _rerank_by_context(
+    hits: Sequence[tuple[str, NodeWithScore]],
+    snapshots: Sequence[tuple[str, Snapshot]],
+    context: str,
+) -> list[tuple[str, NodeWithScore]]:
+    """
+    Re-order ``hits`` by retrieval score blended with similarity to ``context``.
+
+    Retrieval scores (cosine, fused ranks or BM25) are min-max scaled within
+    the candidates; passage vectors come from the loaded snapshots and the
+    context embedding from the chunk embedding cache, so a context (e.g. one
+    business summary version) is embedded only once.
+    """
+    context_vec = np.asarray(Settings.embed_model.get_text_embedding(context), dtype=np.float32)
+    context_vec /= float(np.linalg.norm(context_vec)) or 1.0
+    stores = {name: snapshot.index.vector_store for name, snapshot in snapshots}
+    scores = [hit.score or 0.0 for _, hit in hits]
+    low, span = min(scores), (max(scores) - min(scores)) or 1.0
+    reranked = []
+    for (shard, hit), score in zip(hits, scores):
+        try:
+            vector = np.asarray(stores[shard].get(hit.node.node_id), dtype=np.float32)
+            similarity = float(vector @ context_vec) / (float(np.linalg.norm(vector)) or 1.0)
+        except KeyError:
+            similarity = 0.0
+        blended = (1 - CONTEXT_RERANK_WEIGHT) * (score - low) / span + CONTEXT_RERANK_WEIGHT * similarity
+        reranked.append((shard, NodeWithScore(node=hit.node, score=blended)))
+    return sorted(reranked, key=lambda pair: pair[1].score, reverse=True)
+
+
+def contextual_lookup(
+    question: str,
+    *,
+    context: str = "",
+    top_k: int = 3,
+    synthesize: bool = False,
+    mode: str = "auto",
+    filters: RetrievalFilter | None = None,
+    shards: Sequence[str] | None = None,
+    caller: str | None = None,
+    embedding: list[float] | None = None,
+) -> dict[str, object]:
+    """
+    Retrieve on the bare ``question``, re-ranked by ``context`` such as a business summary.
+
+    Returns ``{"passages": [...], "answer": str | None}`` (an answer only if
+    ``synthesize``). Keeping the context out of the query keeps question
+    embeddings short and shared across users; it only re-ranks the
+    ``RAG_CONTEXT_RERANK_CANDIDATES`` x ``top_k`` candidates. Results are
+    memoized per (question, context version, shard versions) in
+    ``LOOKUP_MEMO``, and the candidates per (question, shard versions) in
+    ``CANDIDATE_MEMO``, so a question another user already asked is only
+    re-ranked. Both count hits and misses per ``caller``. ``embedding`` is
+    a query embedding of ``question`` the caller already has; it is used
+    on a candidate memo miss instead of embedding the question again.
+    """
+    snapshots = _snapshots(shards)
+    stamp = _stamp(snapshots)
+    key = (
+        " ".join(question.lower().split()),
+        text_hash(context) if context else None,
+        top_k,
+        synthesize,
+        mode,
+        filters.cache_key() if filters is not None else None,
+    )
+    cached = LOOKUP_MEMO.lookup(key, stamp, caller=caller)
+    if cached is not None:
+        return cached
+    candidates = top_k * max(CONTEXT_RERANK_CANDIDATES, 1) if context else top_k
+    candidate_key = (key[0], candidates, mode, key[-1])
+    hits = CANDIDATE_MEMO.lookup(candidate_key, stamp, caller=caller)
+    if hits is None:
+        hits = _retrieve_shards(snapshots, question, candidates, mode, embedding, filters)
+        CANDIDATE_MEMO.store(candidate_key, hits, stamp)
+    if context and len(hits) > 1:
+        hits = _rerank_by_context(hits, snapshots, context)
+    hits = hits[:top_k]
+    result = {
+        "passages": [_passage(shard, hit) for shard, hit in hits],
+        "answer": _synthesize(question, [hit for _, hit in hits]) if synthesize else None,
+    }
+    LOOKUP_MEMO.store(key, result, stamp)
+    return result
+
+
+# --- Async API ---------------------------------------------------------------
+
+_LOOKUP_EXECUTOR = ThreadPoolExecutor(max_workers=LOOKUP_WORKERS, thread_name_prefix="rag-lookup")
+_LOOKUP_STATS = {"in_flight": 0, "completed": 0, "failed": 0}
+_LOOKUP_STATS_LOCK = threading.Lock()
+
+
+def _tracked(fn: Callable, *args, **kwargs):
+    with _LOOKUP_STATS_LOCK:
+        _LOOKUP_STATS["in_flight"] += 1
+    outcome = "failed"
+    try:
+        result = fn(*args, **kwargs)
+        outcome = "completed"
+        return result
+    finally:
+        with _LOOKUP_STATS_LOCK:
+            _LOOKUP_STATS["in_flight"] -= 1
+            _LOOKUP_STATS[outcome] += 1
+
+
+async def _run_blocking(fn: Callable, *args, **kwargs):
     """
-    engine = get_query_engine(top_k=top_k)
-    answers: dict[str, str] = {}
-    for q in questions:
-        answers[q] = str(engine.query(q))
-    return answers
\ No newline at end of file
+    Run blocking RAG work (index loads, embedding and LLM HTTP calls) on the
+    bounded lookup pool so the calling event loop keeps serving other tasks.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_LOOKUP_EXECUTOR, functools.partial(_tracked, fn, *args, **kwargs))
+
+
+async def aretrieve_documents(question: str, **kwargs) -> list[dict[str, object]]:
+    """Async ``retrieve_documents``; see it for the arguments."""
+    return await _run_blocking(retrieve_documents, question, **kwargs)
+
+
+async def aquery_documents(question: str, **kwargs) -> str:
+    """Async ``query_documents``; see it for the arguments."""
+    return await _run_blocking(query_documents, question, **kwargs)
+
+
+async def acontextual_lookup(question: str, **kwargs) -> dict[str, object]:
+    """Async ``contextual_lookup``; see it for the arguments."""
+    return await _run_blocking(contextual_lookup, question, **kwargs)
+
+
+async def aretrieve_evidence(questions: Sequence[str], **kwargs) -> dict[str, str]:
+    """Async ``retrieve_evidence``; see it for the arguments."""
+    return await _run_blocking(retrieve_evidence, questions, **kwargs)
+
+
+def lookup_executor_stats() -> dict[str, int]:
+    """Return pool size and in-flight/completed/failed counts of the async lookup API."""
+    with _LOOKUP_STATS_LOCK:
+        return {"workers": LOOKUP_WORKERS, **_LOOKUP_STATS}
+
+
+def retrieval_stats() -> dict[str, int]:
+    """Return how many lookups each retrieval path (hybrid/vector/lexical) served."""
+    return dict(_MODE_COUNTS)
+
+
+def index_cache_stats() -> dict[str, int]:
+    """Return hit/miss/reload counters summed over all shards, plus shard load/eviction counts."""
+    return _SHARDS.stats()
+
+
+def embedding_cache_stats() -> dict[str, object]:
+    """Return size and hit/miss/eviction counters of the chunk embedding cache."""
+    return EMBEDDING_CACHE.stats()
+
+
+def embedding_client_stats() -> dict[str, float]:
+    """Return request/retry/throttle counters and achieved embeddings/s of the embedding API client."""
+    return EMBEDDING_CLIENT.stats()
+
+
+def lookup_memo_stats() -> dict[str, object]:
+    """Return size and hit-rate counters of the contextual lookup and candidate memos, overall and per caller."""
+    return {"results": LOOKUP_MEMO.stats(), "candidates": CANDIDATE_MEMO.stats()}
+
+
+def query_cache_stats() -> dict[str, float]:
+    """Return size and hit-rate counters of the query_documents answer cache."""
+    return QUERY_CACHE.stats()
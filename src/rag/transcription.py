@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import atexit
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Sequence
+
+import numpy as np
+import whisper
+
+
+SAMPLE_RATE = whisper.audio.SAMPLE_RATE  # 16 kHz mono, what Whisper expects
+SEGMENT_SECONDS = float(os.getenv("RAG_TRANSCRIBE_SEGMENT_SECONDS", "30"))
+OVERLAP_SECONDS = float(os.getenv("RAG_TRANSCRIBE_OVERLAP_SECONDS", "2"))
+# Each worker holds its own copy of the model, so this bounds memory as well.
+TRANSCRIBE_WORKERS = int(os.getenv("RAG_TRANSCRIBE_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+DEVICE = os.getenv("RAG_TRANSCRIBE_DEVICE", "cpu")
+
+
+@dataclass(frozen=True)
+class AudioSegment:
+    """A window of the source audio; ``keep_*`` bound the part it is authoritative for."""
+
+    start: float
+    end: float
+    keep_start: float
+    keep_end: float
+
+
+# --- Resident models ---------------------------------------------------------
+
+_MODELS: dict[tuple[str, str], object] = {}
+_MODELS_LOCK = threading.Lock()
+
+
+def get_model(model_size: str, device: str = DEVICE):
+    """Load a Whisper model once per process and keep it resident."""
+    key = (model_size, device)
+    with _MODELS_LOCK:
+        model = _MODELS.get(key)
+        if model is None:
+            model = _MODELS[key] = whisper.load_model(model_size, device=device)
+        return model
+
+
+def _init_worker(model_size: str, device: str, threads: int) -> None:
+    import torch
+
+    # Keep workers from oversubscribing the cores they share.
+    torch.set_num_threads(threads)
+    get_model(model_size, device)
+
+
+def _transcribe_window(
+    audio: np.ndarray,
+    offset: float,
+    model_size: str,
+    device: str,
+    language: str | None,
+) -> list[dict]:
+    model = get_model(model_size, device)
+    result = model.transcribe(
+        audio,
+        language=language,
+        fp16=device != "cpu",
+        # Windows are independent; conditioning on text from a window we
+        # never saw only invites repetition loops.
+        condition_on_previous_text=False,
+    )
+    return [
+        {"start": offset + s["start"], "end": offset + s["end"], "text": s["text"].strip()}
+        for s in result.get("segments", [])
+    ]
+
+
+class TranscriptionPool:
+    """
+    Long-lived process pool whose workers each keep a Whisper model loaded.
+
+    Created lazily per (model size, device) by ``get_pool`` and shut down at
+    interpreter exit, so repeated ingests pay the model load only once.
+    """
+
+    def __init__(self, model_size: str, *, device: str = DEVICE, workers: int = TRANSCRIBE_WORKERS) -> None:
+        self.model_size = model_size
+        self.device = device
+        self.workers = max(1, workers)
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        # torch does not survive fork once its thread pools exist.
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_size, device, threads),
+        )
+
+    def submit_window(self, audio: np.ndarray, offset: float, *, language: str | None = None) -> Future:
+        """Queue one window's samples; the future yields its timed utterances."""
+        return self._executor.submit(_transcribe_window, audio, offset, self.model_size, self.device, language)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_POOLS: dict[tuple[str, str], TranscriptionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(model_size: str, device: str = DEVICE) -> TranscriptionPool:
+    with _POOLS_LOCK:
+        pool = _POOLS.get((model_size, device))
+        if pool is None:
+            pool = _POOLS[(model_size, device)] = TranscriptionPool(model_size, device=device)
+        return pool
+
+
+@atexit.register
+def shutdown_pools() -> None:
+    with _POOLS_LOCK:
+        for pool in _POOLS.values():
+            pool.shutdown()
+        _POOLS.clear()
+
+
+# --- Segmentation & stitching ------------------------------------------------
+
+def _frame_rms(audio: np.ndarray, frame: int) -> np.ndarray:
+    usable = len(audio) // frame * frame
+    if not usable:
+        return np.sqrt(np.mean(np.square(audio), keepdims=True)) if len(audio) else np.zeros(0)
+    frames = audio[:usable].reshape(-1, frame)
+    return np.sqrt(np.mean(np.square(frames), axis=1))
+
+
+def _cut(
+    buffer: np.ndarray,
+    buffer_start: int,
+    segment: AudioSegment,
+    silence_threshold: float | None,
+) -> tuple[AudioSegment, np.ndarray] | None:
+    samples = buffer[int(segment.start * SAMPLE_RATE) - buffer_start:int(segment.end * SAMPLE_RATE) - buffer_start]
+    if silence_threshold is not None and _frame_rms(samples, SAMPLE_RATE // 10).max(initial=0.0) < silence_threshold:
+        return None
+    return segment, samples
+
+
+def iter_windows(
+    chunks: Iterable[np.ndarray],
+    *,
+    segment_seconds: float = SEGMENT_SECONDS,
+    overlap_seconds: float = OVERLAP_SECONDS,
+    silence_threshold: float | None = None,
+) -> Iterator[tuple[AudioSegment, np.ndarray]]:
+    """
+    Cut audio arriving in ``chunks`` into windows of ``segment_seconds``
+    overlapping by ``overlap_seconds``, yielding each window with its samples
+    as soon as the audio after it has started to arrive. Only the current
+    window's audio is buffered.
+
+    Each window is authoritative for its span up to the middle of the
+    overlaps, which is what ``stitch`` uses to drop the duplicate text both
+    neighbours produce. With ``silence_threshold`` set, windows whose loudest
+    100 ms frame stays below that RMS level are skipped.
+    """
+    step = max(segment_seconds - overlap_seconds, 1.0)
+    buffer = np.zeros(0, dtype=np.float32)
+    buffer_start = 0  # sample index of buffer[0]
+    start = 0.0
+    for chunk in chunks:
+        buffer = np.concatenate([buffer, np.asarray(chunk, dtype=np.float32)])
+        # A window is final once audio past its end exists; the last one is cut below.
+        while start + segment_seconds < (buffer_start + len(buffer)) / SAMPLE_RATE:
+            next_start = start + step
+            segment = AudioSegment(
+                start,
+                start + segment_seconds,
+                0.0 if start == 0 else start + overlap_seconds / 2,
+                next_start + overlap_seconds / 2,
+            )
+            window = _cut(buffer, buffer_start, segment, silence_threshold)
+            if window is not None:
+                yield window
+            start = next_start
+            drop = int(start * SAMPLE_RATE) - buffer_start
+            buffer, buffer_start = buffer[drop:], buffer_start + drop
+    duration = (buffer_start + len(buffer)) / SAMPLE_RATE
+    segment = AudioSegment(
+        start,
+        min(start + segment_seconds, duration),
+        0.0 if start == 0 else start + overlap_seconds / 2,
+        duration,
+    )
+    window = _cut(buffer, buffer_start, segment, silence_threshold)
+    if window is not None:
+        yield window
+
+
+def split_audio(
+    audio: np.ndarray,
+    *,
+    segment_seconds: float = SEGMENT_SECONDS,
+    overlap_seconds: float = OVERLAP_SECONDS,
+    silence_threshold: float | None = None,
+) -> list[AudioSegment]:
+    """The windows ``iter_windows`` cuts from the whole of ``audio``."""
+    return [
+        segment
+        for segment, _ in iter_windows(
+            [audio],
+            segment_seconds=segment_seconds,
+            overlap_seconds=overlap_seconds,
+            silence_threshold=silence_threshold,
+        )
+    ]
+
+
+def stitch(segments: Sequence[AudioSegment], results: Sequence[list[dict]]) -> str:
+    """Join window transcripts, keeping each utterance only from the window that owns its midpoint."""
+    parts = []
+    for seg, utterances in zip(segments, results):
+        for utterance in utterances:
+            midpoint = (utterance["start"] + utterance["end"]) / 2
+            if seg.keep_start <= midpoint < seg.keep_end and utterance["text"]:
+                parts.append(utterance["text"])
+    return " ".join(parts)
+
+
+# --- Public API --------------------------------------------------------------
+
+def transcribe_stream(
+    chunks: Iterable[np.ndarray],
+    *,
+    model_size: str = "base",
+    language: str | None = None,
+    silence_threshold: float | None = None,
+    parallel: bool = True,
+) -> str:
+    """
+    Transcribe 16 kHz mono float32 audio arriving in ``chunks`` (e.g. from an
+    ffmpeg pipe) across the resident worker pool.
+
+    Each window is submitted as soon as it has been decoded, so decoding and
+    transcription overlap. At most two windows per worker wait in the pool;
+    beyond that the stream is not read until one finishes.
+    """
+    windows = iter_windows(chunks, silence_threshold=silence_threshold)
+    segments: list[AudioSegment] = []
+    if not (parallel and TRANSCRIBE_WORKERS > 1):
+        results = []
+        for segment, samples in windows:
+            segments.append(segment)
+            results.append(_transcribe_window(samples, segment.start, model_size, DEVICE, language))
+        return stitch(segments, results)
+    pool = get_pool(model_size)
+    futures: list[Future] = []
+    try:
+        for segment, samples in windows:
+            segments.append(segment)
+            futures.append(pool.submit_window(samples, segment.start, language=language))
+            waiting = [future for future in futures if not future.done()]
+            if len(waiting) > 2 * pool.workers:
+                waiting[0].result()
+        return stitch(segments, [future.result() for future in futures])
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+
+
+def transcribe_audio(audio: np.ndarray, **kwargs) -> str:
+    """Transcribe 16 kHz mono float32 ``audio`` already in memory; see ``transcribe_stream``."""
+    return transcribe_stream([audio], **kwargs)
+
+
+def transcribe_file(path: str, **kwargs) -> str:
+    """Decode any ffmpeg-readable media file to 16 kHz mono and transcribe it."""
+    return transcribe_audio(whisper.load_audio(path), **kwargs)
@@ -0,0 +1,585 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Iterable, Sequence
+
+if __package__ in (None, ""):
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.simple import SimpleVectorStore
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    VectorStoreQuery,
+    VectorStoreQueryMode,
+    VectorStoreQueryResult,
+)
+from llama_index.core.vector_stores.utils import (
+    build_metadata_filter_fn,
+    node_to_metadata_dict,
+)
+
+from rag.ann import IVFIndex, IVFSettings
+
+
+DEFAULT_NAMESPACE = "default"
+LEGACY_FNAME = "vector_store.json"
+MATRIX_FNAME = "vectors.npy"
+SIDECAR_FNAME = "vectors_meta.json"
+SCALES_FNAME = "vectors.int8_scales.npy"
+IVF_CENTROIDS_FNAME = "vectors.ivf_centroids.npy"
+IVF_ASSIGNMENTS_FNAME = "vectors.ivf_assignments.npy"
+
+QUANTIZATION_MODES = ("none", "float16", "int8")
+# Candidates re-scored at full precision, as a multiple of top_k.
+RESCORE_FACTOR = 4
+MIN_RESCORE_CANDIDATES = 32
+# Rows upcast and scored per block of the compact matrix; small enough that
+# the float32 temporary stays in cache.
+SCORE_BLOCK_ROWS = 4096
+
+
+# --- File helpers ------------------------------------------------------------
+
+def _namespaced(persist_dir: Path, namespace: str, fname: str) -> Path:
+    return persist_dir / f"{namespace}__{fname}"
+
+
+def _tmp_path(path: Path) -> Path:
+    return path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+
+def _atomic_save_matrix(path: Path, matrix: np.ndarray) -> None:
+    tmp = _tmp_path(path)
+    with open(tmp, "wb") as f:
+        np.save(f, matrix)
+    os.replace(tmp, path)
+
+
+def _atomic_save_json(path: Path, payload: dict) -> None:
+    tmp = _tmp_path(path)
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+    os.replace(tmp, path)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+def _compact_fname(quantization: str) -> str:
+    return f"vectors.{quantization}.npy"
+
+
+def quantize(matrix: np.ndarray, quantization: str) -> tuple[np.ndarray, np.ndarray | None]:
+    """
+    Return the compact form of ``matrix`` and, for int8, per-row scales.
+
+    int8 uses symmetric per-row scalar quantization: each row is divided by
+    its largest absolute component and mapped onto [-127, 127].
+    """
+    if quantization == "float16":
+        return matrix.astype(np.float16), None
+    if quantization == "int8":
+        if not matrix.size:
+            return np.zeros(matrix.shape, dtype=np.int8), np.zeros(matrix.shape[0], dtype=np.float32)
+        peaks = np.abs(matrix).max(axis=1).astype(np.float32)
+        peaks[peaks == 0] = 1.0
+        codes = np.rint(matrix / peaks[:, None] * 127).astype(np.int8)
+        return codes, peaks / 127
+    raise ValueError(f"Unknown quantization {quantization!r}; expected one of {QUANTIZATION_MODES}.")
+
+
+def _concat_ivf(stores: Sequence[NumpyVectorStore]) -> IVFIndex | None:
+    indexed = [store for store in stores if store._ivf is not None]
+    if not indexed:
+        return None
+    reference = max(indexed, key=lambda store: store.num_vectors)._ivf
+    return IVFIndex.concat([
+        store._ivf
+        if store._ivf is not None and store._ivf.fingerprint == reference.fingerprint
+        else reference.reassigned(store._full_matrix())
+        for store in stores
+    ])
+
+
+# --- Vector store ------------------------------------------------------------
+
+class NumpyVectorStore(BasePydanticVectorStore):
+    """
+    Vector store backed by a contiguous float32 matrix.
+
+    Embeddings are L2-normalised and saved as ``<namespace>__vectors.npy``,
+    which is memory-mapped on load, while node ids, ref doc ids and metadata
+    live in a compact ``<namespace>__vectors_meta.json`` sidecar. Cosine
+    top-k is a single matrix-vector product.
+
+    With ``quantization`` set to "float16" or "int8" a compact copy of the
+    matrix is kept (and persisted) alongside it. Searches scan the compact
+    copy and re-score only the best ``RESCORE_FACTOR * top_k`` candidates
+    against the full-precision rows, which stay memory-mapped and are paged
+    in only for those candidates.
+
+    With an ``IVFIndex`` attached and ``nprobe`` > 0, unfiltered queries
+    score only the rows in the ``nprobe`` inverted lists nearest the query
+    instead of the whole matrix.
+    """
+
+    stores_text: bool = False
+    quantization: str = "none"
+    nprobe: int = 0
+
+    _matrix: np.ndarray | None = PrivateAttr()
+    # Full-precision blocks of a concatenated quantized store, kept unstacked
+    # so memory maps survive; stacked on the first mutation.
+    _parts: list[np.ndarray] | None = PrivateAttr(default=None)
+    _compact: np.ndarray | None = PrivateAttr(default=None)
+    _scales: np.ndarray | None = PrivateAttr(default=None)
+    _ivf: IVFIndex | None = PrivateAttr(default=None)
+    _ids: list[str] = PrivateAttr()
+    _ref_doc_ids: list[str] = PrivateAttr()
+    _metadata: list[dict] = PrivateAttr()
+    _row_of: dict[str, int] = PrivateAttr()
+
+    def __init__(
+        self,
+        matrix: np.ndarray | None = None,
+        ids: Sequence[str] = (),
+        ref_doc_ids: Sequence[str] = (),
+        metadata: Sequence[dict] = (),
+        *,
+        quantization: str = "none",
+        compact: np.ndarray | None = None,
+        scales: np.ndarray | None = None,
+        ivf: IVFIndex | None = None,
+        nprobe: int = 0,
+        **kwargs: Any,
+    ) -> None:
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization {quantization!r}; expected one of {QUANTIZATION_MODES}.")
+        super().__init__(quantization=quantization, nprobe=nprobe, **kwargs)
+        self._ivf = ivf
+        self._matrix = matrix if matrix is not None else np.zeros((0, 0), dtype=np.float32)
+        self._ids = list(ids)
+        self._ref_doc_ids = list(ref_doc_ids) or ["None"] * len(self._ids)
+        self._metadata = list(metadata) or [{} for _ in self._ids]
+        self._row_of = {node_id: row for row, node_id in enumerate(self._ids)}
+        if quantization != "none":
+            if compact is None:
+                compact, scales = quantize(self._matrix, quantization)
+            self._compact, self._scales = compact, scales
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "NumpyVectorStore"
+
+    @property
+    def client(self) -> None:
+        return None
+
+    @property
+    def num_vectors(self) -> int:
+        return len(self._ids)
+
+    @property
+    def dim(self) -> int:
+        if self._parts is not None:
+            return int(self._parts[0].shape[1])
+        return int(self._matrix.shape[1]) if self._matrix.size else 0
+
+    def memory_bytes(self) -> dict[str, int]:
+        """Bytes held by the full-precision and the compact search matrices."""
+        full = sum(p.nbytes for p in self._parts) if self._parts is not None else self._matrix.nbytes
+        compact = (self._compact.nbytes if self._compact is not None else 0) + (
+            self._scales.nbytes if self._scales is not None else 0
+        )
+        return {"full": int(full), "compact": int(compact)}
+
+    @property
+    def ivf(self) -> IVFIndex | None:
+        return self._ivf
+
+    def build_ivf(self, settings: IVFSettings) -> IVFIndex:
+        """Train an inverted-file index over the current rows and search with it."""
+        self._ivf = IVFIndex.train(self._full_matrix(), nlist=settings.nlist)
+        self.nprobe = settings.nprobe
+        return self._ivf
+
+    def requantize(self, quantization: str) -> "NumpyVectorStore":
+        """Return a store over the same rows searched with ``quantization``."""
+        if quantization == self.quantization:
+            return self
+        return NumpyVectorStore(
+            self._full_matrix(), self._ids, self._ref_doc_ids, self._metadata,
+            quantization=quantization, ivf=self._ivf, nprobe=self.nprobe,
+        )
+
+    def copy(self) -> "NumpyVectorStore":
+        """
+        A store over the same rows that can be appended to or deleted from
+        without changing this one. Matrices are shared: mutations replace
+        them rather than writing into them.
+        """
+        clone = NumpyVectorStore(
+            self._matrix, self._ids, self._ref_doc_ids, self._metadata,
+            quantization=self.quantization, compact=self._compact, scales=self._scales,
+            ivf=IVFIndex(self._ivf.centroids, self._ivf.assignments) if self._ivf is not None else None,
+            nprobe=self.nprobe,
+        )
+        clone._parts = list(self._parts) if self._parts is not None else None
+        return clone
+
+    def _full_matrix(self) -> np.ndarray:
+        if self._parts is not None:
+            self._matrix = np.vstack(self._parts)
+            self._parts = None
+        return self._matrix
+
+    def _full_rows(self, rows: np.ndarray) -> np.ndarray:
+        if self._parts is None:
+            return self._matrix[rows]
+        bounds = np.cumsum([0] + [p.shape[0] for p in self._parts])
+        part_of = np.searchsorted(bounds, rows, side="right") - 1
+        return np.stack([self._parts[p][r - bounds[p]] for p, r in zip(part_of, rows)])
+
+    # --- Persistence ---------------------------------------------------------
+
+    @staticmethod
+    def exists(persist_dir: str | Path, namespace: str = DEFAULT_NAMESPACE) -> bool:
+        persist_dir = Path(persist_dir)
+        return (
+            _namespaced(persist_dir, namespace, MATRIX_FNAME).exists()
+            and _namespaced(persist_dir, namespace, SIDECAR_FNAME).exists()
+        )
+
+    @classmethod
+    def from_persist_dir(
+        cls,
+        persist_dir: str | Path,
+        namespace: str = DEFAULT_NAMESPACE,
+        *,
+        mmap: bool = True,
+        quantization: str = "none",
+        nprobe: int = 0,
+    ) -> "NumpyVectorStore":
+        """
+        Open a persisted store, memory-mapping the embedding matrix.
+
+        A compact matrix persisted for ``quantization`` is loaded into memory;
+        if there is none it is computed from the full matrix. A persisted IVF
+        index is loaded when ``nprobe`` is set.
+        """
+        persist_dir = Path(persist_dir)
+        with open(_namespaced(persist_dir, namespace, SIDECAR_FNAME), encoding="utf-8") as f:
+            sidecar = json.load(f)
+        matrix = np.load(
+            _namespaced(persist_dir, namespace, MATRIX_FNAME),
+            mmap_mode="r" if mmap else None,
+        )
+        compact = scales = None
+        compact_path = _namespaced(persist_dir, namespace, _compact_fname(quantization))
+        if quantization != "none" and compact_path.exists():
+            compact = np.load(compact_path)
+            if quantization == "int8":
+                scales = np.load(_namespaced(persist_dir, namespace, SCALES_FNAME))
+        ivf = None
+        centroids_path = _namespaced(persist_dir, namespace, IVF_CENTROIDS_FNAME)
+        if nprobe and centroids_path.exists():
+            ivf = IVFIndex(
+                np.load(centroids_path), np.load(_namespaced(persist_dir, namespace, IVF_ASSIGNMENTS_FNAME))
+            )
+        return cls(
+            matrix=matrix,
+            ids=sidecar["ids"],
+            ref_doc_ids=sidecar["ref_doc_ids"],
+            metadata=sidecar["metadata"],
+            quantization=quantization,
+            compact=compact,
+            scales=scales,
+            ivf=ivf,
+            nprobe=nprobe,
+        )
+
+    def persist(self, persist_path: str, fs: Any = None) -> None:
+        """
+        Save the matrix and sidecar next to ``persist_path``.
+
+        ``StorageContext.persist`` passes the legacy ``<namespace>__vector_store.json``
+        path; the namespace is taken from it and the stale JSON store, if any,
+        is removed so the directory holds a single source of truth.
+        """
+        legacy_path = Path(persist_path)
+        persist_dir = legacy_path.parent
+        namespace = legacy_path.name.split("__")[0] or DEFAULT_NAMESPACE
+        persist_dir.mkdir(parents=True, exist_ok=True)
+        _atomic_save_matrix(_namespaced(persist_dir, namespace, MATRIX_FNAME), self._full_matrix())
+        if self._compact is not None:
+            _atomic_save_matrix(
+                _namespaced(persist_dir, namespace, _compact_fname(self.quantization)), self._compact
+            )
+            if self._scales is not None:
+                _atomic_save_matrix(_namespaced(persist_dir, namespace, SCALES_FNAME), self._scales)
+        if self._ivf is not None:
+            _atomic_save_matrix(_namespaced(persist_dir, namespace, IVF_CENTROIDS_FNAME), self._ivf.centroids)
+            _atomic_save_matrix(_namespaced(persist_dir, namespace, IVF_ASSIGNMENTS_FNAME), self._ivf.assignments)
+        else:
+            _namespaced(persist_dir, namespace, IVF_CENTROIDS_FNAME).unlink(missing_ok=True)
+            _namespaced(persist_dir, namespace, IVF_ASSIGNMENTS_FNAME).unlink(missing_ok=True)
+        _atomic_save_json(
+            _namespaced(persist_dir, namespace, SIDECAR_FNAME),
+            {
+                "dim": self.dim,
+                "ids": self._ids,
+                "ref_doc_ids": self._ref_doc_ids,
+                "metadata": self._metadata,
+            },
+        )
+        legacy_path.unlink(missing_ok=True)
+
+    # --- Mutation ------------------------------------------------------------
+
+    @classmethod
+    def concat(cls, stores: Sequence["NumpyVectorStore"]) -> "NumpyVectorStore":
+        """
+        Stack several stores into one; a single store keeps its memory map.
+
+        Quantized stores (all in the same mode) stack only their compact
+        matrices and keep the full-precision blocks as separate memory maps.
+        When IVF search is on, rows of stores indexed against other centroids
+        (or not indexed yet, like freshly appended segments) are assigned to
+        the centroids of the largest indexed store.
+        """
+        modes = {store.quantization for store in stores}
+        quantization = modes.pop() if len(modes) == 1 else "none"
+        nprobe = max((store.nprobe for store in stores), default=0)
+        stores = [store for store in stores if store._ids]
+        if len(stores) == 1:
+            only = stores[0]
+            return cls(
+                only._full_matrix(), only._ids, only._ref_doc_ids, only._metadata,
+                quantization=only.quantization, compact=only._compact, scales=only._scales,
+                ivf=only._ivf, nprobe=nprobe,
+            )
+        if not stores:
+            return cls(quantization=quantization, nprobe=nprobe)
+        ids = [i for store in stores for i in store._ids]
+        ref_doc_ids = [r for store in stores for r in store._ref_doc_ids]
+        metadata = [m for store in stores for m in store._metadata]
+        ivf = _concat_ivf(stores) if nprobe else None
+        if quantization == "none":
+            return cls(
+                np.vstack([store._full_matrix() for store in stores]), ids, ref_doc_ids, metadata,
+                ivf=ivf, nprobe=nprobe,
+            )
+        merged = cls(
+            None, ids, ref_doc_ids, metadata,
+            quantization=quantization,
+            compact=np.concatenate([store._compact for store in stores]),
+            scales=np.concatenate([store._scales for store in stores]) if quantization == "int8" else None,
+            ivf=ivf,
+            nprobe=nprobe,
+        )
+        merged._parts = [part for store in stores for part in (store._parts or [store._matrix])]
+        return merged
+
+    def add(self, nodes: Sequence[BaseNode], **add_kwargs: Any) -> list[str]:
+        if not nodes:
+            return []
+        new_rows = _normalize(np.asarray([node.get_embedding() for node in nodes], dtype=np.float32))
+        matrix = self._full_matrix()
+        # Extend the row lookups before swapping in the matrix so a concurrent
+        # query never sees a row without its id.
+        for node in nodes:
+            metadata = node_to_metadata_dict(node, remove_text=True, flat_metadata=False)
+            metadata.pop("_node_content", None)
+            self._row_of[node.node_id] = len(self._ids)
+            self._ids.append(node.node_id)
+            self._ref_doc_ids.append(node.ref_doc_id or "None")
+            self._metadata.append(metadata)
+        if self._compact is not None:
+            compact, scales = quantize(new_rows, self.quantization)
+            if self._compact.size:
+                compact = np.concatenate([self._compact, compact])
+                scales = np.concatenate([self._scales, scales]) if scales is not None else None
+            self._compact, self._scales = compact, scales
+        if self._ivf is not None:
+            self._ivf.extend(new_rows)
+        self._matrix = np.vstack([matrix, new_rows]) if matrix.size else new_rows
+        return [node.node_id for node in nodes]
+
+    def _drop_rows(self, keep: np.ndarray) -> None:
+        self._matrix = np.ascontiguousarray(self._full_matrix()[keep])
+        if self._compact is not None:
+            self._compact = np.ascontiguousarray(self._compact[keep])
+            if self._scales is not None:
+                self._scales = self._scales[keep]
+        if self._ivf is not None:
+            self._ivf = self._ivf.take(keep)
+        rows = np.flatnonzero(keep)
+        self._ids = [self._ids[i] for i in rows]
+        self._ref_doc_ids = [self._ref_doc_ids[i] for i in rows]
+        self._metadata = [self._metadata[i] for i in rows]
+        self._row_of = {node_id: row for row, node_id in enumerate(self._ids)}
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        self.delete_ref_docs([ref_doc_id])
+
+    def delete_ref_docs(self, ref_doc_ids: Iterable[str]) -> None:
+        """Drop the rows of every document in ``ref_doc_ids`` in a single pass."""
+        doomed = set(ref_doc_ids)
+        keep = np.asarray([r not in doomed for r in self._ref_doc_ids], dtype=bool)
+        if not keep.all():
+            self._drop_rows(keep)
+
+    def delete_nodes(
+        self,
+        node_ids: list[str] | None = None,
+        filters: Any = None,
+        **delete_kwargs: Any,
+    ) -> None:
+        mask = self._filter_mask(node_ids, None, filters)
+        if mask.any():
+            self._drop_rows(~mask)
+
+    def clear(self) -> None:
+        self._drop_rows(np.zeros(len(self._ids), dtype=bool))
+
+    # --- Retrieval -----------------------------------------------------------
+
+    def get(self, text_id: str) -> list[float]:
+        return self._full_rows(np.asarray([self._row_of[text_id]]))[0].tolist()
+
+    def _filter_mask(
+        self,
+        node_ids: list[str] | None,
+        doc_ids: list[str] | None,
+        filters: Any,
+    ) -> np.ndarray:
+        mask = np.ones(len(self._ids), dtype=bool)
+        if node_ids is not None:
+            wanted = np.zeros(len(self._ids), dtype=bool)
+            rows = [self._row_of[n] for n in node_ids if n in self._row_of]
+            wanted[rows] = True
+            mask &= wanted
+        if doc_ids is not None:
+            wanted_docs = set(doc_ids)
+            mask &= np.asarray([r in wanted_docs for r in self._ref_doc_ids], dtype=bool)
+        if filters is not None:
+            filter_fn = build_metadata_filter_fn(
+                lambda node_id: self._metadata[self._row_of[node_id]], filters
+            )
+            mask &= np.asarray([filter_fn(node_id) for node_id in self._ids], dtype=bool)
+        return mask
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.mode != VectorStoreQueryMode.DEFAULT:
+            raise ValueError(f"NumpyVectorStore only supports default mode, got {query.mode}")
+        if not self._ids or query.query_embedding is None:
+            return VectorStoreQueryResult(similarities=[], ids=[])
+
+        q = np.asarray(query.query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm:
+            q = q / norm
+
+        restricted = query.node_ids is not None or query.doc_ids is not None or query.filters is not None
+        rows = np.flatnonzero(self._filter_mask(query.node_ids, query.doc_ids, query.filters)) if restricted else None
+        if rows is None and self._ivf is not None and self.nprobe:
+            probed = self._ivf.probe(q, self.nprobe)
+            # Too few rows in the probed lists to fill top_k: scan everything.
+            rows = probed if probed.shape[0] >= query.similarity_top_k else None
+        if self._compact is not None:
+            return self._query_quantized(q, rows, query.similarity_top_k)
+        scores = self._matrix[rows] @ q if rows is not None else self._matrix @ q
+
+        k = min(query.similarity_top_k, scores.shape[0])
+        if k <= 0:
+            return VectorStoreQueryResult(similarities=[], ids=[])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        hit_rows = rows[top] if rows is not None else top
+        return VectorStoreQueryResult(
+            similarities=[float(scores[i]) for i in top],
+            ids=[self._ids[i] for i in hit_rows],
+        )
+
+    def _approximate_scores(self, q: np.ndarray, rows: np.ndarray | None) -> np.ndarray:
+        compact = self._compact if rows is None else self._compact[rows]
+        scores = np.empty(compact.shape[0], dtype=np.float32)
+        for start in range(0, compact.shape[0], SCORE_BLOCK_ROWS):
+            block = compact[start:start + SCORE_BLOCK_ROWS]
+            scores[start:start + block.shape[0]] = block.astype(np.float32) @ q
+        if self._scales is not None:
+            scores *= self._scales if rows is None else self._scales[rows]
+        return scores
+
+    def _query_quantized(self, q: np.ndarray, rows: np.ndarray | None, top_k: int) -> VectorStoreQueryResult:
+        """Shortlist on the compact matrix, then re-score the shortlist exactly."""
+        scores = self._approximate_scores(q, rows)
+        k = min(top_k, scores.shape[0])
+        if k <= 0:
+            return VectorStoreQueryResult(similarities=[], ids=[])
+        shortlist = min(max(k * RESCORE_FACTOR, MIN_RESCORE_CANDIDATES), scores.shape[0])
+        candidates = np.argpartition(-scores, shortlist - 1)[:shortlist]
+        candidate_rows = rows[candidates] if rows is not None else candidates
+        # Sorted row order keeps reads from the memory-mapped matrix sequential.
+        candidate_rows = np.sort(candidate_rows)
+        exact = self._full_rows(candidate_rows) @ q
+        order = np.argsort(-exact)[:k]
+        return VectorStoreQueryResult(
+            similarities=[float(exact[i]) for i in order],
+            ids=[self._ids[candidate_rows[i]] for i in order],
+        )
+
+
+# --- Conversion --------------------------------------------------------------
+
+def convert_json_persist_dir(
+    persist_dir: str | Path,
+    namespace: str = DEFAULT_NAMESPACE,
+) -> NumpyVectorStore:
+    """
+    One-shot migration of a ``SimpleVectorStore`` JSON file to the numpy format.
+
+    The JSON file is removed once the matrix and sidecar have been written.
+    """
+    legacy_path = _namespaced(Path(persist_dir), namespace, LEGACY_FNAME)
+    store = load_json_store(legacy_path)
+    store.persist(str(legacy_path))
+    return store
+
+
+def load_json_store(path: str | Path) -> NumpyVectorStore:
+    """Read a ``SimpleVectorStore`` JSON file into an in-memory numpy store."""
+    data = SimpleVectorStore.from_persist_path(str(path)).data
+    ids = list(data.embedding_dict)
+    if ids:
+        matrix = _normalize(np.asarray([data.embedding_dict[i] for i in ids], dtype=np.float32))
+    else:
+        matrix = np.zeros((0, 0), dtype=np.float32)
+    metadata_dict = data.metadata_dict or {}
+    return NumpyVectorStore(
+        matrix=matrix,
+        ids=ids,
+        ref_doc_ids=[data.text_id_to_ref_doc_id.get(i, "None") for i in ids],
+        metadata=[metadata_dict.get(i, {}) for i in ids],
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert a JSON vector store to the numpy format.")
+    parser.add_argument("persist_dir", help="LlamaIndex persist directory to convert in place")
+    parser.add_argument("--namespace", default=DEFAULT_NAMESPACE)
+    args = parser.parse_args()
+    converted = convert_json_persist_dir(args.persist_dir, args.namespace)
+    print(f"Converted {converted.num_vectors} vectors in {args.persist_dir}")
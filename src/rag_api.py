@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import asyncio
+import uuid
+
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+from google.adk.sessions import BaseSessionService, Session
+
+from loop_monitor import EventLoopLagMonitor
+
+
+async def open_chat_session(session_service: BaseSessionService, app_name: str, session_id: str | None) -> Session:
+    """
+    Return the chat session ``session_id``, creating it if needed.
+
+    Each chat session is owned by the ADK user of the same id, so the id the
+    client holds is also the ``tool_context.user_id`` its agents see and
+    ``rag_lookup`` searches ``user:<session_id>``. A missing id starts a new
+    session under a fresh id.
+    """
+    if session_id:
+        existing = await session_service.get_session(app_name=app_name, user_id=session_id, session_id=session_id)
+        if existing:
+            return existing
+    session_id = session_id or uuid.uuid4().hex
+    return await session_service.create_session(app_name=app_name, user_id=session_id, session_id=session_id)
+
+
+def create_rag_router(
+    session_service: BaseSessionService,
+    app_name: str,
+    loop_monitor: EventLoopLagMonitor | None = None,
+) -> APIRouter:
+    """
+    Routes and lifecycle hooks shared by the FastAPI apps that serve the RAG
+    layer (the deployed root ``server.py`` and ``src/server.py``).
+
+    The router starts and stops ``loop_monitor`` and the ingestion queue with
+    the app, warms ``rag_lookup``'s section router in the background, and
+    exposes research uploads (``/api/documents``) and the event-loop and
+    cache metrics (``/api/metrics/*``). Uploads open the chat session with
+    ``open_chat_session``, as the chat endpoints do, and go to the shard of
+    its user, the same shard ``rag_lookup`` searches. ``rag.service`` is imported lazily so the app
+    starts without loading models.
+    """
+    monitor = loop_monitor or EventLoopLagMonitor()
+    router = APIRouter()
+
+    @router.on_event("startup")
+    async def start_loop_monitor():
+        monitor.start()
+
+    @router.on_event("startup")
+    async def warm_rag_lookup():
+        # Embed the knowledge-base sections in the background; startup does not wait.
+        from tools.rag_tools import warm_knowledge_router
+
+        asyncio.get_running_loop().run_in_executor(None, warm_knowledge_router)
+
+    @router.on_event("shutdown")
+    async def stop_loop_monitor():
+        await monitor.stop()
+
+    @router.on_event("shutdown")
+    async def stop_ingestion_queue():
+        from rag.jobs import shutdown_queue
+
+        shutdown_queue(wait=False)
+
+    @router.get("/api/metrics/event-loop")
+    async def event_loop_metrics():
+        """Event-loop lag (how long requests waited on blocking work), RAG lookup pool and ingestion queue usage."""
+        from rag.jobs import ingestion_queue
+        from rag.service import lookup_executor_stats
+
+        return {
+            "lag": monitor.stats(),
+            "rag_lookups": lookup_executor_stats(),
+            "ingestion": ingestion_queue().stats(),
+        }
+
+    @router.get("/api/metrics/rag-cache")
+    async def rag_cache_metrics():
+        """Hit rates of rag_lookup's memos (overall and per agent) and of the embedding and answer caches."""
+        from rag.service import embedding_cache_stats, embedding_client_stats, lookup_memo_stats, query_cache_stats
+
+        return {
+            "lookups": lookup_memo_stats(),
+            "answers": query_cache_stats(),
+            "embeddings": embedding_cache_stats(),
+            "embedding_client": embedding_client_stats(),
+        }
+
+    @router.post("/api/documents", status_code=202)
+    async def upload_documents(session_id: str = Form(...), files: list[UploadFile] = File(...)):
+        """Save uploaded research files and queue them for ingestion into the session user's shard."""
+        from rag.ingest import SUPPORTED_SUFFIXES
+        from rag.jobs import QueueFullError, UploadTooLargeError, ingestion_queue, safe_filename
+        from rag.service import user_shard
+
+        session = await open_chat_session(session_service, app_name, session_id)
+        shard = user_shard(session.user_id)
+        names = [safe_filename(upload.filename) for upload in files]
+        for filename in names:
+            if not filename.lower().endswith(SUPPORTED_SUFFIXES):
+                raise HTTPException(415, f"{filename}: supported types are {', '.join(SUPPORTED_SUFFIXES)}")
+        queue = ingestion_queue()
+        accepted = []
+        for upload, filename in zip(files, names):
+            try:
+                # Starlette has already spooled the part to a temp file; copy it off the loop.
+                job_id, path, _ = await asyncio.to_thread(queue.store_upload, upload.file, filename)
+            except UploadTooLargeError as e:
+                raise HTTPException(413, str(e))
+            finally:
+                await upload.close()
+            try:
+                job = queue.submit(job_id, path, filename=filename, shard=shard)
+            except QueueFullError as e:
+                queue.discard_upload(path)
+                raise HTTPException(503, str(e), headers={"Retry-After": "30"})
+            accepted.append({**job.to_dict(), "status_url": f"/api/documents/{job.job_id}"})
+        return {"jobs": accepted}
+
+    @router.get("/api/documents/{job_id}")
+    async def document_job_status(job_id: str):
+        """Stage, chunks embedded and embedding throughput of one upload's ingestion job."""
+        from rag.jobs import ingestion_queue
+
+        job = ingestion_queue().get(job_id)
+        if job is None:
+            raise HTTPException(404, f"unknown ingestion job {job_id}")
+        return job.to_dict()
+
+    return router
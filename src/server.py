@@ -23,9 +23,12 @@ from google.genai.types import Content, Part
 from .agents.onboarding_agent import onboarding_agent
 from .agents.context_manager_agent import context_manager_agent
 from .tools.context_memory_tools import BUSINESS_SUMMARY_KEY
+from .rag_api import create_rag_router, open_chat_session
 
 session_service = InMemorySessionService()
 APP_NAME = "Hardlaunch"
+app.include_router(create_rag_router(session_service, APP_NAME))
+
 
 async def run_agent_query(
     runner: Runner,
@@ -60,13 +63,7 @@ async def run_agent_query(
     return final_response
 
 async def get_or_create_session(session_id: str | None) -> Session:
-    if session_id:
-        existing = await session_service.get_session(
-            app_name=APP_NAME, user_id=session_id, session_id=session_id
-        )
-        if existing:
-            return existing
-    return await session_service.create_session(app_name=APP_NAME, user_id=session_id or "anon")
+    return await open_chat_session(session_service, APP_NAME, session_id)
 
 from pydantic import BaseModel
 
@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import asyncio
+import functools
+
 from google.adk.tools import FunctionTool
 from google.adk.tools.tool_context import ToolContext
 
@@ -82,63 +85,175 @@ STARTUP_KNOWLEDGE_BASE = {
     """
 }
 
+# Section key -> (citation label, whole-word trigger terms; plurals match too).
+KNOWLEDGE_SECTIONS = {
+    "business_model": ("Business Model Canvas", (
+        "business model", "canvas", "revenue stream", "value prop", "value proposition",
+    )),
+    "funding": ("Funding Stages", (
+        "funding", "fundraising", "investment", "raise", "raising", "investor", "series", "seed",
+    )),
+    "market_sizing": ("Market Sizing Framework", (
+        "market", "tam", "sam", "som", "market size", "market sizing", "addressable",
+    )),
+    "tech_stack": ("Tech Stack Guide", (
+        "tech", "technology", "technical", "stack", "framework", "database", "hosting", "architecture",
+    )),
+    "gtm_strategy": ("GTM Strategy", (
+        "gtm", "go-to-market", "launch", "launching", "channel", "acquisition", "marketing",
+    )),
+    "pricing": ("Pricing Strategy", (
+        "pricing", "price", "cost", "subscription", "tier", "freemium",
+    )),
+}
+
+
+@functools.lru_cache(maxsize=1)
+def _knowledge_router():
+    """Router over STARTUP_KNOWLEDGE_BASE, built (terms compiled) on first use."""
+    from rag.router import Section, SectionRouter
+    from rag.service import ROUTER_MIN_SIMILARITY
+
+    return SectionRouter(
+        [
+            Section(key, label, terms, STARTUP_KNOWLEDGE_BASE[key])
+            for key, (label, terms) in KNOWLEDGE_SECTIONS.items()
+        ],
+        min_similarity=ROUTER_MIN_SIMILARITY,
+    )
+
+
+def warm_knowledge_router() -> None:
+    """Embed the knowledge-base sections ahead of the first lookup (blocking)."""
+    _knowledge_router().section_embeddings()
+
+
+def _route_question(question: str) -> tuple[list, list[float] | None]:
+    """
+    Knowledge-base sections for ``question`` and its query embedding (blocking).
+
+    The embedding is computed once, for routing, and returned so the vector
+    store lookup can reuse it. It is None when the route was remembered or
+    the embedding model is unavailable; the lookup then embeds the question
+    only if its memos miss.
+    """
+    from llama_index.core import Settings
+
+    router = _knowledge_router()
+    matches = router.cached_route(question)
+    if matches is not None:
+        return matches, None
+    try:
+        embedding = Settings.embed_model.get_query_embedding(question)
+    except Exception:
+        return router.route(question, semantic=False), None
+    return router.route(question, embedding=embedding), embedding
 
-def rag_lookup(
+
+def _format_passages(passages: list[dict]) -> str:
+    blocks = []
+    for i, passage in enumerate(passages, start=1):
+        score = passage.get("score")
+        score_text = f", score {score:.2f}" if isinstance(score, float) else ""
+        blocks.append(f"[{i}] ({passage['source']}{score_text})\n{passage['text'].strip()}")
+    return "\n\n".join(blocks)
+
+
+def _lookup_shards(tool_context: ToolContext) -> list[str]:
+    """
+    The global knowledge base plus the calling user's uploaded research.
+
+    ADK versions whose ``ToolContext`` has no ``user_id`` search the global
+    shard only.
+    """
+    from rag.service import GLOBAL_SHARD, user_shard
+
+    user_id = getattr(tool_context, "user_id", None)
+    return [GLOBAL_SHARD, user_shard(user_id)] if user_id else [GLOBAL_SHARD]
+
+
+async def rag_lookup(
     question: str,
     *,
     top_k: int = 5,
+    synthesize: bool = False,
+    source_type: str = "",
+    filename: str = "",
+    since: str = "",
+    until: str = "",
     tool_context: ToolContext,
 ) -> dict[str, str]:
     """
     Fetch grounded evidence from combined knowledge sources:
     1. In-memory startup fundamentals (business models, funding, pricing, etc.)
-    2. LlamaIndex vector store (Growth Hacking documents)
+    2. LlamaIndex vector store (Growth Hacking documents, plus research the
+       current user uploaded; both indexes are searched in parallel)
     
-    Enriched with user's business context for personalized guidance.
+    Enriched with user's business context for personalized guidance: the
+    vector store is searched with the question alone and the business summary
+    re-ranks the passages, so repeated questions are served from the lookup
+    memo until the summary or the index changes.
+    By default the vector store returns the raw top passages with their
+    source file names to cite; set synthesize=True for an LLM-written answer.
+    The vector store lookup runs on the RAG lookup thread pool, so a slow
+    index load or model call never blocks the server's event loop.
+
+    The vector store search can be narrowed with source_type (comma-separated
+    pdf, video, youtube, web, file), filename (comma-separated file names)
+    and since/until (ISO dates, e.g. 2025-01-31) bounding when the material
+    was ingested.
     """
+    from rag.metadata_index import RetrievalFilter
+
+    try:
+        filters = RetrievalFilter.from_args(
+            source_type=source_type, filename=filename, since=since, until=until
+        )
+    except ValueError as e:
+        return {
+            "answer": f"Invalid search filter: {e}",
+            "business_context": "",
+            "query": question,
+            "sources": "",
+        }
+
     summary_record = tool_context.state.get(BUSINESS_SUMMARY_KEY) or {}
     summary_text = summary_record.get("summary", "")
     
-    question_lower = question.lower()
     relevant_knowledge = []
     sources = []
     
-    # Part 1: In-memory startup fundamentals
-    if any(term in question_lower for term in ["business model", "canvas", "revenue stream", "value prop"]):
-        relevant_knowledge.append(STARTUP_KNOWLEDGE_BASE["business_model"])
-        sources.append("Business Model Canvas")
-    
-    if any(term in question_lower for term in ["funding", "investment", "raise", "investor", "series", "seed"]):
-        relevant_knowledge.append(STARTUP_KNOWLEDGE_BASE["funding"])
-        sources.append("Funding Stages")
-    
-    if any(term in question_lower for term in ["market", "tam", "sam", "som", "market size", "addressable"]):
-        relevant_knowledge.append(STARTUP_KNOWLEDGE_BASE["market_sizing"])
-        sources.append("Market Sizing Framework")
-    
-    if any(term in question_lower for term in ["tech", "stack", "framework", "database", "hosting", "architecture"]):
-        relevant_knowledge.append(STARTUP_KNOWLEDGE_BASE["tech_stack"])
-        sources.append("Tech Stack Guide")
-    
-    if any(term in question_lower for term in ["gtm", "go-to-market", "launch", "channel", "acquisition", "marketing"]):
-        relevant_knowledge.append(STARTUP_KNOWLEDGE_BASE["gtm_strategy"])
-        sources.append("GTM Strategy")
-    
-    if any(term in question_lower for term in ["pricing", "price", "cost", "subscription", "tier", "freemium"]):
-        relevant_knowledge.append(STARTUP_KNOWLEDGE_BASE["pricing"])
-        sources.append("Pricing Strategy")
+    # Part 1: In-memory startup fundamentals, best-matching sections first
+    # Building the router and embedding the question block: keep them off the event loop.
+    matches, embedding = await asyncio.to_thread(_route_question, question)
+    for match in matches[:2]:
+        relevant_knowledge.append(STARTUP_KNOWLEDGE_BASE[match.key])
+        sources.append(match.label)
     
     # Part 2: Query LlamaIndex vector store for Growth Hacking insights
     vector_store_results = ""
     try:
-        from rag.service import query_documents
-        
-        enriched_question = question
-        if summary_text:
-            enriched_question = f"Given this business context: {summary_text}\n\nQuestion: {question}"
-        
-        vector_store_results = query_documents(enriched_question, top_k=3)
-        sources.append("Hacking Growth (vector store)")
+        from rag.service import GLOBAL_SHARD, acontextual_lookup
+
+        # Retrieve on the bare question so lookups are shared across users and
+        # summary edits; the business summary only re-ranks the candidates.
+        lookup = await acontextual_lookup(
+            question,
+            context=summary_text,
+            top_k=3,
+            synthesize=synthesize,
+            filters=filters,
+            shards=_lookup_shards(tool_context),
+            caller=getattr(tool_context, "agent_name", None),
+            embedding=embedding,
+        )
+        passages = lookup["passages"]
+        vector_store_results = lookup["answer"] if synthesize else _format_passages(passages)
+        for passage in passages:
+            origin = "vector store" if passage["shard"] == GLOBAL_SHARD else "your uploads"
+            citation = f"{passage['source']} ({origin})"
+            if citation not in sources:
+                sources.append(citation)
         
     except Exception as e:
         vector_store_results = ""
@@ -147,7 +262,7 @@ def rag_lookup(
     knowledge_parts = []
     
     if relevant_knowledge:
-        knowledge_parts.append("**Startup Fundamentals:**\n" + "\n\n".join(relevant_knowledge[:2]))
+        knowledge_parts.append("**Startup Fundamentals:**\n" + "\n\n".join(relevant_knowledge))
     
     if vector_store_results:
         knowledge_parts.append(f"**Growth Hacking Insights:**\n{vector_store_results}")
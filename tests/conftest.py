@@ -0,0 +1,12 @@
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# rag.service reads its configuration at import: run offline against a scratch data dir.
+os.environ.setdefault("RAG_BACKEND", "local")
+os.environ.setdefault("RAG_DATA_DIR", tempfile.mkdtemp(prefix="hardlaunch-tests-"))
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from rag.crawler import Crawler, extract_main_text
+from rag.ledger import IngestLedger
+
+_PAGE = "<html><head><title>{title}</title></head><body><main><p>{body}</p></main></body></html>"
+
+
+class _Site:
+    """Pages served by a local HTTP stand-in, with the requests it saw."""
+
+    def __init__(self) -> None:
+        self.pages: dict[str, str] = {}
+        self.etags: dict[str, str] = {}
+        self.latency = 0.0
+        self.lock = threading.Lock()
+        self.requests: list[dict[str, str]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+
+def _handler(site: _Site) -> type[BaseHTTPRequestHandler]:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            with site.lock:
+                site.requests.append(dict(self.headers))
+                site.in_flight += 1
+                site.max_in_flight = max(site.max_in_flight, site.in_flight)
+            try:
+                time.sleep(site.latency)
+                body = site.pages.get(self.path)
+                etag = site.etags.get(self.path)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                elif etag is not None and self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                else:
+                    payload = body.encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html; charset=utf-8")
+                    self.send_header("Content-Length", str(len(payload)))
+                    if etag is not None:
+                        self.send_header("ETag", etag)
+                    self.end_headers()
+                    self.wfile.write(payload)
+            finally:
+                with site.lock:
+                    site.in_flight -= 1
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+    return Handler
+
+
+@pytest.fixture
+def site():
+    site = _Site()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(site))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    site.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield site
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    return IngestLedger(tmp_path / "ledger.sqlite")
+
+
+async def _crawl_and_record(ledger: IngestLedger, urls: list[str], **options):
+    async with Crawler(ledger, **options) as crawler:
+        results = await crawler.crawl(urls)
+    ledger.record_fetches([result.validators for result in results if result.validators is not None])
+    return results
+
+
+def test_refetch_with_matching_etag_is_not_modified(site, ledger):
+    site.pages["/a"] = _PAGE.format(title="A", body="Freemium tiers convert two to five percent of users.")
+    site.etags["/a"] = '"v1"'
+    url = f"{site.base_url}/a"
+
+    (first,) = asyncio.run(_crawl_and_record(ledger, [url]))
+    assert first.status == "changed"
+    assert "If-None-Match" not in site.requests[-1]
+
+    (second,) = asyncio.run(_crawl_and_record(ledger, [url]))
+    assert site.requests[-1]["If-None-Match"] == '"v1"'
+    assert second.status == "not_modified"
+    assert second.http_status == 304
+    assert second.document is None
+
+    site.etags["/a"] = '"v2"'
+    site.pages["/a"] = _PAGE.format(title="A", body="Annual plans now carry a twenty percent discount.")
+    (third,) = asyncio.run(_crawl_and_record(ledger, [url]))
+    assert third.status == "changed"
+    assert "twenty percent" in third.document.text
+
+
+def test_refetch_with_same_text_is_unchanged(site, ledger):
+    site.pages["/b"] = _PAGE.format(title="B", body="Retention improved after onboarding emails.")
+    url = f"{site.base_url}/b"
+
+    (first,) = asyncio.run(_crawl_and_record(ledger, [url]))
+    assert first.status == "changed"
+
+    # No validators to send: the page is downloaded again, but its text hashes the same.
+    (second,) = asyncio.run(_crawl_and_record(ledger, [url]))
+    assert second.http_status == 200
+    assert second.status == "unchanged"
+    assert second.document is None
+
+    site.pages["/b"] = _PAGE.format(title="B", body="Retention dipped after the pricing change.")
+    (third,) = asyncio.run(_crawl_and_record(ledger, [url]))
+    assert third.status == "changed"
+
+
+def test_per_host_limit_bounds_requests_in_flight(site):
+    site.latency = 0.1
+    for i in range(12):
+        site.pages[f"/p{i}"] = _PAGE.format(title=f"P{i}", body=f"Page {i} about seed rounds.")
+
+    async def crawl():
+        async with Crawler(per_host=3, max_connections=32) as crawler:
+            return await crawler.crawl(f"{site.base_url}/p{i}" for i in range(12))
+
+    results = asyncio.run(crawl())
+    assert [result.status for result in results] == ["changed"] * 12
+    assert site.max_in_flight == 3
+
+
+@pytest.mark.parametrize(
+    ("attrs", "kept"),
+    [
+        ('class="share-buttons"', False),
+        ('id="cookieBanner"', False),
+        ('class="nav_menu"', False),
+        ('class="shareholder-letter"', True),
+        ('class="promotion-results"', True),
+    ],
+)
+def test_chrome_class_names_match_whole_words(attrs, kept):
+    html = (
+        "<html><body><main><p>Quarterly revenue grew on enterprise renewals.</p>"
+        f"<div {attrs}><p>Dividend policy stays unchanged this year.</p></div></main></body></html>"
+    )
+    _, text = extract_main_text(html)
+    assert ("Dividend policy" in text) is kept
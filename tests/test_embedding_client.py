@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from typing import Any
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+from rag.embedding_cache import CachedEmbedding, EmbeddingCache
+from rag.embedding_client import RateLimitedEmbedding
+
+
+class TaskTypeEmbedding(BaseEmbedding):
+    """Records calls shaped like ``GoogleGenAIEmbedding._embed_texts``."""
+
+    _calls: list[tuple[list[str], str | None]] = PrivateAttr(default_factory=list)
+
+    def __init__(self, **kwargs: Any) -> None:
+        super().__init__(model_name="task-type-test", **kwargs)
+
+    def _embed_texts(self, texts: list[str], task_type: str | None = None) -> list[list[float]]:
+        self._calls.append((list(texts), task_type))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def _get_query_embedding(self, query: str) -> list[float]:
+        return self._embed_texts([query], task_type="RETRIEVAL_QUERY")[0]
+
+    async def _aget_query_embedding(self, query: str) -> list[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> list[float]:
+        return self._embed_texts([text], task_type="RETRIEVAL_DOCUMENT")[0]
+
+
+def test_query_batch_is_one_uncached_query_request(tmp_path):
+    inner = TaskTypeEmbedding()
+    client = RateLimitedEmbedding(inner, max_batch=10)
+    cache = EmbeddingCache(tmp_path / "embeddings.sqlite")
+    model = CachedEmbedding(client, cache)
+
+    vectors = model.get_query_embedding_batch(["a", "bb", "ccc"])
+
+    assert vectors == [[1.0, 1.0], [2.0, 1.0], [3.0, 1.0]]
+    assert inner._calls == [(["a", "bb", "ccc"], "RETRIEVAL_QUERY")]
+    assert client.stats()["requests"] == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_query_batches_follow_max_batch():
+    inner = TaskTypeEmbedding()
+    client = RateLimitedEmbedding(inner, max_batch=2)
+
+    client.get_query_embedding_batch(["a", "b", "c"])
+
+    assert [texts for texts, _ in inner._calls] == [["a", "b"], ["c"]]
+    assert client.stats()["requests"] == 2
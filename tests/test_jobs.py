@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import io
+import time
+
+import pytest
+
+from rag import service
+from rag.jobs import IngestionQueue
+
+
+def _pdf(pages: list[str]) -> bytes:
+    """A plain-text PDF with one line of text per page."""
+    objects: list[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"",  # page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 10 Tf 40 800 Td ({text}) Tj ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842]"
+            b" /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects)
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>".encode()
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = IngestionQueue(tmp_path / "uploads", workers=1)
+    yield queue
+    queue.shutdown(wait=True)
+
+
+def _upload(queue: IngestionQueue, pages: list[str], shard: str):
+    job_id, path, _ = queue.store_upload(io.BytesIO(_pdf(pages)), "plan.pdf")
+    job = queue.submit(job_id, path, filename="plan.pdf", shard=shard)
+    deadline = time.monotonic() + 60
+    while not job.finished and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert job.stage == "done", job.error
+    return job
+
+
+def test_shorter_reupload_removes_dropped_pages(queue):
+    shard = service.user_shard("founder-reupload")
+    pages = ["Pricing uses annual tiers.", "Hiring plan adds two engineers.", "Churn fell after onboarding."]
+    _upload(queue, pages, shard)
+    texts = [p["text"] for p in service.retrieve_documents("churn onboarding", shards=[shard], top_k=5)]
+    assert any("Churn fell" in text for text in texts)
+
+    job = _upload(queue, ["Pricing uses annual tiers."], shard)
+    assert job.unchanged_documents == 1
+
+    for question in ("churn onboarding", "hiring engineers", "pricing annual tiers"):
+        texts = [p["text"] for p in service.retrieve_documents(question, shards=[shard], top_k=5)]
+        assert not any("Churn fell" in text or "Hiring plan" in text for text in texts)
+    ledger = service.shard_ledger(shard)
+    assert [entry.source_id for entry in ledger.file_entries("upload:plan.pdf")] == ["upload:plan.pdf#page=1"]
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from llama_index.core import Document
+
+from rag.ledger import IngestLedger
+
+
+def _pages(*texts: str, source: str = "upload:plan.pdf") -> list[Document]:
+    return [
+        Document(text=text, doc_id=f"{source}-{text}", metadata={"source_id": source, "page": page})
+        for page, text in enumerate(texts, start=1)
+    ]
+
+
+def _ingest(ledger: IngestLedger, docs: list[Document]):
+    plan = ledger.plan(docs, whole_files=True)
+    ledger.record(plan.entries)
+    ledger.forget(plan.retired_source_ids)
+    return plan
+
+
+def test_shorter_version_retires_missing_pages(tmp_path):
+    ledger = IngestLedger(tmp_path / "ledger.sqlite")
+    _ingest(ledger, _pages("one", "two", "three"))
+    _ingest(ledger, _pages("unrelated", source="upload:plan.pdf.bak"))
+
+    plan = _ingest(ledger, _pages("one"))
+
+    assert plan.documents == []
+    assert plan.skipped == 1
+    assert sorted(plan.retired_source_ids) == ["upload:plan.pdf#page=2", "upload:plan.pdf#page=3"]
+    assert sorted(plan.replaced_doc_ids) == ["upload:plan.pdf-three", "upload:plan.pdf-two"]
+    assert [entry.source_id for entry in ledger.file_entries("upload:plan.pdf")] == ["upload:plan.pdf#page=1"]
+    assert ledger.get("upload:plan.pdf.bak#page=1") is not None
+
+
+def test_pages_are_kept_without_whole_files(tmp_path):
+    ledger = IngestLedger(tmp_path / "ledger.sqlite")
+    _ingest(ledger, _pages("one", "two"))
+
+    plan = ledger.plan(_pages("one"))
+
+    assert plan.retired_source_ids == []
+    assert plan.replaced_doc_ids == []
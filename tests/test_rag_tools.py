@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("google.adk")
+
+from llama_index.core import Document
+
+from rag import service
+from tools.rag_tools import rag_lookup, warm_knowledge_router
+
+
+def _embedding_requests() -> int:
+    return service.embedding_client_stats()["requests"]
+
+
+def test_rag_lookup_embeds_question_once():
+    service.upsert_documents(
+        [Document(text="Seed rounds for hardware startups often close after a working prototype. " * 20)]
+    )
+    warm_knowledge_router()
+    tool_context = SimpleNamespace(user_id="founder-embed-once", state={}, agent_name="test")
+    question = "When do investors fund a hardware prototype seed round?"
+
+    before = _embedding_requests()
+    result = asyncio.run(rag_lookup(question, tool_context=tool_context))
+    assert "vector store" in result["sources"]
+    assert _embedding_requests() - before == 1
+
+    # The route and the lookup are both remembered: no embedding at all.
+    before = _embedding_requests()
+    asyncio.run(rag_lookup(question, tool_context=tool_context))
+    assert _embedding_requests() == before
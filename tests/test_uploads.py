@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+sessions = pytest.importorskip("google.adk.sessions")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from rag_api import create_rag_router, open_chat_session
+
+APP_NAME = "hardlaunch-tests"
+
+
+@pytest.fixture
+def session_service():
+    return sessions.InMemorySessionService()
+
+
+@pytest.fixture
+def client(session_service):
+    from rag.jobs import shutdown_queue
+
+    app = FastAPI()
+    app.include_router(create_rag_router(session_service, APP_NAME))
+    yield TestClient(app)
+    shutdown_queue(wait=True)
+
+
+def _wait_for_job(client: TestClient, status_url: str, timeout: float = 60) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(status_url).json()
+        if job["stage"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"ingestion job did not finish: {job}")
+
+
+def test_new_chat_session_is_owned_by_user_of_same_id(session_service):
+    session = asyncio.run(open_chat_session(session_service, APP_NAME, None))
+    assert session.user_id == session.id
+
+    reopened = asyncio.run(open_chat_session(session_service, APP_NAME, session.id))
+    assert reopened.id == session.id
+
+
+def test_uploaded_document_is_visible_to_rag_lookup(client, session_service):
+    from tools.rag_tools import rag_lookup
+
+    # The frontend holds the id of the session its first chat opened.
+    session = asyncio.run(open_chat_session(session_service, APP_NAME, None))
+    text = "Our beekeeping cooperative sells raw wildflower honey to farmers markets. " * 40
+
+    response = client.post(
+        "/api/documents",
+        data={"session_id": session.id},
+        files=[("files", ("honey-notes.md", text.encode(), "text/markdown"))],
+    )
+    assert response.status_code == 202
+    (job,) = response.json()["jobs"]
+    assert job["shard"] == f"user:{session.id}"
+    assert _wait_for_job(client, job["status_url"])["stage"] == "done"
+
+    # A follow-up chat reopens the same session; its tools see that session's user.
+    session = asyncio.run(open_chat_session(session_service, APP_NAME, session.id))
+    tool_context = SimpleNamespace(user_id=session.user_id, state=session.state, agent_name="test")
+    result = asyncio.run(rag_lookup("wildflower honey cooperative", tool_context=tool_context))
+    assert "honey-notes.md (your uploads)" in result["sources"]